@@ -1,222 +1,1010 @@
 #!/usr/bin/env python3
 
 import argparse
+import collections
 import os
+import itertools
 import re
 import sys
 import time
 import threading
-
-from multiprocessing.dummy import Pool as ThreadPool
-
-from PIL import Image
-from imgc.utils.types import quality_type, size_type
-from imgc.image import ImageSize
-
-
-IMAGE_EXTS = ['jpg', 'jpeg', 'png', 'gif']
-IMAGE_JPG = ['jpg', 'jpeg']
-
-
-
-
-def extension(path):
-    return os.path.splitext(path)[1][1:].strip().lower()
+from functools import partial
+
+from imgc.api import compress, compress_many
+from imgc.utils import IMAGE_EXTS, extension, read_nul_delimited
+from imgc.utils.types import (
+    encoder_options_type, fraction_type, memory_type, presets_type,
+    quality_type, reducing_gap_type, renditions_type, shard_type, ssim_type)
+from imgc import watermark
+from imgc.dedup import LINK_MODES, DedupIndex, link_file
+from imgc.manifest import Manifest
+from imgc.metrics import Metrics, MetricsWriter
+from imgc.resize import (
+    DEFAULT_FILTER, DEFAULT_REDUCING_GAP, RESAMPLE_FILTERS)
+from imgc.encoder import DEFAULT_PRESET, OUTPUT_FORMATS, PRESETS, output_name
+from imgc.plan import (
+    BATCH_SIZE, batches, order_by_cost, plan_item, summary)
+from imgc.rendition import output_paths, parse_renditions
+from imgc.pool import EXECUTORS, create_pool, default_workers
+from imgc.scheduler import MemoryBudget, estimate_memory
+from imgc.search import MAX_TRIALS, MIN_QUALITY
+from imgc.workqueue import (
+    DEFAULT_LEASE, DEFAULT_MAX_ATTEMPTS, WorkQueue, in_shard)
+from imgc.pipeline import DEFAULT_READERS, DEFAULT_WRITERS, Pipeline
+from imgc.progress import MODES, Counter, Progress, create_reporter
+from imgc.job import Job, Options, Result
+
+
+def image_entries(entries, subdirs):
+    '''
+    yields image files of os.scandir entries, appending names
+    of directories to subdirs
+    '''
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.name)
+            continue
+        if extension(entry.name) not in IMAGE_EXTS:
+            continue
+        if not entry.is_file():
+            continue
+        yield entry
+
+
+def read_files_from(path):
+    '''
+    lazily yields paths listed NUL-delimited in the file at path,
+    or on stdin if path is -
+    '''
+    if path == '-':
+        yield from read_nul_delimited(sys.stdin.buffer)
+    else:
+        with open(path, 'rb') as fp:
+            yield from read_nul_delimited(fp)
 
 
 class ImageHandler:
     dir_postfix = 'imgc'
     dir_files = '_files-imgc'
 
-    imgs_done = 0
-    imgs_total = 0
+    executor = 'thread'
+    workers = None
+    queue_size = None
+    read_ahead = 0
+    readers = DEFAULT_READERS
+    writers = DEFAULT_WRITERS
+    write_queue = None
+    max_memory = None
+    max_image_pixels = None
+    format = None
+    order = 'discovery'
+    dry_run = False
+    files_from = None
+    incremental = False
+    hash = False
+    dedup = False
+    dedup_link = 'hardlink'
+    shard = None
+    work_queue = None
+    lease = DEFAULT_LEASE
+    max_attempts = DEFAULT_MAX_ATTEMPTS
+    queue_poll = 1.0
+    metrics_file = None
+    metrics_interval = 10.0
+    progress = 'auto'  # see imgc.progress
+    quiet = False
+    keep_smaller = False  # see imgc.worker.resize_image
+
+    # views of self.stats counters, see imgc.progress
+    imgs_done = Counter('done')
+    imgs_total = Counter('found')
+    imgs_processed = Counter('processed')
+    imgs_errors = Counter('errors')
+    imgs_cancelled = Counter('cancelled')
+    imgs_unchanged = Counter('unchanged')  # copied, see imgc.worker
+    imgs_skipped = Counter('skipped')
+    imgs_duplicates = Counter('duplicates')
+    dedup_bytes = 0  # sources not decoded thanks to dedup
+    dedup_seconds = 0.0  # processing time of their originals
+    manifest_save_every = 100
 
     def __init__(self, queue=None, **kwargs):
+        self.stats = Progress()
         self.__dict__.update(kwargs)
-        self.images = [] # list of (src, dst) tuples
+        self.manifests = {} # output root -> Manifest, incremental mode only
         # threading.Thread.__init__(self)
         # self.queue = queue
         # self._stop = threading.Event()
         self.finished = False
-        self.generate_image_paths()
-    
+        self.completed = threading.Event() # set once finished
+        self.stopped = False
+        self.cancel_event = threading.Event() # see imgc.cancel
+        self.discovered = False
+        self.lock = threading.Lock()
+        self.roots = set() # output roots known to exist
+        self.file_stems = set() # outputs of file arguments without extension
+        self.admitted = {} # Job.key -> estimated memory, with max_memory only
+        self.dedup_index = DedupIndex() if self.dedup else None
+        self.duplicates = {} # original src -> [(src, dst)] waiting for it
+        self.originals = {} # original src -> Result, once processed
+        self.queue = None # WorkQueue, with work_queue only
+        self.claimed = {} # Job.key -> (job id, Options) of claimed jobs
+        self.keys = itertools.count() # Job.key of submitted jobs
+        self.pipeline = None # with read_ahead only
+        self.savings = {} # output dir -> [bytes in, bytes out], keep_smaller
+        self.sources_kept = 0
+        self.reporter = create_reporter(self.stats, self.progress, self.quiet)
+        self.budget = MemoryBudget(self.max_memory) if self.max_memory else None
+        if self.max_image_pixels is not None:
+            from imgc.worker import set_max_image_pixels
+            set_max_image_pixels(self.max_image_pixels)
+        self.params = self.options.params()
+        self.renditions = parse_renditions(self.size)
+        self.metrics = Metrics()
+        self.metrics_writer = None
+        if self.metrics_file:
+            self.metrics_writer = MetricsWriter(
+                self.metrics_file, self.metrics, self.metrics_interval)
+
+    def scan_directory(self, src, dst):
+        '''
+        lazily yields (src, dst) tuples for images found in src tree
+        output directories are created once, when the first image
+        of the directory is found
+        '''
+        stack = [(src, dst)]
+        while stack:
+            src_dir, dst_dir = stack.pop()
+            subdirs = []
+            dst_dir_exists = False
+            try:
+                entries = os.scandir(src_dir)
+            except OSError as err:
+                self.stats.error(src_dir, err)
+                continue
+            with entries:
+                images = image_entries(entries, subdirs)
+                if self.format:
+                    # a.jpg and a.png would both become a.webp, the whole
+                    # directory is listed first to find colliding stems
+                    images = list(images)
+                    stems = collections.Counter(
+                        os.path.splitext(entry.name)[0] for entry in images)
+                for entry in images:
+                    if not dst_dir_exists and not self.dry_run:
+                        os.makedirs(dst_dir, exist_ok=True)
+                        dst_dir_exists = True
+                    yield entry.path, output_name(
+                        os.path.join(dst_dir, entry.name), self.format,
+                        keep_extension=bool(self.format) and
+                        stems[os.path.splitext(entry.name)[0]] > 1)
+            # depth-first, subdirectories in alphabetical order
+            for d in sorted(subdirs, reverse=True):
+                stack.append(
+                    (os.path.join(src_dir, d), os.path.join(dst_dir, d)))
+
+    def sources(self):
+        '''
+        paths given as arguments, followed by paths read from files_from
+        '''
+        yield from self.src_images or []
+        if self.files_from:
+            yield from read_files_from(self.files_from)
+
+    def make_root(self, root):
+        if root not in self.roots:
+            if not self.dry_run:
+                os.makedirs(root, exist_ok=True) # target path must always exist
+            self.roots.add(root)
+
     def generate_image_paths(self):
-        for arg in self.src_images:
+        '''
+        lazily yields (src, dst) tuples for all images to be processed
+        '''
+        for arg in self.sources():
 
             # process directory path
             if os.path.isdir(arg):
-                src = os.path.abspath(arg)
-                dst = os.path.abspath("{}-{}".format(src, self.dir_postfix))
-                if not os.path.exists(dst):
-                    os.makedirs(dst) # target path must always exist
-
-                for root, dirs, files in os.walk(src):
-                    for d in dirs:
-                        src_dir = os.path.join(root, d)
-                        dst_dir = src_dir.replace(src, dst)
-                    for f in files:
-                        if extension(f) not in IMAGE_EXTS: continue
-                        # if os.path.splitext(f)[1][1:].strip().lower() not in IMAGE_EXTS: continue
-                        src_file = os.path.join(root, f)
-                        dst_file = src_file.replace(src, dst)
-
-                        parent_dir = os.path.dirname(dst_file)
-                        print(parent_dir)
-                        if not os.path.exists(parent_dir):
-                            os.makedirs(parent_dir)
-                        print(dst_file)
-                        self.append((src_file, dst_file))
+                src = base = os.path.abspath(arg)
+                root = os.path.abspath("{}-{}".format(src, self.dir_postfix))
+                self.make_root(root)
+                paths = self.scan_directory(src, root)
 
             # process file path
             elif os.path.isfile(arg):
                 src = os.path.abspath(arg)
-                dst_dir = os.path.join(os.path.dirname(src), self.dir_files)
-                if not os.path.exists(dst_dir):
-                    os.makedirs(dst_dir)
-                dst = os.path.join(dst_dir, os.path.basename(arg))
-                self.append((src, dst))
-            # print (self.images)
-        self.imgs_total = len(self.images)
-
-    # def stop(self):
-    #     self._stop.set()
-
-    # def stopped(self):
-    #     return self._stop.isSet()
-
-    def terminate_pool(self):
-        if not self.finished:
-            self.pool.close()
-            self.pool.terminate()
+                base = os.path.dirname(src)
+                root = os.path.join(os.path.dirname(src), self.dir_files)
+                self.make_root(root)
+                dst = os.path.join(root, os.path.basename(arg))
+                if self.format:
+                    # sources differing only in extension, see scan_directory
+                    stem = os.path.splitext(dst)[0]
+                    dst = output_name(dst, self.format,
+                                      keep_extension=stem in self.file_stems)
+                    self.file_stems.add(stem)
+                paths = [(src, dst)]
+
+            else:
+                continue
+
+            for path_tuple in paths:
+                if self.shard and not in_shard(
+                        os.path.relpath(path_tuple[0], base), self.shard):
+                    continue
+                if self.is_up_to_date(path_tuple, root):
+                    self.stats.add(skipped=1)
+                    continue
+                if self.dedup and self.is_duplicate(path_tuple):
+                    continue
+                yield path_tuple
+
+    def is_duplicate(self, path_tuple):
+        '''
+        True if source of path_tuple is a copy of an already queued
+        image, its outputs are then linked to outputs of that image
+        '''
+        src, dst = path_tuple
+        original = self.dedup_index.original(src)
+        if original is None:
+            return False
+        with self.lock:
+            self.stats.add(duplicates=1)
+            result = self.originals.get(original)
+            if result is None:
+                self.duplicates.setdefault(original, []).append(path_tuple)
+                return True
+        self.link_duplicate(result, path_tuple)
+        return True
+
+    def link_duplicates(self, result):
+        '''
+        links outputs of all duplicates waiting for result,
+        returns list of linked paths
+        '''
+        if not self.dedup:
+            return []
+        with self.lock:
+            self.originals[result.src] = result
+            waiting = self.duplicates.pop(result.src, [])
+        linked = []
+        for path_tuple in waiting:
+            linked.extend(self.link_duplicate(result, path_tuple))
+        return linked
+
+    def link_duplicate(self, result, path_tuple):
+        if not result.ok:  # an identical source would fail the same way
+            return []
+        src, dst = path_tuple
+        outputs = output_paths(dst, self.renditions)
+        for original, path in zip(
+                output_paths(result.dst, self.renditions), outputs):
+            link_file(original, path, self.dedup_link)
+        with self.lock:
+            self.dedup_bytes += result.bytes_in
+            self.dedup_seconds += result.elapsed
+            manifest = self.find_manifest(dst)
+            if manifest is not None:
+                manifest.update(src, self.params)
+        return outputs
+
+    def cancel(self):
+        '''
+        stops the run as soon as possible: no more images are submitted,
+        images in flight are given up between their processing stages and
+        their partial outputs removed, outputs of finished ones are kept,
+        returns right away, see wait()
+        '''
+        self.stopped = True
+        self.cancel_event.set()
         return self.finished
 
+    def wait(self, timeout=None):
+        '''
+        blocks until the run is finished, returns False on timeout
+        '''
+        return self.completed.wait(timeout)
+
+    def summary(self):
+        '''
+        counters of the run with (src, error) of every failed image,
+        see imgc.progress.Progress.summary, and with keep_smaller
+        {output dir: (bytes in, bytes out)} as 'savings'
+        '''
+        summary = self.stats.summary()
+        if self.keep_smaller:
+            with self.lock:
+                summary['savings'] = {
+                    directory: tuple(totals)
+                    for directory, totals in self.savings.items()}
+        return summary
+
     def on_finish(self, x):
-        print("{}: finished successfully!".format(self.__class__.__name__))
-        self.finished = True        
+        self.save_manifests()
+        if self.metrics_writer:
+            self.metrics_writer.write()
+        self.reporter.close()
+        if self.imgs_skipped:
+            self.reporter.message(
+                "Skipped up to date: {}".format(self.imgs_skipped))
+        if self.imgs_unchanged:
+            self.reporter.message(
+                "Copied unchanged: {}".format(self.imgs_unchanged))
+        if self.imgs_duplicates:
+            self.print_dedup_summary()
+        if self.keep_smaller:
+            self.print_savings_summary()
+        if self.queue:
+            self.print_queue_summary()
+        if self.stopped:
+            self.reporter.message(
+                "{}: cancelled, {} images not finished".format(
+                    self.__class__.__name__, self.imgs_cancelled))
+        else:
+            self.reporter.message(
+                "{}: finished successfully!".format(self.__class__.__name__))
+        self.finished = True
         self.error = False
+        self.completed.set()
 
-    def on_error(self, x):
-        raise x
-        # print("{}: error - {}".format(self.__class__.__name__, str(x)))
-        # self.finished = True
-        # self.error = True
+    def on_result(self, result):
+        # called in the parent, by the pool's result handler thread,
+        # the image is counted as processed whatever its bookkeeping
+        # raises, as a failure then, so that the run always finishes
+        try:
+            self.slots.release()
+            self.record_result(result)
+        except Exception as err:
+            # e.g. source removed before its manifest entry was written
+            result.error = result.error or str(err) or repr(err)
+        finally:
+            self.stats.add_result(result)
+            with self.lock:
+                self.stats.add(processed=1)
+                done = self.discovered and \
+                    self.imgs_processed == self.imgs_total
+        if done:
+            self.finish()
+
+    def record_result(self, result):
+        if self.budget:
+            self.budget.release(self.admitted.pop(result.key))
+        if not result.cancelled:
+            self.metrics.add(result)
+        if self.metrics_writer:
+            self.metrics_writer.maybe_write()
+        claim = self.claimed.pop(result.key) if self.queue else None
+        if result.ok:
+            # claimed jobs ran with options of the run which added them
+            params = claim[1].params() if claim else None
+            with self.lock:
+                self.update_manifest(result, params)
+                if self.keep_smaller:
+                    self.add_savings(result)
+        if claim is not None:
+            job_id, options = claim
+            if result.cancelled:
+                self.queue.release(job_id)
+            else:
+                self.queue.complete(job_id, result.error)
+        self.link_duplicates(result)
+
+    def on_error(self, jobs, exc):
+        # a task raised instead of returning its results,
+        # all of its jobs are counted as failed, so that the run finishes
+        for job in jobs:
+            self.on_result(Result.for_job(job, str(exc) or repr(exc)))
+
+    def on_results(self, results):
+        for result in results:
+            self.on_result(result)
+
+    def plan(self):
+        '''
+        header-only plan of all images, see imgc.plan
+        '''
+        options = self.options
+        reducing_gap = options.reducing_gap
+        return [plan_item(src, dst, self.renditions, reducing_gap, options)
+                for src, dst in self.generate_image_paths()]
+
+    def tasks(self):
+        '''
+        yields lists of (src, dst, estimated memory or None, claim) tuples,
+        each list is sent to a worker as a single task, claim is
+        (job id, Options) of work queue jobs, None otherwise
+        '''
+        if self.queue:
+            yield from self.queue_tasks()
+            return
+        if self.order != 'cost':
+            for src, dst in self.generate_image_paths():
+                yield [(src, dst, None, None)]
+            return
+
+        batch_size = min(BATCH_SIZE, self.slots_total)
+        for batch in batches(order_by_cost(self.plan()), batch_size=batch_size):
+            yield [(item.src, item.dst, item.memory, None) for item in batch]
+
+    def queue_tasks(self):
+        '''
+        adds discovered images to the shared work queue, then yields
+        tasks claimed from it until no work is left there
+        '''
+        self.queue.add(self.generate_image_paths(), self.params)
+        while not self.stopped:
+            claimed = self.queue.claim()
+            if claimed is None:
+                if not self.queue.unfinished():
+                    return
+                # wait for other runs, or for their leases to expire
+                time.sleep(self.queue_poll)
+                continue
+            job_id, src, dst, params = claimed
+            # jobs are processed with options of the run which added them
+            options = Options(**dict(self.__dict__, **params))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            yield [(src, dst, None, (job_id, options))]
+
+    def feed(self):
+        '''
+        submits jobs to the pool while the tree is being walked,
+        keeping at most queue_size of them in flight
+        '''
+        from imgc.worker import process, process_batch
+
+        options = self.options
+        for task in self.tasks():
+            for _ in task:
+                self.slots.acquire()
+            jobs = []
+            for src, dst, memory, claim in task:
+                key = next(self.keys)
+                if claim is not None:
+                    self.claimed[key] = claim
+                jobs.append(Job(
+                    src, dst, options if claim is None else claim[1],
+                    key=key))
+            if self.budget:
+                costs = [estimate_memory(src) if memory is None else memory
+                         for src, dst, memory, claim in task]
+                self.budget.acquire(sum(costs))
+                for job, cost in zip(jobs, costs):
+                    self.admitted[job.key] = cost
+            if self.stopped:
+                break
+            with self.lock:
+                self.stats.add(found=len(task))
+            if self.pipeline:
+                self.pipeline.submit(jobs)
+                continue
+            on_error = partial(self.on_error, jobs)
+            if len(jobs) == 1:
+                self.pool.apply_async(
+                    process, (jobs[0],),
+                    callback=self.on_result, error_callback=on_error)
+            else:
+                self.pool.apply_async(
+                    process_batch, (jobs,),
+                    callback=self.on_results, error_callback=on_error)
+
+        if self.pipeline:
+            self.pipeline.close_reads()
+        with self.lock:
+            self.discovered = self.stats.discovered = True
+            done = self.imgs_processed == self.imgs_total
+        if done:
+            self.finish()
+
+    def finish(self):
+        self.pool.close()
+        if self.pipeline:
+            self.pipeline.close()
+        if self.queue:
+            self.heartbeat_stop.set()
+        if self.imgs_total or self.stopped:
+            self.on_finish(None)
+            return
+
+        self.save_manifests()
+        self.reporter.close()
+        if self.queue:
+            self.print_queue_summary()
+        elif self.imgs_skipped:
+            self.reporter.message(
+                "All {} images are up to date".format(self.imgs_skipped))
+        else:
+            self.reporter.message("No images found!")
+        self.finished = True
+        self.completed.set()
 
     def run(self):
-
-        if not self.images: 
-            print("No images found!") 
-            sys.exit()
-
-        # print("Images found: {}".format(self.imgs_total))
-        print("Images found: {}".format(len(self.images)))
-        # print(self.images)
-
-        self.pool = ThreadPool(self.workers)
-
-        time_start = time.time()
-        # self.pool.starmap(self.resize_image, self.images)
-        self.pool.starmap_async(
-            self.resize_image, self.images, 1,
-            self.on_finish, self.on_error)
-        # pool.close()
-        # pool.join()
-        # time_end = time.time()
-
-        # # window = tkinter.Tk()
-        # # window.wm_withdraw()
-        # # tkinter.messagebox.showinfo('imgc - work finished', 'Images compressed: {}'.format(self.imgs_done))
-        # print("Time elapsed: {}".format(time_end - time_start))
-
-    def append(self, path_tuple):
-        self.images.append(path_tuple)
-
-    def print_status(self, dst):
-        print("[{}/{}] processed image {}".format(
-            self.imgs_done, self.imgs_total, os.path.split(dst)[1]))
-
-    # FIXME: add watermark feature
-    # def watermark():
-    #     try:
-    #         watermark = Image.open(self.wmfile)
-    #         # if extension(self.wmfile) in "png":
-    #         #     watermark.load()                
-    #         wm_oldsize = watermark.size
-    #         wm_newdim = min(wnew, hnew) * 0.2
-    #         wm_oldindex, wm_olddim = min(enumerate(wm_oldsize))
-    #         print(wm_oldindex, wm_olddim)
-    #         wm_ratio = wm_newdim/wm_olddim
-    #         wm_newsize = (int(wm_oldsize[0] * wm_ratio), 
-    #                       int(wm_oldsize[1] * wm_ratio))
-    #         print(wm_newsize)
-    #         watermark = watermark.resize(wm_newsize)
-    #         # mask = watermark.convert("L").point(lambda x: min(x, 50))
-    #         # .point(lambda x: 240)
-    #         # mask.show()
-    #         # watermark.putalpha(mask)
-    #         im.paste(watermark, (0, 0), watermark)
-    #     except AttributeError:
-    #         pass
+        # decoded once here, forked worker processes inherit it
+        watermark.preload(self.options)
+        if self.executor == 'process':
+            import multiprocessing
+
+            self.cancel_event = multiprocessing.Event()
+        from imgc.worker import init_worker
+
+        self.pool = create_pool(
+            self.executor, self.workers, initializer=init_worker,
+            initargs=(self.cancel_event, self.max_image_pixels))
+        workers = self.workers or default_workers()
+        self.slots_total = self.queue_size or workers * 4
+        self.slots = threading.BoundedSemaphore(self.slots_total)
+
+        if self.read_ahead:
+            self.pipeline = Pipeline(
+                self.pool, self.on_result, self.read_ahead,
+                self.readers, self.writers, self.write_queue,
+                self.cancel_event)
+        if self.work_queue:
+            self.queue = WorkQueue(
+                self.work_queue, lease=self.lease,
+                max_attempts=self.max_attempts)
+            self.heartbeat_stop = threading.Event()
+            threading.Thread(
+                target=self.queue.keep_alive, args=(self.heartbeat_stop,),
+                daemon=True).start()
+
+        self.reporter.start()
+        self.feeder = threading.Thread(target=self.feed, daemon=True)
+        self.feeder.start()
+
+    def print_plan(self):
+        '''
+        prints what would be done, without decoding any pixels
+        '''
+        items = self.plan()
+        if self.order == 'cost':
+            items = order_by_cost(items)
+        for item in items:
+            if item.error:
+                print("{}: ERROR {}".format(item.src, item.error))
+                continue
+            if item.unchanged:
+                print("{}: {} {}x{} -> unchanged, copied".format(
+                    item.src, item.format, item.size[0], item.size[1]))
+                continue
+            print("{}: {} {}x{}{} -> {} (cost {:.0f})".format(
+                item.src, item.format, item.size[0], item.size[1],
+                ' decoded at 1/%d' % item.scale if item.scale > 1 else '',
+                ', '.join('%dx%d' % target for target in item.targets),
+                item.cost))
+
+        projected = summary(items)
+        print("Images: {images}, unreadable: {errors}, "
+              "copied unchanged: {unchanged}".format(**projected))
+        print("Pixels in: {pixels_in}, pixels out: {pixels_out}".format(
+            **projected))
+        print("Estimated cost: {cost:.0f}, tasks: {batches}".format(
+            **projected))
+        print("Largest image memory estimate: {:.1f} MB".format(
+            projected['max_memory'] / 1024.0 / 1024.0))
+        if self.imgs_skipped:
+            print("Skipped up to date: {}".format(self.imgs_skipped))
+        if self.imgs_duplicates:
+            print("Duplicates to be linked: {}, files hashed: {}".format(
+                self.imgs_duplicates, self.dedup_index.hashed))
+
+    def print_queue_summary(self):
+        counts = self.queue.counts()
+        self.reporter.message("Work queue: done {}, failed {}, left {}".format(
+            counts.get('done', 0), counts.get('failed', 0),
+            counts.get('pending', 0) + counts.get('running', 0)))
+
+    def print_dedup_summary(self):
+        self.reporter.message("Duplicates linked: {}, files hashed: {}".format(
+            self.imgs_duplicates, self.dedup_index.hashed))
+        self.reporter.message(
+            "Saved: {:.1f} MB not decoded, {:.1f}s of processing".format(
+                self.dedup_bytes / 1024.0 / 1024.0, self.dedup_seconds))
+
+    def add_savings(self, result):
+        # every rendition is compared with its source, in its own directory
+        for path, size in result.output_bytes.items():
+            totals = self.savings.setdefault(os.path.dirname(path), [0, 0])
+            totals[0] += result.bytes_in
+            totals[1] += size
+        self.sources_kept += result.sources_kept
+
+    def print_savings_summary(self):
+        self.reporter.message(
+            "Kept smaller sources: {}".format(self.sources_kept))
+        for directory, (bytes_in, bytes_out) in sorted(self.savings.items()):
+            self.reporter.message(
+                "Saved in {}: {:.1f} of {:.1f} MB ({:.0f}%)".format(
+                    directory, (bytes_in - bytes_out) / 1024.0 / 1024.0,
+                    bytes_in / 1024.0 / 1024.0,
+                    100.0 * (bytes_in - bytes_out) / bytes_in
+                    if bytes_in else 0.0))
+
+    @property
+    def options(self):
+        return Options(**self.__dict__)
+
+    def get_manifest(self, root):
+        # the feeder adds roots while results are recorded
+        with self.lock:
+            if root not in self.manifests:
+                self.manifests[root] = Manifest(root, use_hash=self.hash)
+            return self.manifests[root]
+
+    def find_manifest(self, dst):
+        '''
+        manifest of the output root dst is in, looked up by the parent
+        directories of dst rather than by scanning all roots
+        '''
+        directory = os.path.dirname(dst)
+        while True:
+            manifest = self.manifests.get(directory)
+            if manifest is not None:
+                return manifest
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None
+            directory = parent
+
+    def update_manifest(self, result, params=None):
+        '''
+        records result in its manifest, with params of its options
+        if they are not the options of this run
+        '''
+        manifest = self.find_manifest(result.dst)
+        if manifest is None:
+            return
+        manifest.update(
+            result.src, self.params if params is None else params)
+        # result is counted as done once it is recorded, see on_result
+        if (self.imgs_done + 1) % self.manifest_save_every == 0:
+            manifest.save()
+
+    def save_manifests(self):
+        with self.lock:
+            manifests = list(self.manifests.values())
+        for manifest in manifests:
+            manifest.save()
+
+    def is_up_to_date(self, path_tuple, root):
+        if not self.incremental:
+            return False
+        src, dst = path_tuple
+        return self.get_manifest(root).is_fresh(
+            src, output_paths(dst, self.renditions), self.params)
 
     def resize_image(self, src, dst):
-        # print("resizing")
-        pattern = self.size
-        quality = self.quality
-
-        try:
-            im = Image.open(src)
-
-            new_size = ImageSize.parse(pattern, image=im)
-            # print('new_size:', new_size)
-            im = im.resize(new_size, Image.BICUBIC)
-
-            if os.path.splitext(dst)[1][1:].strip().lower() not in IMAGE_JPG:
-                im.save(dst)
-            else:
-                # quality supported by jpegs only
-                im.save(dst, 'JPEG', quality=quality)
-
-            print("saved: %s" % dst)
-            self.imgs_done += 1
-        except OSError as err:  # e.g. file is corrupt and cannot be open
+        # synchronous processing of a single image in the current thread
+        from imgc.worker import process
+        return process(Job(src, dst, self.options))
+
+
+def submit_to_server(args):
+    '''
+    runs the batch on a resident server instead of a local pool,
+    returns the exit status, 1 if some images failed
+    '''
+    from imgc.client import submit_paths
+
+    options = {key: value for key, value in vars(args).items()
+               if key not in ('src_images', 'files_from', 'connect',
+                              'dry_run')}
+    # the server resolves paths against its own working directory
+    for key in ('wmfile', 'metrics_file', 'work_queue', 'profile'):
+        if options.get(key):
+            options[key] = os.path.abspath(options[key])
+    paths = list(args.src_images)
+    if args.files_from:
+        paths.extend(read_files_from(args.files_from))
+    paths = [os.path.abspath(path) for path in paths]
+    status = 0
+    for message in submit_paths(paths, options, args.connect):
+        if message['event'] == 'result':
+            if message['error']:
+                print('ERROR')
+                print(message['error'])
+                status = 1
+            for path in message['outputs']:
+                print("saved: %s" % path)
+        elif message['event'] == 'error':
             print('ERROR')
-            print(err)
-
-        try:
-            self.on_image_processed(self.imgs_done, self.imgs_total)
-            print ("method called")
-        except AttributeError:
-            self.print_status(dst)
+            print(message['error'])
+            return 1
+        else:
+            print("Processed: {images}, errors: {errors}, "
+                  "skipped up to date: {skipped}".format(**message))
+    return status
 
 
-def main():
+def main(argv=None):
     # import tkinter
     # import tkinter.messagebox
 
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['serve']:
+        from imgc.server import main as serve
+        return serve(argv[1:])
+
     parser = argparse.ArgumentParser(description="Batch process pictures")
-    parser.add_argument('src_images', metavar="path", type=str, nargs='+')
+    parser.add_argument('src_images', metavar="path", type=str, nargs='*')
+    parser.add_argument(
+        '--files-from',
+        default=None, type=str, metavar='FILE',
+        help='Read NUL-delimited paths from FILE, or from stdin if FILE '
+             'is -, e.g. the output of find -print0')
     parser.add_argument(
         '-q', '--quality',
         default=90, type=quality_type,
         help='Quality for JPEG images')
     parser.add_argument(
         '-s', '--size',
-        default="1000x", type=size_type,
-        help='New image size')
+        default=None, type=renditions_type, action='append',
+        help='New image size, may be repeated or comma separated to save '
+             'several renditions from a single decode, each rendition '
+             'may set its own quality, suffix and dir: '
+             '-s 2000x -s 400x:quality=70:suffix=_small '
+             '-s 150x150:dir=thumbs (default: 1000x), sizes may end with '
+             'ImageMagick flags: > shrinks only, < enlarges only, ^ fills, '
+             '! is exact, images which need no change are copied as they are')
+    parser.add_argument(
+        '--format',
+        default=None, choices=sorted(OUTPUT_FORMATS),
+        help='Convert all images to this format, output file names get '
+             'its extension')
+    parser.add_argument(
+        '--preset',
+        default=DEFAULT_PRESET, choices=sorted(PRESETS),
+        help='Encoder preset: fast encodes quickly, small spends more CPU '
+             'time on smaller files (progressive JPEG, maximum PNG and WebP '
+             'compression effort)')
+    parser.add_argument(
+        '--encoder-options',
+        default=None, type=encoder_options_type, action='append',
+        metavar='FORMAT:KEY=VALUE,...',
+        help='Pillow save options of a format overriding the preset, '
+             'may be repeated: --encoder-options jpeg:subsampling=4:4:4 '
+             '--encoder-options png:compress_level=9')
+    parser.add_argument(
+        '--target-bytes',
+        default=None, type=memory_type,
+        help='Search for the highest JPEG quality, up to --quality, '
+             'producing at most that many bytes, e.g. 150K')
+    parser.add_argument(
+        '--target-ssim',
+        default=None, type=ssim_type,
+        help='Search for the lowest JPEG quality, up to --quality, keeping '
+             'structural similarity to the resized image at least that, '
+             'e.g. 0.95')
+    parser.add_argument(
+        '--min-quality',
+        default=MIN_QUALITY, type=quality_type,
+        help='Lowest JPEG quality considered by the quality search')
+    parser.add_argument(
+        '--max-trials',
+        default=MAX_TRIALS, type=int,
+        help='Maximum number of encode trials per image and target')
+    parser.add_argument(
+        '--filter', dest='resample',
+        default=DEFAULT_FILTER, choices=sorted(RESAMPLE_FILTERS),
+        help='Resampling filter used for the final resize')
+    parser.add_argument(
+        '--reducing-gap',
+        default=DEFAULT_REDUCING_GAP, type=reducing_gap_type,
+        help='Decode-time and integer downscaling aggressiveness: '
+             'smaller values are faster, larger values are closer '
+             'to a full resolution resize, 0 disables it')
     parser.add_argument(
         '-w', '--workers',
-        default=2, type=int,
-        help='Number of pool workers')
+        default=default_workers(), type=int,
+        help='Number of pool workers (defaults to the number of CPUs)')
+    parser.add_argument(
+        '--frame-workers',
+        default=1, type=int,
+        help='Threads resizing frames of every long animated GIF, '
+             'frames are otherwise resized one by one')
+    parser.add_argument(
+        '-e', '--executor',
+        default='thread', choices=EXECUTORS,
+        help='Run workers as threads or as separate processes')
+    parser.add_argument(
+        '--queue-size',
+        default=None, type=int,
+        help='Maximum number of images queued for processing while '
+             'the tree is being walked (defaults to 4 per worker)')
+    parser.add_argument(
+        '--read-ahead',
+        default=0, type=int, metavar='N',
+        help='Read contents of the next N images into memory in separate '
+             'reader threads, so that workers only decode and encode and '
+             'outputs are saved by writer threads, helps on network '
+             'filesystems')
+    parser.add_argument(
+        '--readers',
+        default=DEFAULT_READERS, type=int,
+        help='Reader threads, with --read-ahead')
+    parser.add_argument(
+        '--writers',
+        default=DEFAULT_WRITERS, type=int,
+        help='Writer threads, with --read-ahead')
+    parser.add_argument(
+        '--write-queue',
+        default=None, type=int, metavar='N',
+        help='Encoded images waiting for writers, with --read-ahead '
+             '(defaults to --read-ahead)')
+    parser.add_argument(
+        '--order',
+        default='discovery', choices=('discovery', 'cost'),
+        help='Process images as they are found, or read all headers first '
+             'and process the most expensive images first, sending tiny '
+             'ones to workers in batches')
+    parser.add_argument(
+        '-n', '--dry-run',
+        action='store_true',
+        help='Print the plan and the projected work without processing '
+             'or decoding images')
+    parser.add_argument(
+        '--max-memory',
+        default=None, type=memory_type,
+        help='Admit images for processing only while their estimated '
+             'decoded size fits into this budget, e.g. 2G')
+    parser.add_argument(
+        '--max-image-pixels',
+        default=None, type=int,
+        help='Skip images larger than this many pixels as decompression '
+             'bombs, 0 disables the check (default: Pillow limit)')
+    parser.add_argument(
+        '-i', '--incremental',
+        action='store_true',
+        help='Skip images processed by a previous run with the same '
+             'options, tracked in a manifest in the output directory')
+    parser.add_argument(
+        '--hash',
+        action='store_true',
+        help='In incremental mode, also store content hashes, so that '
+             'touched but unmodified images are skipped too')
+    parser.add_argument(
+        '--dedup',
+        action='store_true',
+        help='Process byte-identical images once and link outputs of '
+             'the copies to the first result, contents are hashed only '
+             'for images of equal size')
+    parser.add_argument(
+        '--dedup-link',
+        default='hardlink', choices=LINK_MODES,
+        help='How outputs of duplicates are created, hardlinks and '
+             'reflinks fall back to copies where not supported')
+    parser.add_argument(
+        '--shard',
+        default=None, type=shard_type, metavar='I/N',
+        help='Process only the I-th of N disjoint parts of the images, '
+             'from 0 to N-1, e.g. on N hosts sharing a mount')
+    parser.add_argument(
+        '--work-queue',
+        default=None, type=str, metavar='DB',
+        help='Add images to a SQLite work queue shared by cooperating '
+             'runs and process jobs claimed from it, paths are optional '
+             'for runs which only process')
+    parser.add_argument(
+        '--lease',
+        default=DEFAULT_LEASE, type=float, metavar='SECONDS',
+        help='Work queue lease, jobs of runs which stopped renewing it '
+             'are claimed again')
+    parser.add_argument(
+        '--max-attempts',
+        default=DEFAULT_MAX_ATTEMPTS, type=int,
+        help='Number of times a failed work queue job is tried')
+    parser.add_argument(
+        '--metrics', dest='metrics_file',
+        default=None, type=str,
+        help='Export per-stage timing histograms and byte/pixel counters '
+             'to a JSON file, or append them to an .ndjson file')
+    parser.add_argument(
+        '--metrics-interval',
+        default=10.0, type=float,
+        help='Export metrics every N seconds while running, 0 to export '
+             'them only at the end')
+    parser.add_argument(
+        '--profile',
+        default=None, type=str, metavar='DIR',
+        help='Dump cProfile stats of every worker into DIR')
+    parser.add_argument(
+        '--progress',
+        default='auto', choices=MODES,
+        help='Progress output: a bar redrawn in place, a plain status line '
+             'every few seconds, or JSON lines, auto uses the bar on a '
+             'terminal')
+    parser.add_argument(
+        '--quiet',
+        action='store_true',
+        help='Print errors only, no progress or summary')
+    parser.add_argument(
+        '--connect',
+        default=None, type=str, metavar='SOCKET',
+        help='Send the batch to a resident server started with '
+             '"imgc serve" instead of processing it in this process')
+    parser.add_argument(
+        '--keep-smaller',
+        action='store_true',
+        help='Copy the source instead of a rendition which would not be '
+             'smaller than it, e.g. already optimized images, and report '
+             'bytes saved per output directory')
+    parser.add_argument(
+        '--try-presets',
+        default=None, type=presets_type, metavar='PRESET,...',
+        help='Also encode every rendition with these presets and keep '
+             'the smallest result, e.g. --try-presets small')
+    parser.add_argument(
+        '--strip-metadata',
+        action='store_true',
+        help='Save outputs without EXIF, XMP, comments and ICC profiles, '
+             'images with a profile are converted to sRGB first')
+    parser.add_argument(
+        '--keep-exif',
+        action='store_true',
+        help='Copy EXIF of sources into outputs, including GPS positions, '
+             'serial numbers and thumbnails, their orientation is reset')
+    parser.add_argument(
+        '--srgb',
+        action='store_true',
+        help='Convert CMYK images and images with an ICC profile to sRGB, '
+             'outputs are saved without a profile')
     parser.add_argument(
         '-f', '--wmfile',
         default=None, type=str,
-        help='Path to watermark')
+        help='Path to a watermark image pasted onto every output, '
+             'transparent areas of PNGs are kept')
+    parser.add_argument(
+        '--wm-position',
+        default=watermark.DEFAULT_POSITION, choices=watermark.POSITIONS,
+        help='Where the watermark is placed')
+    parser.add_argument(
+        '--wm-opacity',
+        default=watermark.DEFAULT_OPACITY, type=fraction_type,
+        help='Opacity of the watermark, from 0 to 1')
+    parser.add_argument(
+        '--wm-scale',
+        default=watermark.DEFAULT_SCALE, type=fraction_type,
+        help='Watermark size relative to the output, it fits into '
+             'that fraction of the output width and height')
+
+    args = parser.parse_args(argv)
+    if not (args.src_images or args.files_from or args.work_queue):
+        parser.error('at least one path, --files-from or --work-queue '
+                     'is required')
+    if args.wmfile and not os.path.isfile(args.wmfile):
+        parser.error('watermark {} not found'.format(args.wmfile))
+    if args.size is None:
+        args.size = ['1000x']
+    else:
+        args.size = [spec for specs in args.size for spec in specs]
+    try:
+        parse_renditions(args.size)  # e.g. -s 400x -s '400x>' collide
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.encoder_options:
+        encoder_options = {}
+        for fmt, options in args.encoder_options:
+            encoder_options.setdefault(fmt, {}).update(options)
+        args.encoder_options = encoder_options
+    if args.connect:
+        return submit_to_server(args)
 
-    args = parser.parse_args()
     imgh = ImageHandler(**vars(args))
+    if args.dry_run:
+        imgh.print_plan()
+        return
     imgh.run()
-
-    while not imgh.finished:
-        time.sleep(0.25)
+    try:
+        imgh.wait()
+    except KeyboardInterrupt:
+        imgh.cancel()
+        imgh.wait()
+
+    summary = imgh.summary()
+    if summary['cancelled'] or imgh.stopped:
+        return 130
+    if summary['failed']:
+        return 1
 
 
 if __name__ == '__main__':
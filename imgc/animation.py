@@ -0,0 +1,200 @@
+'''
+frame-aware resizing of animated GIFs
+
+Frames are decoded one at a time and every resized frame is written out
+as soon as it is ready, so memory stays bounded to a few frames instead of
+the whole animation, which Pillow's save_all would keep. A single palette
+is quantized once, from a few frames sampled across the animation, and is
+shared by all frames and outputs, resized frames are only mapped onto it.
+Frame durations, disposal methods and the loop count
+of the source are kept. Frames are written as full canvases, those with
+transparent areas are disposed to background so that the previous frame
+does not show through them.
+
+With frame_workers > 1, resizing and palette mapping of long animations
+is spread over a thread pool, decoding and writing stay sequential.
+'''
+
+import io
+from collections import deque
+
+from imgc import cancel, watermark
+from imgc.metrics import timed
+from imgc.resize import fast_resize
+
+
+# palette entry reserved for transparent pixels, quantized colors use the rest
+TRANSPARENT_INDEX = 255
+ALPHA_THRESHOLD = 128
+
+# frames sampled for the shared palette, and their maximum size
+PALETTE_SAMPLES = 8
+PALETTE_SAMPLE_SIZE = 128
+
+# frames in flight per frame worker
+FRAMES_PER_WORKER = 2
+
+
+def is_animated(im):
+    return im.format == 'GIF' and getattr(im, 'n_frames', 1) > 1
+
+
+def frames(im):
+    '''
+    lazily yields (frame, duration, disposal) for every frame of im,
+    frames are composited RGBA copies, which later seeks do not modify
+    '''
+    for index in range(im.n_frames):
+        im.seek(index)
+        frame = im.convert('RGBA')
+        yield (frame, im.info.get('duration', 0),
+               getattr(im, 'disposal_method', 0))
+
+
+def shared_palette(im):
+    '''
+    P image with the palette all frames are mapped onto, quantized once
+    from thumbnails of up to PALETTE_SAMPLES evenly spaced frames,
+    TRANSPARENT_INDEX is left unused
+    '''
+    from PIL import Image
+
+    count = min(im.n_frames, PALETTE_SAMPLES)
+    samples = []
+    for index in sorted({i * im.n_frames // count for i in range(count)}):
+        im.seek(index)
+        sample = im.convert('RGB')
+        sample.thumbnail((PALETTE_SAMPLE_SIZE, PALETTE_SAMPLE_SIZE))
+        samples.append(sample)
+    width, height = samples[0].size
+    mosaic = Image.new('RGB', (width, height * len(samples)))
+    for row, sample in enumerate(samples):
+        mosaic.paste(sample, (0, row * height))
+    return mosaic.quantize(colors=TRANSPARENT_INDEX)
+
+
+def quantize(frame, palette):
+    '''
+    frame mapped onto palette (a P image), transparent pixels are set
+    to TRANSPARENT_INDEX, returns (image, whether it has transparent pixels)
+    '''
+    from PIL import Image
+
+    alpha = frame.getchannel('A')
+    # without dithering, so that static areas do not flicker
+    quantized = frame.convert('RGB').quantize(
+        palette=palette, dither=Image.Dither.NONE)
+    transparent = alpha.getextrema()[0] < ALPHA_THRESHOLD
+    if transparent:
+        mask = alpha.point(lambda a: 255 if a < ALPHA_THRESHOLD else 0)
+        quantized.paste(TRANSPARENT_INDEX, mask=mask)
+    return quantized, transparent
+
+
+def resize_frame(frame, sizes, palette, options, boxes=None):
+    '''
+    resizes frame to all sizes, largest first, each from the previous one,
+    or from its crop box (see imgc.crop) of the frame if boxes are given,
+    and maps them onto palette, returns list of quantize() results,
+    watermarked if options have a watermark
+    '''
+    results = []
+    source = frame
+    for size, box in zip(sizes, boxes or [None] * len(sizes)):
+        if box is None:
+            source = resized = fast_resize(
+                source, size, options.resample, options.reducing_gap)
+        else:
+            resized = fast_resize(
+                frame, size, options.resample, options.reducing_gap, box)
+        if options.wmfile:
+            # smaller sizes are resized from the unmarked source
+            if resized is source:
+                resized = resized.copy()
+            resized = watermark.apply(resized, options)
+        results.append(quantize(resized, palette))
+    return results
+
+
+class GifWriter:
+    '''
+    streams frames of a single animated GIF into fp
+    '''
+
+    def __init__(self, fp, loop=None):
+        self.fp = fp
+        self.loop = loop
+        self.frames = 0
+
+    def write(self, frame, transparent, duration, disposal):
+        from PIL import GifImagePlugin
+
+        params = {'duration': duration, 'disposal': disposal}
+        if transparent:
+            params['transparency'] = TRANSPARENT_INDEX
+            params['disposal'] = 2
+        if not self.frames:
+            info = {'transparency': TRANSPARENT_INDEX}
+            if self.loop is not None:
+                info['loop'] = self.loop
+            header, used = GifImagePlugin.getheader(frame, info=info)
+            self.fp.writelines(header)
+        self.fp.writelines(GifImagePlugin.getdata(frame, **params))
+        self.frames += 1
+
+    def close(self):
+        self.fp.write(b';')
+        return self.fp
+
+
+def resize_animation(im, sizes, options, timings, boxes=None):
+    '''
+    resizes every frame of animated im to sizes, sorted largest first,
+    cropping frames to boxes first, if given,
+    returns list of encoded GIFs (BytesIO), one per size
+    '''
+    writers = [GifWriter(io.BytesIO(), im.info.get('loop')) for _ in sizes]
+
+    def write(resized, duration, disposal):
+        with timed(timings, 'encode'):
+            for writer, (frame, transparent) in zip(writers, resized):
+                writer.write(frame, transparent, duration, disposal)
+
+    def drain(limit):
+        while len(pending) > limit:
+            result, duration, disposal = pending.popleft()
+            with timed(timings, 'resize'):
+                resized = result.get()
+            write(resized, duration, disposal)
+
+    pool = None
+    workers = options.frame_workers or 1
+    if workers > 1 and im.n_frames > workers:
+        from imgc.pool import create_pool
+        pool = create_pool('thread', workers)
+    pending = deque()
+    try:
+        with timed(timings, 'decode'):
+            palette = shared_palette(im)
+        source = frames(im)
+        while True:
+            cancel.check()
+            with timed(timings, 'decode'):
+                frame, duration, disposal = next(source, (None, 0, 0))
+            if frame is None:
+                break
+            if pool is None:
+                with timed(timings, 'resize'):
+                    resized = resize_frame(
+                        frame, sizes, palette, options, boxes)
+                write(resized, duration, disposal)
+                continue
+            pending.append((pool.apply_async(
+                resize_frame, (frame, sizes, palette, options, boxes)),
+                duration, disposal))
+            drain(workers * FRAMES_PER_WORKER - 1)
+        drain(0)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return [writer.close() for writer in writers]
@@ -0,0 +1,89 @@
+'''
+in-memory API: bytes in, bytes out
+
+    from imgc import compress, compress_many
+
+    thumbnail = compress(upload, size='400x', quality=80)
+    thumbnails = compress_many(uploads, size='150x150', format='PNG')
+
+The same size rules (ImageSize) and resize pipeline as ImageHandler are
+used, but nothing touches the filesystem. bytes input is read in place,
+without being copied, and compress_many reuses a single encoder buffer
+for all images of the batch.
+'''
+
+import io
+
+from imgc.job import Options
+from imgc.rendition import parse_renditions
+
+
+def _input(data):
+    if hasattr(data, 'read'):
+        return data
+    # BytesIO shares the memory of bytes until it is written to,
+    # other buffers (bytearray, memoryview) are copied once
+    return io.BytesIO(data)
+
+
+def _compress(data, options, fmt, fp):
+    from PIL import Image
+    from imgc.worker import encode, finish_rendition, resize_renditions
+
+    renditions = parse_renditions(options.size)
+    if len(renditions) != 1:
+        raise ValueError('Exactly one size is supported in memory')
+    rendition, = renditions
+    with Image.open(_input(data)) as im:
+        fmt = (fmt or im.format).upper()
+        (rendition, resized), = resize_renditions(im, renditions, options, {})
+    resized = finish_rendition(resized, options)
+    with resized:
+        encode(resized, fmt, rendition.quality or options.quality, fp,
+               options)
+    return fp
+
+
+def compress(data, size='1000x', quality=90, format=None, out=None,
+             **options):
+    '''
+    resizes and re-encodes a single image in memory
+
+    arguments:
+        data
+            encoded image: bytes, bytearray, memoryview
+            or a readable binary file-like object
+        size, quality
+            same as ImageHandler options, see ImageSize and imgc.rendition
+        format
+            Pillow format name of the result, e.g. 'JPEG' or 'PNG',
+            defaults to the format of the source
+        out
+            writable binary file-like object to encode into,
+            the result is returned as bytes if omitted
+        options
+            other Options attributes, e.g. resample, reducing_gap
+            or preset, see imgc.encoder
+
+    returns bytes, or out if it was given
+    '''
+    options = Options(size=size, quality=quality, **options)
+    if out is not None:
+        return _compress(data, options, format, out)
+    return _compress(data, options, format, io.BytesIO()).getvalue()
+
+
+def compress_many(items, size='1000x', quality=90, format=None, **options):
+    '''
+    compress() for a batch of images, returns list of bytes
+    a single encoder buffer is reused for the whole batch
+    '''
+    options = Options(size=size, quality=quality, **options)
+    buf = io.BytesIO()
+    results = []
+    for data in items:
+        buf.seek(0)
+        buf.truncate()
+        _compress(data, options, format, buf)
+        results.append(buf.getvalue())
+    return results
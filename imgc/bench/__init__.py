@@ -0,0 +1,173 @@
+'''
+imgc benchmarks
+
+    imgc-bench --corpus standard -e thread,process -w 1,2,4 \
+               -s 1000x -s 50% -p fast,small -o results.json \
+               --compare baseline.json
+
+Generates a reproducible synthetic corpus (see imgc.bench.corpus), runs
+ImageHandler over it for every combination of executor, workers, size
+and encoder preset, and reports images/sec, MB/s in and out, output to
+input size ratio and p50/p95 per-image latency. Results are saved as
+JSON, and can be compared to results of a previous run to detect
+regressions.
+'''
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from imgc.bench.corpus import CORPORA, DEFAULT_CORPUS, generate_corpus
+from imgc.bench.runner import environment, run_matrix
+from imgc.encoder import DEFAULT_PRESET, PRESETS
+from imgc.pool import EXECUTORS, default_workers
+
+
+def run_key(run):
+    options = run['options']
+    return (options['executor'], options['workers'], options['size'],
+            options.get('preset', DEFAULT_PRESET))
+
+
+def compare(runs, baseline):
+    '''
+    yields (run, baseline run, relative images/sec change) for runs
+    present in both result sets
+    '''
+    previous = {run_key(run): run for run in baseline['runs']}
+    for run in runs:
+        old = previous.get(run_key(run))
+        if old and old['images_per_sec']:
+            change = run['images_per_sec'] / old['images_per_sec'] - 1
+            yield run, old, change
+
+
+def print_runs(runs):
+    header = ('{:<8} {:>3} {:<10} {:<8} {:>6} {:>9} {:>8} {:>8} {:>7} '
+              '{:>9} {:>9}')
+    row = ('{:<8} {:>3} {:<10} {:<8} {:>6} {:>9.2f} {:>8.2f} {:>8.2f} '
+           '{:>7.3f} {:>9.4f} {:>9.4f}')
+    print(header.format('executor', 'w', 'size', 'preset', 'images', 'img/s',
+                        'MB/s in', 'MB/s out', 'out/in', 'p50, s', 'p95, s'))
+    for run in runs:
+        ratio = run.get('bytes_out', 0) / (run.get('bytes_in') or 1)
+        print(row.format(*run_key(run), run['images'], run['images_per_sec'],
+                         run['mb_in_per_sec'], run['mb_out_per_sec'], ratio,
+                         run['latency_p50'], run['latency_p95']))
+
+
+def csv_list(cast):
+    def parse(x):
+        try:
+            return [cast(item) for item in x.split(',') if item]
+        except ValueError as exc:
+            raise argparse.ArgumentTypeError from exc
+    return parse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark imgc")
+    parser.add_argument(
+        '--corpus',
+        default=DEFAULT_CORPUS, choices=sorted(CORPORA),
+        help='Synthetic corpus preset')
+    parser.add_argument(
+        '--corpus-dir',
+        default=None, type=str,
+        help='Where to generate the corpus (defaults to a temp directory)')
+    parser.add_argument(
+        '--seed',
+        default=0, type=int,
+        help='Seed of the corpus generator')
+    parser.add_argument(
+        '-e', '--executors',
+        default=['thread', 'process'], type=csv_list(str),
+        help='Comma separated executors, any of: %s' % ', '.join(EXECUTORS))
+    parser.add_argument(
+        '-w', '--workers',
+        default=sorted({1, default_workers()}), type=csv_list(int),
+        help='Comma separated numbers of workers')
+    parser.add_argument(
+        '-s', '--size', dest='sizes',
+        action='append', default=None, type=str,
+        help='Size pattern, may be repeated (default: 1000x)')
+    parser.add_argument(
+        '-q', '--quality',
+        default=90, type=int,
+        help='Quality for JPEG images')
+    parser.add_argument(
+        '-p', '--presets',
+        default=[DEFAULT_PRESET], type=csv_list(str),
+        help='Comma separated encoder presets, any of: %s'
+             % ', '.join(sorted(PRESETS)))
+    parser.add_argument(
+        '--repeat',
+        default=1, type=int,
+        help='Run every combination several times, keeping the fastest')
+    parser.add_argument(
+        '-o', '--output',
+        default=None, type=str,
+        help='Save results to a JSON file')
+    parser.add_argument(
+        '--compare',
+        default=None, type=str,
+        help='JSON results of a previous run to compare with')
+    parser.add_argument(
+        '--max-regression',
+        default=None, type=float,
+        help='Exit with non-zero status if images/sec of any run drops '
+             'by more than this many percent compared to --compare')
+
+    args = parser.parse_args(argv)
+    for executor in args.executors:
+        if executor not in EXECUTORS:
+            parser.error('Unknown executor: %s' % executor)
+    for preset in args.presets:
+        if preset not in PRESETS:
+            parser.error('Unknown preset: %s' % preset)
+
+    corpus = args.corpus_dir or os.path.join(
+        tempfile.gettempdir(),
+        'imgc-bench-{}-{}'.format(args.corpus, args.seed))
+    print("Generating corpus {} in {}".format(args.corpus, corpus))
+    try:
+        spec = generate_corpus(corpus, args.corpus, args.seed)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    try:
+        runs = run_matrix(
+            corpus, args.executors, args.workers, args.sizes or ['1000x'],
+            repeat=args.repeat, presets=args.presets, quality=args.quality)
+    except ValueError as exc:  # e.g. output exists, see run_once
+        parser.error(str(exc))
+    print_runs(runs)
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'corpus': spec,
+        'runs': runs,
+    }
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        for run, old, change in compare(runs, baseline):
+            print("{:<8} {:>3} {:<10} {:<8} {:+.1f}% images/sec".format(
+                *run_key(run), change * 100))
+            if args.max_regression is not None and \
+                    -change * 100 > args.max_regression:
+                status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
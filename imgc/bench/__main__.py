@@ -0,0 +1,6 @@
+import sys
+
+from imgc.bench import main
+
+
+sys.exit(main())
@@ -0,0 +1,124 @@
+'''
+reproducible synthetic image corpora for benchmarks
+
+A corpus is described by a preset (see CORPORA) and a seed. The same
+preset and seed always produce the same files, so results of different
+runs, machines and imgc versions can be compared. Generated corpora are
+reused: a corpus.json file in the corpus root records what was
+generated, and the corpus is rebuilt only when it doesn't match. Only
+directories holding such a file are ever removed, any other non-empty
+directory is refused.
+'''
+
+import json
+import os
+import random
+import shutil
+
+from PIL import Image, ImageDraw
+
+
+SIZES = {
+    'small': (320, 240),
+    'medium': (1600, 1200),
+    'large': (4000, 3000),
+    'huge': (8000, 6000),
+}
+
+# name -> (formats, size classes, images per format and size, tree depth)
+CORPORA = {
+    'quick': (('jpg', 'png', 'gif'), ('small', 'medium'), 2, 1),
+    'standard': (('jpg', 'png', 'gif'), ('small', 'medium', 'large'), 4, 2),
+    'large': (('jpg', 'png'), ('large', 'huge'), 4, 1),
+    'deep': (('jpg',), ('small',), 64, 8),
+}
+DEFAULT_CORPUS = 'quick'
+
+SPEC_FILE = 'corpus.json'
+
+
+def synthetic_image(size, rnd, mode='RGB'):
+    '''
+    photo-like image: gradient background, random shapes and noise
+    '''
+    width, height = size
+    im = Image.linear_gradient('L').resize(size).convert(mode)
+    canvas = ImageDraw.Draw(im)
+    for _ in range(rnd.randrange(20, 60)):
+        x, y = rnd.randrange(width), rnd.randrange(height)
+        r = rnd.randrange(max(width, height) // 20 + 1,
+                          max(width, height) // 4 + 2)
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        if rnd.random() < 0.5:
+            canvas.ellipse((x, y, x + r, y + r), fill=color)
+        else:
+            canvas.rectangle((x, y, x + r, y + r // 2), fill=color)
+    # Image.effect_noise can't be seeded
+    noise_size = (width // 4 or 1, height // 4 or 1)
+    count = noise_size[0] * noise_size[1]
+    noise = Image.frombytes(
+        'L', noise_size, rnd.getrandbits(8 * count).to_bytes(count, 'little'))
+    noise = noise.resize(size).convert(mode)
+    return Image.blend(im, noise, 0.1)
+
+
+def save(im, path, fmt):
+    if fmt == 'jpg':
+        im.save(path, 'JPEG', quality=92)
+    elif fmt == 'gif':
+        im.convert('P', palette=Image.ADAPTIVE).save(path, 'GIF')
+    else:
+        im.save(path, 'PNG')
+
+
+def tree_dir(root, index, depth):
+    '''
+    spreads images across nested directories up to depth levels deep
+    '''
+    parts = ['d%d' % (index % (level + 2)) for level in range(index % depth)]
+    return os.path.join(root, *parts)
+
+
+def corpus_spec(name, seed):
+    formats, sizes, count, depth = CORPORA[name]
+    return {
+        'name': name, 'seed': seed, 'formats': list(formats),
+        'sizes': list(sizes), 'count': count, 'depth': depth,
+    }
+
+
+def generate_corpus(root, name=DEFAULT_CORPUS, seed=0):
+    '''
+    creates (or reuses) corpus in root, returns its spec
+    '''
+    spec = corpus_spec(name, seed)
+    spec_path = os.path.join(root, SPEC_FILE)
+    try:
+        with open(spec_path) as fp:
+            existing = json.load(fp)
+    except (OSError, ValueError):
+        existing = None
+    if existing == spec:
+        return spec
+
+    if isinstance(existing, dict) and set(existing) == set(spec):
+        shutil.rmtree(root)  # another corpus generated here
+    elif os.path.isdir(root) and os.listdir(root):
+        raise ValueError(
+            '{} is not empty and holds no generated corpus'.format(root))
+    rnd = random.Random(seed)
+    index = 0
+    for size_name in spec['sizes']:
+        size = SIZES[size_name]
+        for fmt in spec['formats']:
+            for i in range(spec['count']):
+                directory = tree_dir(root, index, spec['depth'])
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(
+                    directory, '{}-{}-{}.{}'.format(size_name, fmt, i, fmt))
+                save(synthetic_image(size, rnd), path, fmt)
+                index += 1
+
+    with open(spec_path, 'w') as fp:
+        json.dump(spec, fp)
+    return spec
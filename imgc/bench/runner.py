@@ -0,0 +1,120 @@
+'''
+runs ImageHandler over a corpus and measures its throughput
+'''
+
+import math
+import os
+import platform
+import shutil
+import time
+from contextlib import redirect_stdout
+
+import PIL
+
+from imgc import ImageHandler
+from imgc.encoder import DEFAULT_PRESET
+
+
+# created in outputs of runs, only directories holding it are removed
+OUTPUT_MARKER = '.imgc-bench'
+
+
+def percentile(values, p):
+    '''
+    nearest-rank percentile, p in 0..100
+    '''
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = math.ceil(p / 100.0 * len(values)) - 1
+    rank = max(0, min(len(values) - 1, rank))
+    return values[rank]
+
+
+class BenchHandler(ImageHandler):
+    '''
+    ImageHandler that keeps results of all processed images
+    '''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.results = []
+
+    def on_result(self, result):
+        self.results.append(result)
+        super().on_result(result)
+
+
+def run_once(corpus, timeout=3600, **options):
+    '''
+    processes corpus once with given handler options,
+    returns a dict with measurements
+    '''
+    output = "{}-{}".format(os.path.abspath(corpus), ImageHandler.dir_postfix)
+    marker = os.path.join(output, OUTPUT_MARKER)
+    if os.path.exists(output):
+        if not os.path.exists(marker):
+            raise ValueError(
+                '{} exists and is not a benchmark output'.format(output))
+        shutil.rmtree(output)  # left by an interrupted run
+    os.makedirs(output)
+    open(marker, 'w').close()
+
+    handler = BenchHandler(src_images=[corpus], **options)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        handler.run()
+        if not handler.wait(timeout):
+            handler.cancel()
+            raise RuntimeError('Benchmark run timed out')
+        wall = time.perf_counter() - start
+    shutil.rmtree(output, ignore_errors=True)
+
+    results = [r for r in handler.results if r.ok]
+    latencies = [r.elapsed for r in results]
+    megabyte = 1024.0 * 1024.0
+    return {
+        'options': options,
+        'images': len(results),
+        'errors': len(handler.results) - len(results),
+        'wall': wall,
+        'images_per_sec': len(results) / wall if wall else 0.0,
+        'bytes_in': sum(r.bytes_in for r in results),
+        'bytes_out': sum(r.bytes_out for r in results),
+        'mb_in_per_sec': sum(r.bytes_in for r in results) / megabyte / wall,
+        'mb_out_per_sec': sum(r.bytes_out for r in results) / megabyte / wall,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+    }
+
+
+def run_matrix(corpus, executors, workers, sizes, repeat=1,
+               presets=(DEFAULT_PRESET,), **options):
+    '''
+    runs every combination of executor, number of workers, size
+    pattern and encoder preset, keeping the fastest of repeat runs of each
+    '''
+    runs = []
+    for executor in executors:
+        for worker_count in workers:
+            for size in sizes:
+                for preset in presets:
+                    best = None
+                    for _ in range(repeat):
+                        run = run_once(
+                            corpus, executor=executor, workers=worker_count,
+                            size=size, preset=preset, **options)
+                        if best is None or run['wall'] < best['wall']:
+                            best = run
+                    runs.append(best)
+    return runs
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
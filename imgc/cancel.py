@@ -0,0 +1,41 @@
+'''
+cooperative cancellation of pool workers
+
+Every pool of a run gets its cancel event, a threading.Event for thread
+pools or a multiprocessing.Event for process pools, through the pool
+initializer. Workers call check() between processing stages, so that a
+cancelled run stops within a stage of every image in flight instead of
+killing workers in the middle of a write. Outputs already saved for such
+an image are removed, those of finished images are kept.
+'''
+
+import signal
+import threading
+
+
+class Cancelled(Exception):
+    '''
+    raised by check() in workers of a cancelled run
+    '''
+
+
+_local = threading.local()
+
+
+def init_worker(event):
+    '''
+    pool initializer, runs in every worker thread or process
+    '''
+    _local.event = event
+    if threading.current_thread() is threading.main_thread():
+        # worker process, Ctrl-C is handled by the parent through event
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def check():
+    '''
+    raises Cancelled if the run of the current worker was cancelled
+    '''
+    event = getattr(_local, 'event', None)
+    if event is not None and event.is_set():
+        raise Cancelled
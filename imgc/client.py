@@ -0,0 +1,59 @@
+'''
+client of the resident imgc server, see imgc.server for the protocol
+'''
+
+import base64
+import itertools
+import json
+import socket
+
+from imgc.server import default_socket
+
+
+_ids = itertools.count(1)
+
+
+def request(message, socket_path=None):
+    '''
+    sends a single request and yields response messages,
+    until the request is done
+    '''
+    message = dict(message)
+    message.setdefault('id', str(next(_ids)))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or default_socket())
+        sock.sendall(json.dumps(message).encode() + b'\n')
+        with sock.makefile('rb') as fp:
+            for line in fp:
+                response = json.loads(line.decode())
+                yield response
+                if response['event'] in ('done', 'error'):
+                    return
+
+
+def submit_paths(paths, options=None, socket_path=None):
+    '''
+    processes files and directories, yields response messages
+    '''
+    return request(
+        {'paths': list(paths), 'options': options or {}}, socket_path)
+
+
+def compress(data, options=None, format=None, socket_path=None):
+    '''
+    processes an encoded image in memory, returns encoded result
+    '''
+    message = {
+        'data': base64.b64encode(bytes(data)).decode('ascii'),
+        'format': format,
+        'options': options or {},
+    }
+    result = None
+    for response in request(message, socket_path):
+        if response['event'] == 'error' or response.get('error'):
+            raise OSError(response['error'])
+        if response['event'] == 'result':
+            result = base64.b64decode(response['data'])
+    if result is None:
+        raise OSError('No result received from the server')
+    return result
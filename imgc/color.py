@@ -0,0 +1,80 @@
+'''
+conversion of outputs to sRGB
+
+CMYK images and images with an embedded ICC profile other than sRGB
+(e.g. Adobe RGB) are shown with wrong colors by anything ignoring the
+profile, and profiles take up to tens of KB per file. Such images are
+converted from their profile to sRGB with an ImageCms transform and
+saved untagged, which browsers take for sRGB. Conversion runs on resized
+images, not on the decoded source.
+
+Building a transform parses both profiles and precomputes lookup tables,
+which costs more than applying it to a thumbnail. Transforms are built
+once per distinct source profile and mode and cached for the rest of the
+batch. They cannot be pickled, so every worker process builds its own.
+'''
+
+import io
+
+from imgc.utils import LRUCache
+
+
+# modes transformed to sRGB, and the mode they are transformed to
+MODES = {'RGB': 'RGB', 'RGBA': 'RGBA', 'CMYK': 'RGB'}
+
+# distinct profiles of a batch are few, e.g. cameras, Adobe RGB and a press
+CACHE_SIZE = 16
+
+# (profile, mode) -> transform, None if it is not needed or not possible
+_transforms = LRUCache(CACHE_SIZE)
+
+
+def transform(profile, mode):
+    '''
+    cached transform of mode images with ICC profile (bytes) to sRGB,
+    None for sRGB profiles and profiles which cannot be used
+    '''
+    def create():
+        from PIL import ImageCms
+
+        try:
+            source = ImageCms.ImageCmsProfile(io.BytesIO(profile))
+            if mode != 'CMYK' and \
+                    'sRGB' in ImageCms.getProfileDescription(source):
+                return None
+            return ImageCms.buildTransform(
+                source, ImageCms.createProfile('sRGB'), mode, MODES[mode])
+        except (ImageCms.PyCMSError, OSError, ValueError):
+            return None  # e.g. broken, or not matching mode
+    return _transforms.get((profile, mode), create)
+
+
+def needs_conversion(im):
+    '''
+    True if colors of im would be changed by to_srgb()
+    '''
+    if im.mode not in MODES:
+        return False
+    profile = im.info.get('icc_profile')
+    return im.mode == 'CMYK' or \
+        bool(profile) and transform(profile, im.mode) is not None
+
+
+def to_srgb(im):
+    '''
+    resized im converted to sRGB, without a profile, images of other
+    modes (L, P, ...) are returned as they are
+    '''
+    if im.mode not in MODES:
+        return im
+    profile = im.info.get('icc_profile')
+    cms = transform(profile, im.mode) if profile else None
+    if cms is not None:
+        from PIL import ImageCms
+
+        im = ImageCms.applyTransform(im, cms)
+    elif im.mode == 'CMYK':
+        im = im.convert('RGB')  # without a profile, naively
+    # sRGB, or a profile which cannot be used, colors are kept as they are
+    im.info.pop('icc_profile', None)
+    return im
@@ -0,0 +1,86 @@
+'''
+fill-and-crop renditions
+
+A rendition with crop=GRAVITY is exactly WxH: the largest region of the
+source with the aspect ratio of WxH is selected first, and only that
+region is resized, with Image.resize(box=...). Decode-time reduction
+(see imgc.resize) is chosen for the region, not for the whole frame, so
+the work per rendition is proportional to its output size rather than to
+the source being resized whole and cropped afterwards.
+
+    center - region in the middle of the source
+    top    - region at the top, centered horizontally, e.g. for portraits
+    smart  - region centered on the focal point, the centroid of edges
+             of a small grayscale copy, i.e. on the most detailed area
+'''
+
+
+GRAVITIES = ('center', 'top', 'smart')
+
+# side of the grayscale copy the focal point is searched on
+FOCUS_SIZE = 64
+
+
+def crop_size(size, target):
+    '''
+    (width, height) of the largest region of size with the aspect ratio
+    of target, as floats
+    '''
+    width, height = size
+    if width * target[1] > height * target[0]:  # wider than target
+        return height * target[0] / target[1], float(height)
+    return float(width), width * target[1] / target[0]
+
+
+def crop_box(size, target, gravity='center', focus=None):
+    '''
+    (left, upper, right, lower) region of an image of size to be resized
+    to target, focus is the (x, y) point, as fractions of size, the smart
+    gravity centers the region on
+    '''
+    width, height = size
+    box_width, box_height = crop_size(size, target)
+    if gravity == 'smart' and focus is not None:
+        x, y = focus
+    else:
+        x, y = 0.5, 0.0 if gravity == 'top' else 0.5
+    left = min(max(x * width - box_width / 2, 0.0), width - box_width)
+    upper = min(max(y * height - box_height / 2, 0.0), height - box_height)
+    return (left, upper, left + box_width, upper + box_height)
+
+
+def full_size(size, target):
+    '''
+    size the whole image of size would have if its crop region was
+    resized to target, used to choose the decode-time reduction
+    '''
+    box_width, box_height = crop_size(size, target)
+    return (int(target[0] * size[0] / box_width + 0.5),
+            int(target[1] * size[1] / box_height + 0.5))
+
+
+def focal_point(im):
+    '''
+    (x, y) centroid of edges of loaded im, as fractions of its size,
+    the center if there are no edges
+    '''
+    from PIL import ImageFilter
+
+    # integer reduction first, the full size image is not converted
+    if im.mode not in ('L', 'RGB', 'RGBA', 'CMYK'):
+        im = im.convert('L')
+    small = im.reduce(max(1, max(im.size) // FOCUS_SIZE)).convert('L')
+    small.thumbnail((FOCUS_SIZE, FOCUS_SIZE))
+    edges = small.filter(ImageFilter.FIND_EDGES)
+    width, height = edges.size
+    total = x_sum = y_sum = 0
+    # the outermost pixels are edges of the image itself
+    for index, value in enumerate(edges.tobytes()):
+        y, x = divmod(index, width)
+        if value and 0 < x < width - 1 and 0 < y < height - 1:
+            total += value
+            x_sum += value * x
+            y_sum += value * y
+    if not total:
+        return 0.5, 0.5
+    return (x_sum / total + 0.5) / width, (y_sum / total + 0.5) / height
@@ -0,0 +1,84 @@
+'''
+detection of byte-identical sources, used by --dedup
+
+Sizes are compared first, contents are hashed only for files whose size
+was already seen, so a tree without duplicates costs a stat per file.
+Only the first of identical sources is processed, outputs of the others
+are hardlinked, reflinked or copied from its outputs.
+'''
+
+import os
+
+from imgc.manifest import file_hash
+from imgc.utils import copy_file
+
+
+LINK_MODES = ('hardlink', 'reflink', 'copy')
+
+# ioctl cloning a whole file on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+class DedupIndex:
+    '''
+    first seen path of every distinct file content
+    '''
+
+    def __init__(self):
+        self.unhashed = {}  # size -> only path of that size, not hashed yet
+        self.by_hash = {}  # (size, digest) -> first path with that content
+        self.sizes = set()
+        self.hashed = 0  # number of files hashed
+
+    def digest(self, path):
+        self.hashed += 1
+        return file_hash(path)
+
+    def original(self, path, size=None):
+        '''
+        first seen path with the same contents as path,
+        None if path is the first one
+        '''
+        if size is None:
+            size = os.path.getsize(path)
+        if size not in self.sizes:
+            self.sizes.add(size)
+            self.unhashed[size] = path
+            return None
+        first = self.unhashed.pop(size, None)
+        if first is not None:
+            self.by_hash[(size, self.digest(first))] = first
+        key = (size, self.digest(path))
+        original = self.by_hash.get(key)
+        if original is None:
+            self.by_hash[key] = path
+        return original
+
+
+def reflink(src, dst):
+    import fcntl
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def link_file(src, dst, mode='hardlink'):
+    '''
+    makes dst a hardlink, reflink or copy of src, replacing dst,
+    falls back to a copy where the filesystem can't link,
+    returns the mode actually used
+    '''
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        if mode == 'hardlink':
+            os.link(src, dst)
+            return mode
+        if mode == 'reflink':
+            reflink(src, dst)
+            return mode
+    except (OSError, ImportError):  # e.g. EXDEV, or no fcntl on Windows
+        pass
+    copy_file(src, dst)
+    return 'copy'
@@ -0,0 +1,123 @@
+'''
+encoder presets and per-format encoder options
+
+A preset trades encoding time against output size:
+    fast      - no extra passes, lowest PNG/WebP effort
+    balanced  - optimized JPEG Huffman tables, default PNG/WebP effort
+    small     - progressive JPEG, maximum PNG/WebP effort
+Explicit options of a format, e.g. {'JPEG': {'subsampling': '4:4:4'}},
+override the preset. Option names are those of Pillow's Image.save.
+'''
+
+import os
+
+
+PRESETS = {
+    'fast': {
+        'JPEG': {'optimize': False},
+        'PNG': {'compress_level': 1},
+        'WEBP': {'method': 0},
+    },
+    'balanced': {
+        'JPEG': {'optimize': True},
+        'PNG': {'compress_level': 6},
+        'WEBP': {'method': 4},
+    },
+    'small': {
+        'JPEG': {'optimize': True, 'progressive': True},
+        'PNG': {'optimize': True},
+        'WEBP': {'method': 6},
+    },
+}
+DEFAULT_PRESET = 'balanced'
+
+# formats supporting quality, and --format choices with their extensions
+QUALITY_FORMATS = ('JPEG', 'WEBP')
+OUTPUT_FORMATS = {'jpeg': 'jpg', 'png': 'png', 'webp': 'webp'}
+
+
+def parse_value(value):
+    '''
+    'true'/'false', int or float, anything else is kept as a string
+    '''
+    lowered = value.lower()
+    if lowered in ('true', 'yes', 'on'):
+        return True
+    if lowered in ('false', 'no', 'off'):
+        return False
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_encoder_options(spec):
+    '''
+    parses 'jpeg:progressive=true,subsampling=4:2:0'
+    into ('JPEG', {'progressive': True, 'subsampling': '4:2:0'})
+    '''
+    fmt, sep, options = spec.partition(':')
+    fmt = fmt.strip().upper()
+    if not sep or fmt.lower() not in OUTPUT_FORMATS:
+        raise ValueError(
+            'Encoder options must start with one of: %s'
+            % ', '.join(OUTPUT_FORMATS))
+    parsed = {}
+    for option in options.split(','):
+        if not option:
+            continue
+        key, sep, value = option.partition('=')
+        if not sep or not key:
+            raise ValueError('Invalid encoder option: %s' % option)
+        parsed[key.strip()] = parse_value(value.strip())
+    return fmt, parsed
+
+
+def save_params(fmt, quality=None, preset=DEFAULT_PRESET, overrides=None):
+    '''
+    keyword arguments of Image.save for fmt
+    '''
+    if preset not in PRESETS:
+        raise ValueError('Unknown preset: %s' % preset)
+    params = {}
+    if quality is not None and fmt in QUALITY_FORMATS:
+        params['quality'] = quality
+    params.update(PRESETS[preset].get(fmt, {}))
+    params.update((overrides or {}).get(fmt, {}))
+    return params
+
+
+def output_name(path, fmt, keep_extension=False):
+    '''
+    path with extension replaced by the one of --format fmt, or with it
+    appended (a.png.webp) if keep_extension, so that sources differing
+    only in their extension don't share an output
+    '''
+    if not fmt:
+        return path
+    base, ext = os.path.splitext(path)
+    if ext[1:].lower() == OUTPUT_FORMATS[fmt]:
+        return path
+    return '{}.{}'.format(path if keep_extension else base,
+                          OUTPUT_FORMATS[fmt])
+
+
+def convert_for(im, fmt):
+    '''
+    image in a mode fmt can store, transparency is flattened
+    onto white for formats without alpha
+    '''
+    if fmt == 'JPEG' and im.mode not in ('RGB', 'L', 'CMYK'):
+        if im.mode in ('RGBA', 'LA') or im.info.get('transparency') is not None:
+            from PIL import Image
+
+            rgba = im.convert('RGBA')
+            flat = Image.new('RGB', rgba.size, (255, 255, 255))
+            flat.paste(rgba, mask=rgba.getchannel('A'))
+            return flat
+        return im.convert('RGB')
+    if fmt == 'PNG' and im.mode == 'CMYK':
+        return im.convert('RGB')
+    return im
@@ -16,14 +16,21 @@ class ImageSize():
     800x
     x600
 
-    TODO:
-    ! < > ^ flags
+    any pattern may end with ImageMagick geometry flags:
+    800x600>  shrink only: images not larger than that are kept as they are
+    800x600<  enlarge only: images not smaller than that are kept
+    800x600^  fill: smallest size covering 800x600
+    800x600!  exact size
+    without flags both dimensions are exact, as they always were,
+    with < > or ^ the aspect ratio is kept, as it is in ImageMagick:
+    800x600> fits the image into 800x600, unless it is ! too
     '''
 
+    FLAGS = '!<>^'
     PATTERN_RELATIVE = re.compile(
-        "^((?P<width>\d+)%)?(x((?P<height>\d+)%)?)?$")
+        "^((?P<width>\d+)%)?(x((?P<height>\d+)%)?)?(?P<flags>[!<>^]*)$")
     PATTERN_ABSOLUTE = re.compile(
-        "^(?P<width>\d+)?(x(?P<height>\d+)?)?$")
+        "^(?P<width>\d+)?(x(?P<height>\d+)?)?(?P<flags>[!<>^]*)$")
     PATTERNS = (
         ("_parse_absolute", PATTERN_ABSOLUTE),
         ("_parse_relative", PATTERN_RELATIVE),
@@ -60,18 +67,30 @@ class ImageSize():
         return cls._parse_tuple(new_size, image, **kwargs)
 
     @classmethod
-    def _parse_tuple(cls, new_size, image=None, **kwargs):
+    def _parse_tuple(cls, new_size, image=None, flags='', **kwargs):
         width, height = new_size
         if image:
             if not width and not height:
                 raise ValueError(
                     'new_size requires at least one dimension defined')
 
-            aratio = image.size[0]/image.size[1]
+            orig_width, orig_height = image.size
+            aratio = orig_width/orig_height
+            if width and height and '!' not in flags and \
+                    set(flags) & set('<>^'):
+                # fit into width x height, or cover it with ^
+                choose = max if '^' in flags else min
+                ratio = choose(width/orig_width, height/orig_height)
+                width = max(1, round(orig_width * ratio))
+                height = max(1, round(orig_height * ratio))
             if not width:
                 width = int(height * aratio)  # wnew = hnew * (w / h)
             if not height:
                 height = int(width / aratio)  # hnew = wnew / (w / h)
+            if '>' in flags and width >= orig_width and height >= orig_height:
+                return image.size  # not larger, kept
+            if '<' in flags and width <= orig_width and height <= orig_height:
+                return image.size  # not smaller, kept
         else:
             if not width or not height:
                 raise ValueError(
@@ -93,6 +112,7 @@ class ImageSize():
                 # converting to int only if string is found
                 width = int(width_str) if width_str else None
                 height = int(height_str) if height_str else None
+                kwargs['flags'] = match.group('flags')
 
                 # this size is not final yet, because it might contain
                 # relative size, not absolute pixels
@@ -0,0 +1,134 @@
+'''
+jobs sent to pool workers and their results
+
+Everything sent to a worker (Job, Options) and returned from it (Result)
+must be picklable, so that the same functions work with both thread and
+process pools. This module doesn't depend on Pillow, so that it is
+cheap to import in the parent process.
+'''
+
+import json
+from collections import namedtuple
+
+from imgc.encoder import DEFAULT_PRESET
+from imgc.resize import DEFAULT_FILTER, DEFAULT_REDUCING_GAP
+from imgc.search import MAX_TRIALS, MIN_QUALITY
+from imgc.watermark import DEFAULT_OPACITY, DEFAULT_POSITION, DEFAULT_SCALE
+
+
+# data - contents of src read ahead by the pipeline, see imgc.pipeline,
+#        outputs are then returned in Result.buffers instead of being saved
+# key  - identifies the job in the parent, output paths need not be unique
+#        while jobs are in flight, e.g. with a work queue
+Job = namedtuple('Job', 'src dst options data key', defaults=(None, None))
+
+
+class Options:
+    '''
+    processing parameters shared by all jobs of a batch
+    size is anything accepted by imgc.rendition.parse_renditions
+    unknown keyword arguments are ignored, so that ImageHandler
+    can pass its whole configuration as is
+    '''
+    size = '1000x'
+    quality = 90
+    resample = DEFAULT_FILTER
+    reducing_gap = DEFAULT_REDUCING_GAP
+
+    # encoding, see imgc.encoder
+    format = None  # --format, output paths already have its extension
+    preset = DEFAULT_PRESET
+    encoder_options = None  # Pillow format name -> Image.save options
+
+    # quality search, see imgc.search
+    target_bytes = None
+    target_ssim = None
+    min_quality = MIN_QUALITY
+    max_trials = MAX_TRIALS
+
+    # renditions not smaller than their source are replaced by a copy of it,
+    # other presets tried are kept if they encode smaller, see imgc.worker
+    keep_smaller = False
+    try_presets = None
+
+    # outputs without metadata, converted to sRGB if they have a profile,
+    # or with the EXIF of their source, see imgc.metadata and imgc.color
+    strip_metadata = False
+    srgb = False
+    keep_exif = False
+
+    # watermark pasted onto every output, see imgc.watermark
+    wmfile = None
+    wm_position = DEFAULT_POSITION
+    wm_opacity = DEFAULT_OPACITY
+    wm_scale = DEFAULT_SCALE
+
+    # decompression bomb limit, 0 to disable, None for Pillow's default,
+    # set once per pool, see imgc.worker.init_worker
+    max_image_pixels = None
+
+    # directory for per-worker cProfile stats
+    profile = None
+
+    # threads resizing frames of a single animation, see imgc.animation
+    frame_workers = 1
+
+    # fields which don't affect the output
+    runtime = ('max_image_pixels', 'profile', 'frame_workers',)
+
+    def __init__(self, **kwargs):
+        names = set(self.fields()).union(self.runtime)
+        for key, value in kwargs.items():
+            if key in names:  # not e.g. params of ImageHandler
+                setattr(self, key, value)
+
+    @classmethod
+    def fields(cls):
+        return sorted(
+            key for key, value in vars(cls).items()
+            if not key.startswith('_') and not callable(value)
+            and not isinstance(value, (classmethod, staticmethod))
+            and key not in cls.runtime and key != 'runtime')
+
+    def params(self):
+        '''
+        JSON serializable dict of all parameters affecting the output
+        '''
+        params = {key: getattr(self, key) for key in self.fields()}
+        # e.g. tuples become lists, as they would after a JSON round trip
+        return json.loads(json.dumps(params))
+
+
+class Result:
+    '''
+    outcome of a single job, sent back to the parent process
+    '''
+
+    def __init__(self, src, dst, error=None):
+        self.src = src
+        self.dst = dst
+        self.error = error
+        self.key = None  # Job.key
+        self.elapsed = 0.0  # seconds
+        self.timings = {}  # stage -> seconds, see imgc.metrics.STAGES
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.outputs = []  # paths of all saved renditions
+        self.output_bytes = {}  # path -> size of every saved rendition
+        self.qualities = {}  # path -> quality found by the search
+        self.buffers = None  # [(path, encoded bytes)] to be saved by the parent
+        self.pixels_in = 0
+        self.pixels_out = 0
+        self.cancelled = False  # run was cancelled, see imgc.cancel
+        self.passed_through = False  # source copied as is, not decoded
+        self.sources_kept = 0  # renditions replaced by the smaller source
+
+    @classmethod
+    def for_job(cls, job, error=None):
+        result = cls(job.src, job.dst, error)
+        result.key = job.key
+        return result
+
+    @property
+    def ok(self):
+        return self.error is None
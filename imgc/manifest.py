@@ -0,0 +1,95 @@
+'''
+persistent record of already processed images, used by incremental mode
+
+One manifest is kept per output root (<dir>-imgc or _files-imgc). Each
+entry is keyed on the absolute source path and stores the source size,
+its modification time, optionally a content hash, and the processing
+parameters the output was produced with. An image is up to date when
+all of them match and its output still exists, which only takes a
+couple of stat calls - the source is never opened.
+'''
+
+import json
+import os
+
+
+def file_hash(path, blocksize=1 << 20):
+    '''
+    streaming sha256 of file contents
+    '''
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    filename = '.imgc-manifest.json'
+    version = 1
+
+    def __init__(self, root, use_hash=False):
+        self.root = root
+        self.path = os.path.join(root, self.filename)
+        self.use_hash = use_hash
+        self.entries = {}
+        self.changed = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):  # missing or corrupt manifest
+            return
+        if data.get('version') == self.version:
+            self.entries = data.get('entries', {})
+
+    def save(self):
+        if not self.changed:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump({'version': self.version, 'entries': self.entries}, fp)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+
+    def is_fresh(self, src, dst, params):
+        '''
+        returns True if dst (a path or a list of paths of all renditions)
+        was produced from the current version of src with the same
+        processing parameters
+        '''
+        outputs = [dst] if isinstance(dst, str) else dst
+        entry = self.entries.get(src)
+        if entry is None or entry['params'] != params:
+            return False
+        try:
+            stat = os.stat(src)
+        except OSError:
+            return False
+        if stat.st_size != entry['size']:
+            return False
+        if not all(os.path.exists(path) for path in outputs):
+            return False
+        if stat.st_mtime_ns == entry['mtime']:
+            return True
+
+        # touched, but possibly not modified
+        if self.use_hash and entry.get('hash') == file_hash(src):
+            entry['mtime'] = stat.st_mtime_ns
+            self.changed = True
+            return True
+        return False
+
+    def update(self, src, params):
+        stat = os.stat(src)
+        self.entries[src] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'hash': file_hash(src) if self.use_hash else None,
+            'params': params,
+        }
+        self.changed = True
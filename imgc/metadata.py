@@ -0,0 +1,93 @@
+'''
+EXIF orientation and metadata of outputs
+
+Pixel data of photos taken sideways is usually stored unrotated, with
+an EXIF orientation telling viewers how to show it. Targets are computed
+for the oriented image, the source is decoded at the reduced size its
+targets need (see imgc.resize.draft) and rotated right after decoding,
+before it is resized, so the rotation never runs on the full-size image.
+The orientation of EXIF kept in outputs is then reset.
+
+Outputs keep the ICC profile of their source, and JPEGs its comment,
+unless metadata are stripped. EXIF (GPS position, serial numbers, an
+embedded thumbnail) is only kept if asked for. Stripping an ICC profile
+changes how colors are shown, so images are converted to sRGB first, see
+imgc.color.
+'''
+
+from collections import namedtuple
+
+
+ORIENTATION = 0x0112
+# orientations swapping width and height
+TRANSPOSED = (5, 6, 7, 8)
+
+# Image.info keys passed to Image.save, formats don't save them otherwise,
+# exif is removed from info of outputs first unless it is to be kept
+KEPT = ('exif', 'icc_profile')
+# Image.info keys of metadata removed by strip()
+METADATA = ('exif', 'icc_profile', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+
+# stands for an image in target size computations, see oriented()
+Oriented = namedtuple('Oriented', 'size')
+
+
+def orientation(im):
+    '''
+    EXIF orientation of not yet loaded im, 1 if it has none
+    '''
+    # getexif() of a PNG without EXIF in its header would decode it
+    if not im.info.get('exif'):
+        return 1
+    value = im.getexif().get(ORIENTATION, 1)
+    return value if value in range(1, 9) else 1
+
+
+def oriented(im):
+    '''
+    im, or the size it will have once oriented if orientation
+    swaps its width and height, to compute targets on
+    '''
+    if orientation(im) in TRANSPOSED:
+        return Oriented(im.size[::-1])
+    return im
+
+
+def stored_size(im, size):
+    '''
+    size of the oriented not yet loaded im, as its pixel data are stored
+    '''
+    return size[::-1] if orientation(im) in TRANSPOSED else size
+
+
+def orient(im):
+    '''
+    rotates loaded im in place as its EXIF orientation says,
+    the orientation is reset
+    '''
+    if orientation(im) != 1:
+        from PIL import ImageOps
+
+        ImageOps.exif_transpose(im, in_place=True)
+    return im
+
+
+def has_metadata(im):
+    return any(im.info.get(key) for key in METADATA)
+
+
+def strip(im):
+    '''
+    removes metadata from info of resized im, they are not saved
+    '''
+    for key in METADATA:
+        im.info.pop(key, None)
+    return im
+
+
+def save_params(im):
+    '''
+    Image.save keyword arguments keeping metadata left in im.info
+    '''
+    return {key: im.info[key] for key in KEPT if im.info.get(key)}
@@ -0,0 +1,152 @@
+'''
+per-image stage timings and their aggregation
+
+Workers time every processing stage of an image (see STAGES) with
+timed() and send timings back along with the Result. The parent
+aggregates them into Metrics - one Histogram per stage plus byte and
+pixel counters - which can be exported as JSON or NDJSON.
+'''
+
+import bisect
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+STAGES = ('open', 'parse', 'decode', 'resize', 'encode', 'save')
+
+
+@contextmanager
+def timed(timings, stage):
+    '''
+    adds time spent inside the block to timings[stage], in seconds
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + \
+            time.perf_counter() - start
+
+
+class Histogram:
+    '''
+    log-scale histogram of durations, in seconds
+    bucket upper bounds go from 50us up to ~100s, doubling each time
+    '''
+    bounds = [0.00005 * 2 ** i for i in range(22)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p):
+        '''
+        upper bound of the bucket containing p-th percentile
+        '''
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def labels(self):
+        return ['%g' % bound for bound in self.bounds] + ['inf']
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': {
+                label: count
+                for label, count in zip(self.labels(), self.counts)
+                if count
+            },
+        }
+
+
+class Metrics:
+    '''
+    aggregates per-image results of a run
+    '''
+    counters = ('images', 'errors', 'bytes_in', 'bytes_out',
+                'pixels_in', 'pixels_out')
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.total = Histogram()
+        self.values = dict.fromkeys(self.counters, 0)
+
+    def add(self, result):
+        if not result.ok:
+            self.values['errors'] += 1
+            return
+        self.values['images'] += 1
+        for counter in self.counters[2:]:
+            self.values[counter] += getattr(result, counter)
+        self.total.add(result.elapsed)
+        for stage, value in result.timings.items():
+            self.stages.setdefault(stage, Histogram()).add(value)
+
+    def snapshot(self):
+        return {
+            'time': time.time(),
+            'elapsed': time.time() - self.started,
+            'counters': dict(self.values),
+            'total': self.total.as_dict(),
+            'stages': {stage: histogram.as_dict()
+                       for stage, histogram in self.stages.items()},
+        }
+
+
+class MetricsWriter:
+    '''
+    exports Metrics snapshots to a file, at most once per interval
+        *.ndjson - a snapshot line is appended on every export
+        other    - file is atomically replaced with the latest snapshot
+    '''
+
+    def __init__(self, path, metrics, interval=10.0):
+        self.path = path
+        self.metrics = metrics
+        self.interval = interval
+        self.last = time.time()
+        self.ndjson = path.endswith('.ndjson')
+
+    def maybe_write(self):
+        if self.interval and time.time() - self.last >= self.interval:
+            self.write()
+
+    def write(self):
+        self.last = time.time()
+        snapshot = self.metrics.snapshot()
+        if self.ndjson:
+            with open(self.path, 'a') as fp:
+                fp.write(json.dumps(snapshot) + '\n')
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump(snapshot, fp, indent=2)
+        os.replace(tmp_path, self.path)
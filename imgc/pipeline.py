@@ -0,0 +1,139 @@
+'''
+staged processing for slow, e.g. network, filesystems
+
+    feeder -> readers -> CPU pool -> writers -> ImageHandler.on_result
+
+Reader threads load contents of the next sources into memory, at most
+read_ahead tasks are buffered, waiting for or being processed by the CPU
+pool. Pool workers decode from those buffers and encode into buffers,
+without touching the filesystem. Writer threads save outputs, each into
+a temporary file renamed over the output, results wait for them in a
+queue of at most write_queue items. Every stage has its own threads, so
+CPU workers don't wait for I/O and I/O is not limited to one request
+per CPU worker.
+
+Once cancel (an Event) is set, readers stop reading, remaining jobs are
+still sent to the pool, which gives them up right away, see imgc.cancel.
+'''
+
+import os
+import queue
+import threading
+import time
+from functools import partial
+
+from imgc.job import Result
+from imgc.metrics import timed
+from imgc.utils import write_atomic
+
+
+DEFAULT_READERS = 4
+DEFAULT_WRITERS = 2
+
+
+def read_file(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+class Pipeline:
+
+    def __init__(self, pool, on_result, read_ahead,
+                 readers=DEFAULT_READERS, writers=DEFAULT_WRITERS,
+                 write_queue=None, cancel=None):
+        self.pool = pool
+        self.on_result = on_result
+        self.cancel = cancel or threading.Event()
+        self.buffered = threading.BoundedSemaphore(read_ahead)
+        self.reads = queue.Queue(maxsize=readers)
+        self.writes = queue.Queue(maxsize=write_queue or read_ahead)
+        self.read_times = {}  # (key, dst) -> seconds spent reading its source
+        # on_result expects to be called by a single thread
+        self.lock = threading.Lock()
+        self.readers = [threading.Thread(target=self.read, daemon=True)
+                        for _ in range(readers)]
+        self.writers = [threading.Thread(target=self.write, daemon=True)
+                        for _ in range(writers)]
+        for thread in self.readers + self.writers:
+            thread.start()
+
+    def submit(self, jobs):
+        '''
+        queues jobs to be read and processed as a single task,
+        blocks while all readers are busy
+        '''
+        self.reads.put(jobs)
+
+    def close_reads(self):
+        for _ in self.readers:
+            self.reads.put(None)
+
+    def close(self):
+        for _ in self.writers:
+            self.writes.put(None)
+
+    def read(self):
+        from imgc.worker import process, process_batch
+
+        while True:
+            jobs = self.reads.get()
+            if jobs is None:
+                return
+            self.buffered.acquire()
+            loaded = []
+            for job in jobs:
+                if self.cancel.is_set():
+                    loaded.append(job)
+                    continue
+                start = time.perf_counter()
+                try:
+                    data = read_file(job.src)
+                except OSError:
+                    # the worker reads it again and reports the error
+                    loaded.append(job)
+                    continue
+                self.read_times[job.key, job.dst] = time.perf_counter() - start
+                loaded.append(job._replace(data=data))
+            failed = partial(self.failed, loaded)
+            if len(loaded) == 1:
+                self.pool.apply_async(
+                    process, (loaded[0],),
+                    callback=self.encoded, error_callback=failed)
+            else:
+                self.pool.apply_async(
+                    process_batch, (loaded,),
+                    callback=self.encoded_batch, error_callback=failed)
+
+    def encoded(self, result):
+        # called by the pool's result handler thread
+        self.encoded_batch([result])
+
+    def failed(self, jobs, exc):
+        # task raised instead of returning results, jobs failed as a whole
+        self.encoded_batch(
+            [Result.for_job(job, str(exc) or repr(exc)) for job in jobs])
+
+    def encoded_batch(self, results):
+        self.buffered.release()
+        for result in results:
+            read_time = self.read_times.pop(
+                (result.key, result.dst), 0.0)
+            result.timings['open'] = result.timings.get('open', 0.0) + \
+                read_time
+            self.writes.put(result)
+
+    def write(self):
+        while True:
+            result = self.writes.get()
+            if result is None:
+                return
+            try:
+                with timed(result.timings, 'save'):
+                    for path, data in result.buffers or ():
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        write_atomic(path, data)
+            except OSError as err:
+                result.error = str(err)
+            result.buffers = None
+            with self.lock:
+                self.on_result(result)
@@ -0,0 +1,127 @@
+'''
+header-only planning of a batch
+
+Image.open only reads image headers, pixel data is decoded on load(),
+so dimensions, format and target sizes of every rendition are known
+without decoding anything. They are used to estimate the cost of each
+job, so that the most expensive jobs are sent to workers first and
+don't stall the end of the batch, while tiny jobs are sent in batches
+to save on per-task overhead.
+
+Costs are relative and measured in processed pixels: pixels decoded
+(taking JPEG DCT scaling into account) plus pixels of every rendition,
+weighted by ENCODE_WEIGHT for encoding. Images which are copied as they
+are (see imgc.worker.is_unchanged) cost nothing.
+'''
+
+from collections import namedtuple
+
+from imgc.scheduler import MEMORY_OVERHEAD
+
+
+ENCODE_WEIGHT = 2.0
+
+# jobs cheaper than that are batched together, up to BATCH_COST per batch
+BATCH_COST = 1000000
+BATCH_SIZE = 32
+
+
+# unchanged - source is copied, not decoded
+PlanItem = namedtuple(
+    'PlanItem',
+    'src dst format size targets scale cost memory error unchanged',
+    defaults=(False,))
+
+
+def draft_scale(fmt, size, target, reducing_gap):
+    '''
+    denominator of JPEG DCT scaling Image.draft would choose
+    '''
+    if fmt != 'JPEG' or reducing_gap is None:
+        return 1
+    scale = 1
+    while scale < 8 and \
+            size[0] // (scale * 2) >= target[0] * reducing_gap and \
+            size[1] // (scale * 2) >= target[1] * reducing_gap:
+        scale *= 2
+    return scale
+
+
+def plan_item(src, dst, renditions, reducing_gap=None, options=None):
+    '''
+    reads image header and estimates the cost of processing it
+    with options (imgc.job.Options), if given
+    '''
+    from PIL import Image
+    from imgc.metadata import oriented, stored_size
+    from imgc.worker import is_unchanged
+
+    try:
+        with Image.open(src) as im:
+            fmt, size, bands = im.format, im.size, len(im.getbands())
+            view = oriented(im)
+            targets = [rendition.target_size(view)
+                       for rendition in renditions]
+            # cropped renditions need more of the whole image than their size
+            needed = [rendition.full_size(view, target)
+                      for rendition, target in zip(renditions, targets)]
+            unchanged = options is not None and \
+                is_unchanged(im, renditions, dst, options)
+            largest = stored_size(im, (
+                max(width for width, height in needed),
+                max(height for width, height in needed)))
+    except (OSError, ValueError, Image.DecompressionBombError) as err:
+        # the worker will report the error, it is cheap to schedule
+        return PlanItem(src, dst, None, None, [], 1, 0, 0, str(err))
+    if unchanged:
+        return PlanItem(src, dst, fmt, size, targets, 1, 0, 0, None, True)
+
+    scale = draft_scale(fmt, size, largest, reducing_gap)
+    decoded = (size[0] // scale) * (size[1] // scale)
+    encoded = sum(width * height for width, height in targets)
+    cost = decoded + ENCODE_WEIGHT * encoded
+    memory = int(size[0] * size[1] * bands * MEMORY_OVERHEAD)
+    return PlanItem(src, dst, fmt, size, targets, scale, cost, memory, None)
+
+
+def order_by_cost(items):
+    return sorted(items, key=lambda item: item.cost, reverse=True)
+
+
+def batches(items, batch_cost=BATCH_COST, batch_size=BATCH_SIZE):
+    '''
+    groups consecutive cheap items into batches,
+    expensive items always form a batch of their own
+    '''
+    batch, cost = [], 0
+    for item in items:
+        if item.cost >= batch_cost:
+            yield [item]
+            continue
+        batch.append(item)
+        cost += item.cost
+        if cost >= batch_cost or len(batch) >= batch_size:
+            yield batch
+            batch, cost = [], 0
+    if batch:
+        yield batch
+
+
+def summary(items):
+    '''
+    projected work of a plan
+    '''
+    items = list(items)
+    valid = [item for item in items if not item.error]
+    return {
+        'images': len(items),
+        'errors': len(items) - len(valid),
+        'unchanged': sum(1 for item in valid if item.unchanged),
+        'pixels_in': sum(item.size[0] * item.size[1] for item in valid
+                         if not item.unchanged),
+        'pixels_out': sum(w * h for item in valid if not item.unchanged
+                          for w, h in item.targets),
+        'cost': sum(item.cost for item in valid),
+        'max_memory': max((item.memory for item in valid), default=0),
+        'batches': sum(1 for batch in batches(order_by_cost(items))),
+    }
@@ -0,0 +1,35 @@
+import os
+
+
+EXECUTORS = ('thread', 'process')
+
+
+def default_workers():
+    '''
+    number of pool workers used when -w is omitted
+    '''
+    return os.cpu_count() or 1
+
+
+def create_pool(executor='thread', workers=None, **kwargs):
+    '''
+    creates a worker pool of the requested kind
+
+    arguments:
+        executor
+            'thread' - multiprocessing.dummy.Pool, cheap to start,
+                       but python code in workers competes for the GIL
+            'process' - multiprocessing.Pool, jobs and results have to
+                        be picklable, but scales across all cores
+        workers
+            number of workers, defaults to the number of CPUs
+        kwargs
+            passed as is to the pool constructor (initializer etc.)
+    '''
+    if executor == 'thread':
+        from multiprocessing.dummy import Pool
+    elif executor == 'process':
+        from multiprocessing import Pool
+    else:
+        raise ValueError('Unknown executor: %s' % executor)
+    return Pool(workers or default_workers(), **kwargs)
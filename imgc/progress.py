@@ -0,0 +1,283 @@
+'''
+progress of a run, reported without slowing it down
+
+Any thread updates Progress counters, which costs a lock around a few
+integer additions, and nothing is printed per image. A single reporter
+thread takes a snapshot of the counters every interval, along with events
+queued since the last one, and renders them:
+    plain - a status line every few seconds
+    bar   - a single line redrawn in place, on a terminal
+    json  - one JSON event per line, for other programs
+    quiet - errors only
+    queue - events are put into a queue.Queue, drained by the GUI
+            from its main loop, see imgc.wrap
+Events are dicts with an 'event' key: 'progress' (a snapshot), 'error'
+(src and error), 'image' (src and the qualities picked for its outputs by
+a quality search, see imgc.search) and, once the run is over, 'done' (the
+final snapshot).
+'''
+
+import json
+import queue
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+
+
+COUNTERS = ('found', 'processed', 'done', 'errors', 'cancelled', 'skipped',
+            'duplicates', 'unchanged', 'bytes_in', 'bytes_out')
+MODES = ('auto', 'plain', 'bar', 'json')
+
+
+class Progress:
+    '''
+    counters of a run and errors not reported yet, safe to update
+    from any thread
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = dict.fromkeys(COUNTERS, 0)
+        self.started = time.time()
+        self.discovered = False  # found is final
+        self.events = deque()  # error and image events not reported yet
+        self.failed = []  # (src, error) of every failed image
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.values[name] += value
+
+    def add_result(self, result):
+        '''
+        counts a Result as done, failed or cancelled, processed is left
+        to the caller, which counts it once the result is fully handled
+        '''
+        if result.cancelled:
+            self.add(cancelled=1)
+        elif result.ok:
+            self.add(done=1, unchanged=int(result.passed_through),
+                     bytes_in=result.bytes_in, bytes_out=result.bytes_out)
+            if result.qualities:
+                self.events.append({'event': 'image', 'src': result.src,
+                                    'qualities': dict(result.qualities)})
+        else:
+            self.add(errors=1)
+            self.failed.append((result.src, result.error))
+            self.error(result.src, result.error)
+
+    def error(self, src, error):
+        '''
+        queues an error to be reported, counted by add_result only
+        '''
+        self.events.append({'event': 'error', 'src': src, 'error': str(error)})
+
+    def pop_events(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+    def snapshot(self, event='progress'):
+        with self.lock:
+            snapshot = dict(self.values)
+        elapsed = time.time() - self.started
+        snapshot.update(
+            event=event, elapsed=elapsed, discovered=self.discovered,
+            rate=snapshot['processed'] / elapsed if elapsed else 0.0)
+        return snapshot
+
+    def summary(self):
+        '''
+        final counters, with (src, error) of every failed image
+        '''
+        summary = self.snapshot('done')
+        summary['failed'] = list(self.failed)
+        return summary
+
+
+class Counter:
+    '''
+    attribute reading and setting a counter of instance.stats (Progress),
+    increments should use Progress.add to be atomic
+    '''
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return instance.stats.values[self.name]
+
+    def __set__(self, instance, value):
+        with instance.stats.lock:
+            instance.stats.values[self.name] = value
+
+
+class Reporter:
+    '''
+    renders events of progress from its own thread, every interval seconds
+    this base class reports errors only, as --quiet does
+    '''
+    interval = 1.0
+
+    def __init__(self, progress, stream=None):
+        self.progress = progress
+        self.stream = stream  # None for sys.stdout at the time of writing
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last = None  # last reported counters, unchanged ones are skipped
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.tick()
+
+    def tick(self, final=False):
+        for event in self.progress.pop_events():
+            self.emit(event)
+        snapshot = self.progress.snapshot('done' if final else 'progress')
+        counters = [snapshot[name] for name in COUNTERS]
+        if final or counters != self.last:
+            self.last = counters
+            self.emit(snapshot)
+
+    def close(self):
+        '''
+        stops the thread and reports what is left and the final snapshot
+        '''
+        self.stopped.set()
+        if self.thread is not None and \
+                self.thread is not threading.current_thread():
+            self.thread.join()
+        self.tick(final=True)
+
+    def emit(self, event):
+        if event['event'] == 'error':
+            self.write("ERROR {src}: {error}\n".format(**event))
+
+    def message(self, text):
+        '''
+        prints a summary line, after the final snapshot
+        '''
+
+    def write(self, text):
+        try:
+            stream = self.stream or sys.stdout
+            stream.write(text)
+            stream.flush()
+        except (OSError, ValueError):  # e.g. closed pipe
+            pass
+
+
+def status_line(snapshot):
+    if snapshot['discovered']:
+        total = '/{}'.format(snapshot['found'])
+        if snapshot['found']:
+            total += ' {:3.0f}%'.format(
+                100.0 * snapshot['processed'] / snapshot['found'])
+    else:
+        total = ' of {}+ found'.format(snapshot['found'])
+    line = '[{}{}] {:.1f} img/s'.format(
+        snapshot['processed'], total, snapshot['rate'])
+    if snapshot['errors']:
+        line += ', errors: {}'.format(snapshot['errors'])
+    if snapshot['cancelled']:
+        line += ', cancelled: {}'.format(snapshot['cancelled'])
+    if snapshot['discovered'] and snapshot['rate'] and \
+            snapshot['event'] != 'done':
+        left = (snapshot['found'] - snapshot['processed']) / snapshot['rate']
+        line += ', ETA {:.0f}s'.format(left)
+    return line
+
+
+class PlainReporter(Reporter):
+    '''
+    a status line every interval, for logs and pipes
+    '''
+    interval = 5.0
+
+    def emit(self, event):
+        if event['event'] == 'error':
+            super().emit(event)
+        elif event['event'] == 'image':
+            for path, quality in sorted(event['qualities'].items()):
+                self.write('saved: {} (quality {})\n'.format(path, quality))
+        elif event['processed'] or event['event'] == 'done':
+            self.write(status_line(event) + '\n')
+
+    def message(self, text):
+        self.write(text + '\n')
+
+
+class BarReporter(PlainReporter):
+    '''
+    progress bar redrawn in place, errors are printed above it
+    '''
+    interval = 0.2
+    width = 30
+
+    def emit(self, event):
+        if event['event'] in ('error', 'image'):
+            self.write('\r\x1b[K')
+            super().emit(event)
+            return
+        if event['event'] == 'done' and not event['processed']:
+            self.write('\r\x1b[K')
+            return
+        line = status_line(event)
+        if event['discovered'] and event['found']:
+            filled = self.width * event['processed'] // event['found']
+            line = '[{}{}] {}'.format(
+                '#' * filled, '.' * (self.width - filled), line)
+        columns = shutil.get_terminal_size().columns
+        self.write('\r\x1b[K' + line[:columns - 1])
+        if event['event'] == 'done':
+            self.write('\n')
+
+
+class JsonReporter(Reporter):
+    '''
+    every event as a JSON line, summaries are left to the 'done' event
+    '''
+
+    def emit(self, event):
+        self.write(json.dumps(event) + '\n')
+
+
+class QueueReporter(Reporter):
+    '''
+    puts events into self.queue, for a GUI to drain from its main loop
+    '''
+    interval = 0.1
+
+    def __init__(self, progress, stream=None):
+        super().__init__(progress, stream)
+        self.queue = queue.Queue()
+
+    def emit(self, event):
+        self.queue.put(event)
+
+
+def create_reporter(progress, mode='auto', quiet=False, stream=None):
+    '''
+    reporter for --progress mode, or for --quiet, not started yet
+    '''
+    if quiet:
+        return Reporter(progress, stream)
+    if mode == 'auto':
+        mode = 'bar' if (stream or sys.stdout).isatty() else 'plain'
+    reporters = {
+        'plain': PlainReporter,
+        'bar': BarReporter,
+        'json': JsonReporter,
+        'queue': QueueReporter,
+    }
+    return reporters[mode](progress, stream)
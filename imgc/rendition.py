@@ -0,0 +1,169 @@
+'''
+output renditions
+
+A rendition is a size pattern (see ImageSize) along with its own
+output naming and quality. Renditions are described by specs:
+
+    PATTERN[:key=value[:key=value...]]
+
+    keys:
+        quality (q) - JPEG quality, defaults to --quality
+        suffix      - appended to the output file name, before extension
+        dir         - subdirectory of the output directory
+        crop        - fill WxH exactly, cropping the source first, with
+                      center, top or smart gravity, see imgc.crop
+
+    examples:
+        1000x
+        400x:quality=70:suffix=_small
+        150x150:dir=thumbs
+        300x300:crop=smart
+
+Several specs may be given at once, separated by commas. When there is
+more than one rendition, renditions without suffix and dir are given
+"-PATTERN" suffix, so that their outputs don't overwrite each other.
+'''
+
+import os
+
+from imgc import crop
+from imgc.image import ImageSize
+
+
+class Rendition:
+    keys = {'quality': 'quality', 'q': 'quality', 'suffix': 'suffix',
+            'dir': 'dir', 'crop': 'crop'}
+
+    def __init__(self, size, quality=None, suffix='', dir='', crop=None):
+        self.size = size
+        self.quality = quality
+        self.suffix = suffix
+        self.dir = dir
+        self.crop = crop  # gravity, see imgc.crop
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.spec)
+
+    def __eq__(self, other):
+        return isinstance(other, Rendition) and vars(self) == vars(other)
+
+    @property
+    def size_spec(self):
+        if isinstance(self.size, str):
+            return self.size
+        return 'x'.join(str(x or '') for x in self.size)
+
+    @property
+    def spec(self):
+        spec = self.size_spec
+        if self.quality is not None:
+            spec += ':quality=%d' % self.quality
+        if self.suffix:
+            spec += ':suffix=' + self.suffix
+        if self.dir:
+            spec += ':dir=' + self.dir
+        if self.crop:
+            spec += ':crop=' + self.crop
+        return spec
+
+    @classmethod
+    def parse(cls, spec):
+        '''
+        parses a single rendition spec, see module docstring
+        '''
+        size, *items = spec.split(':')
+        matches = [pattern.match(size) for _, pattern in ImageSize.PATTERNS]
+        if not any(matches):
+            raise ValueError('Invalid size pattern')
+        kwargs = {}
+        for item in items:
+            key, sep, value = item.partition('=')
+            if not sep or key not in cls.keys:
+                raise ValueError('Invalid rendition option: %s' % item)
+            kwargs[cls.keys[key]] = value
+        if 'quality' in kwargs:
+            kwargs['quality'] = int(kwargs['quality'])
+            if not 1 <= kwargs['quality'] <= 100:
+                raise ValueError('JPEG quality must be from 1 to 100')
+        if os.sep in kwargs.get('suffix', ''):
+            raise ValueError('Rendition suffix must not contain %s' % os.sep)
+        if 'crop' in kwargs:
+            if kwargs['crop'] not in crop.GRAVITIES:
+                raise ValueError('Crop gravity must be one of: %s'
+                                 % ', '.join(crop.GRAVITIES))
+            match = next(match for match in matches if match)
+            if not (match.group('width') and match.group('height')):
+                raise ValueError('Crop requires both width and height')
+        return cls(size, **kwargs)
+
+    def path(self, dst):
+        '''
+        output path of this rendition for image which would be saved
+        to dst if it was the only rendition
+        '''
+        directory, filename = os.path.split(dst)
+        name, ext = os.path.splitext(filename)
+        if self.dir:
+            directory = os.path.join(directory, self.dir)
+        return os.path.join(directory, name + self.suffix + ext)
+
+    def target_size(self, image):
+        if self.crop:
+            # always exactly WxH, the source is cropped to fit
+            return ImageSize.parse(
+                self.size.rstrip(ImageSize.FLAGS), image=image)
+        return ImageSize.parse(self.size, image=image)
+
+    def full_size(self, image, size):
+        '''
+        size the whole image needs to be decoded at for this rendition
+        of target size, larger than size if the image is cropped
+        '''
+        if self.crop:
+            return crop.full_size(image.size, size)
+        return size
+
+    def crop_box(self, image, size, focus=None):
+        '''
+        region of image resized to size, None for the whole image,
+        focus is the focal point found for smart gravity
+        '''
+        if not self.crop:
+            return None
+        return crop.crop_box(image.size, size, self.crop, focus)
+
+
+def default_suffix(size):
+    # geometry flags are not welcome in file names
+    return '-' + size.replace('%', 'pct').strip(ImageSize.FLAGS)
+
+
+def parse_renditions(size):
+    '''
+    returns list of Renditions for size, which is one of:
+        1. a size tuple, e.g. (800, 600)
+        2. a string with one or more comma separated specs
+        3. a list of specs or Renditions
+    '''
+    if isinstance(size, tuple):
+        specs = [Rendition(size)]
+    elif isinstance(size, str):
+        specs = size.split(',')
+    else:
+        specs = list(size)
+    renditions = [
+        spec if isinstance(spec, Rendition) else Rendition.parse(spec)
+        for spec in specs]
+
+    if len(renditions) > 1:
+        for rendition in renditions:
+            if not rendition.suffix and not rendition.dir:
+                rendition.suffix = default_suffix(rendition.size_spec)
+        paths = [rendition.path('image') for rendition in renditions]
+        if len(set(paths)) != len(paths):
+            raise ValueError('Renditions have the same output paths')
+    return renditions
+
+
+def output_paths(dst, renditions):
+    return [rendition.path(dst) for rendition in renditions]
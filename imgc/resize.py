@@ -0,0 +1,84 @@
+'''
+resizing helpers
+
+Full resolution decoding followed by a BICUBIC pass over every source pixel
+is the most expensive part of processing large photos. Two cheap
+reductions are applied first, both controlled by reducing_gap:
+
+    1. JPEG DCT scaling (Image.draft): the decoder itself produces an
+       image scaled by 1/2, 1/4 or 1/8, while staying at least
+       reducing_gap times larger than the target size;
+    2. integer reduce() with box averaging, again keeping the image at
+       least reducing_gap times larger than the target.
+
+The remaining work is done with the selected quality filter. The larger
+reducing_gap is, the closer the result is to a plain resize; None
+disables both reductions.
+'''
+
+# filter name -> name of Pillow constant,
+# Pillow itself is only imported when images are processed
+RESAMPLE_FILTERS = {
+    'nearest': 'NEAREST',
+    'box': 'BOX',
+    'bilinear': 'BILINEAR',
+    'hamming': 'HAMMING',
+    'bicubic': 'BICUBIC',
+    'lanczos': 'LANCZOS',
+}
+DEFAULT_FILTER = 'bicubic'
+DEFAULT_REDUCING_GAP = 3.0
+
+
+def resample_filter(name):
+    '''
+    returns Pillow resampling constant by its name
+    '''
+    from PIL import Image
+
+    try:
+        return getattr(Image, RESAMPLE_FILTERS[name])
+    except KeyError:
+        raise ValueError('Unknown resample filter: %s' % name)
+
+
+def draft(im, size, reducing_gap=DEFAULT_REDUCING_GAP):
+    '''
+    configures JPEG decoder to scale image down while decoding
+    must be called before image data is loaded
+    returns True if decoder scale was changed
+    '''
+    if reducing_gap is None or im.format != 'JPEG':
+        return False
+    orig_size = im.size
+    im.draft(im.mode, (int(size[0] * reducing_gap),
+                       int(size[1] * reducing_gap)))
+    return im.size != orig_size
+
+
+def fast_resize(im, size, resample=DEFAULT_FILTER,
+                reducing_gap=DEFAULT_REDUCING_GAP, box=None):
+    '''
+    resizes not yet loaded image to size,
+    using decode-time and integer reductions where possible
+
+    arguments:
+        im
+            PIL Image instance, as returned by Image.open
+        size
+            target (width, height) tuple, see ImageSize.parse
+        resample
+            name of the final filter, see RESAMPLE_FILTERS
+        reducing_gap
+            aggressiveness of reductions, None to disable them
+        box
+            region of an already loaded image to be resized, see imgc.crop,
+            only its pixels are reduced and resampled
+    '''
+    resample = resample_filter(resample)
+    if box is not None:
+        return im.resize(size, resample, box=box, reducing_gap=reducing_gap)
+    draft(im, size, reducing_gap)
+    if im.size == tuple(size):
+        return im.copy()
+    return im.resize(size, resample, reducing_gap=reducing_gap)
@@ -0,0 +1,73 @@
+'''
+memory-aware admission of jobs
+
+Decoding an image takes width * height * bands bytes, no matter how
+small the file is, so the number of images decoded at once is limited
+by their estimated memory instead of their count. Estimates are made
+from image headers only, which is cheap - pixel data is not read.
+'''
+
+import re
+import threading
+
+
+# resized copy and reduce() intermediates on top of the decoded image
+MEMORY_OVERHEAD = 1.5
+
+UNITS = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40}
+PATTERN_MEMORY = re.compile(r'^(?P<value>\d+(\.\d+)?)\s*(?P<unit>[kmgt]?)i?b?$')
+
+
+def parse_memory(x):
+    '''
+    parses memory amounts like 512M, 1.5G or 1048576 into bytes
+    '''
+    match = PATTERN_MEMORY.match(str(x).strip().lower())
+    if not match:
+        raise ValueError('Invalid memory amount: %s' % x)
+    return int(float(match.group('value')) * UNITS[match.group('unit')])
+
+
+def decoded_size(im):
+    '''
+    bytes taken by pixel data of not yet loaded image
+    '''
+    width, height = im.size
+    return width * height * len(im.getbands())
+
+
+def estimate_memory(path):
+    '''
+    estimated peak memory of processing image at path,
+    0 if its header can't be read - the worker will report the error
+    '''
+    from PIL import Image
+
+    try:
+        with Image.open(path) as im:
+            return int(decoded_size(im) * MEMORY_OVERHEAD)
+    except (OSError, Image.DecompressionBombError):
+        return 0
+
+
+class MemoryBudget:
+    '''
+    admits jobs while their total estimated memory fits into limit
+    a job larger than the whole limit is admitted when nothing else runs
+    '''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, cost):
+        with self.condition:
+            while self.used and self.used + cost > self.limit:
+                self.condition.wait()
+            self.used += cost
+
+    def release(self, cost):
+        with self.condition:
+            self.used -= cost
+            self.condition.notify_all()
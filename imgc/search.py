@@ -0,0 +1,197 @@
+'''
+search for the lowest JPEG quality meeting a target
+
+Two targets are supported:
+    target_bytes - encoded size must not exceed it, the highest quality
+                   fitting into it is chosen
+    target_ssim  - structural similarity to the resized image must be
+                   at least that, the lowest such quality is chosen
+When both are given, target_bytes is the hard limit.
+
+Encode trials are bounded: they are made in memory on the already
+resized image, start from an initial guess based on bits per pixel
+(bytes) or a typical value (SSIM), bisect the quality range, stop early
+once the size is close enough to target_bytes, and take at most
+max_trials per target. The encoded result of the chosen trial is reused.
+'''
+
+import io
+
+from imgc import cancel
+
+
+MIN_QUALITY = 30
+MAX_TRIALS = 7
+
+# consider target_bytes met when within that fraction below it
+BYTES_TOLERANCE = 0.02
+
+# SSIM is computed on full resolution luminance, in BLOCK x BLOCK windows,
+# large images are sampled on a grid of at most MAX_BLOCKS windows
+MAX_BLOCKS = 1024
+BLOCK = 8
+C1 = (0.01 * 255) ** 2
+C2 = (0.03 * 255) ** 2
+
+SSIM_GUESS = 85
+# bits per pixel -> typical JPEG quality producing them
+BPP_QUALITY = ((0.25, 20), (0.5, 50), (1.0, 75), (1.5, 85),
+               (2.5, 92), (4.0, 97))
+
+
+def luminance(im):
+    '''
+    grayscale pixels of image, as (width, height, data)
+    '''
+    im = im.convert('L')
+    return im.size[0], im.size[1], im.tobytes()
+
+
+def ssim(reference, test):
+    '''
+    mean SSIM of two luminance() results of the same size
+    '''
+    width, height, x = reference
+    y = test[2]
+    n = BLOCK * BLOCK
+    columns, rows = width // BLOCK, height // BLOCK
+    # sample every step-th window in both directions
+    step = 1
+    while (columns // step) * (rows // step) > MAX_BLOCKS:
+        step += 1
+    total, blocks = 0.0, 0
+    for top in range(0, rows * BLOCK, BLOCK * step):
+        for left in range(0, columns * BLOCK, BLOCK * step):
+            xs, ys = [], []
+            for row in range(top, top + BLOCK):
+                start = row * width + left
+                xs.extend(x[start:start + BLOCK])
+                ys.extend(y[start:start + BLOCK])
+            mx, my = sum(xs) / n, sum(ys) / n
+            vx = sum(v * v for v in xs) / n - mx * mx
+            vy = sum(v * v for v in ys) / n - my * my
+            cov = sum(a * b for a, b in zip(xs, ys)) / n - mx * my
+            total += ((2 * mx * my + C1) * (2 * cov + C2)) / \
+                ((mx * mx + my * my + C1) * (vx + vy + C2))
+            blocks += 1
+    if not blocks:  # image smaller than a block
+        return 1.0 if x == y else 0.0
+    return total / blocks
+
+
+def bytes_guess(target_bytes, pixels):
+    '''
+    JPEG quality likely to produce target_bytes for that many pixels
+    '''
+    bpp = target_bytes * 8.0 / max(pixels, 1)
+    if bpp <= BPP_QUALITY[0][0]:
+        return BPP_QUALITY[0][1]
+    for (bpp1, q1), (bpp2, q2) in zip(BPP_QUALITY, BPP_QUALITY[1:]):
+        if bpp <= bpp2:
+            return int(q1 + (q2 - q1) * (bpp - bpp1) / (bpp2 - bpp1))
+    return BPP_QUALITY[-1][1]
+
+
+class QualitySearch:
+    '''
+    bounded search of JPEG (or WebP) quality for a single resized image
+    '''
+
+    def __init__(self, im, fmt='JPEG', min_quality=MIN_QUALITY,
+                 max_quality=95, target_bytes=None, target_ssim=None,
+                 max_trials=MAX_TRIALS, options=None):
+        self.im = im
+        self.fmt = fmt
+        self.min_quality = min(min_quality, max_quality)
+        self.max_quality = max_quality
+        self.target_bytes = target_bytes
+        self.target_ssim = target_ssim
+        self.max_trials = max_trials
+        self.options = options  # encoder preset and options, see encode()
+        self.encoded = {}  # quality -> bytes
+        self.similarity = {}  # quality -> SSIM
+        self.reference = None
+        self.buf = io.BytesIO()
+
+    @property
+    def trials(self):
+        return len(self.encoded)
+
+    def encode(self, quality):
+        if quality not in self.encoded:
+            from imgc.worker import encode
+
+            cancel.check()
+            self.buf.seek(0)
+            self.buf.truncate()
+            encode(self.im, self.fmt, quality, self.buf, self.options)
+            self.encoded[quality] = self.buf.getvalue()
+        return self.encoded[quality]
+
+    def ssim(self, quality):
+        if quality not in self.similarity:
+            from PIL import Image
+
+            if self.reference is None:
+                self.reference = luminance(self.im)
+            with Image.open(io.BytesIO(self.encode(quality))) as im:
+                self.similarity[quality] = ssim(self.reference, luminance(im))
+        return self.similarity[quality]
+
+    def too_large(self, quality):
+        return len(self.encode(quality)) > self.target_bytes
+
+    def close_enough(self, quality):
+        size = len(self.encode(quality))
+        return self.target_bytes * (1 - BYTES_TOLERANCE) <= size \
+            <= self.target_bytes
+
+    def similar(self, quality):
+        return self.ssim(quality) >= self.target_ssim
+
+    def lowest_similar(self):
+        '''
+        lowest quality meeting target_ssim, max_quality if none does
+        '''
+        lo, hi = self.min_quality, self.max_quality
+        if not self.similar(hi):
+            return hi
+        best, hi = hi, hi - 1
+        quality = max(lo, min(SSIM_GUESS, hi))
+        while lo <= hi and self.trials < self.max_trials:
+            if self.similar(quality):
+                best, hi = quality, quality - 1
+            else:
+                lo = quality + 1
+            quality = (lo + hi) // 2
+        return best
+
+    def highest_fitting(self, max_quality):
+        '''
+        highest quality below max_quality fitting into target_bytes,
+        min_quality if none does
+        '''
+        pixels = self.im.size[0] * self.im.size[1]
+        lo, hi = self.min_quality, max_quality - 1
+        best = None
+        quality = max(lo, min(bytes_guess(self.target_bytes, pixels), hi))
+        while lo <= hi and self.trials < self.max_trials:
+            if not self.too_large(quality):
+                best, lo = quality, quality + 1
+                if self.close_enough(quality):
+                    break
+            else:
+                hi = quality - 1
+            quality = (lo + hi + 1) // 2
+        return self.min_quality if best is None else best
+
+    def run(self):
+        '''
+        returns (quality, encoded bytes)
+        '''
+        quality = self.max_quality
+        if self.target_ssim is not None:
+            quality = self.lowest_similar()
+        if self.target_bytes is not None and self.too_large(quality):
+            quality = self.highest_fitting(quality)
+        return quality, self.encode(quality)
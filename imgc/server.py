@@ -0,0 +1,317 @@
+'''
+resident imgc server
+
+    imgc serve [--socket PATH] [-e thread|process] [-w N]
+
+Keeps a warm worker pool and accepts jobs over a Unix domain socket, so
+that callers don't pay for interpreter start, imports and pool creation
+on every batch. The protocol is newline delimited JSON, one message per
+line. Requests:
+
+    {"id": "1", "paths": ["photos/", "a.jpg"], "options": {"size": "800x"}}
+    {"id": "2", "data": "<base64>", "format": "PNG", "options": {...}}
+
+options are the same as the options of the imgc command (long option
+names, with dashes replaced by underscores), but for SERVER_OPTIONS, which
+are ignored. Responses are streamed back
+as images are processed:
+
+    {"id": "1", "event": "result", "src": ..., "outputs": [...],
+     "qualities": {}, "error": null, "elapsed": 0.05}
+    {"id": "2", "event": "result", "data": "<base64>", "error": null}
+    {"id": "1", "event": "done", "images": 7, "errors": 0, "skipped": 0}
+    {"id": "3", "event": "error", "error": "Invalid request"}
+
+qualities maps outputs to the JPEG quality picked for them by
+target_bytes or target_ssim. Every client may send several requests at once. Jobs of all clients are
+dispatched to the pool in round-robin order, one job per client at a
+time, so a client submitting a huge tree doesn't starve the others.
+'''
+
+import argparse
+import asyncio
+import base64
+import collections
+import json
+import os
+import signal
+
+from imgc.api import compress
+from imgc.pool import EXECUTORS, create_pool, default_workers
+from imgc.job import Job
+
+
+# process-wide settings, a request must not change them for other clients
+SERVER_OPTIONS = ('max_image_pixels',)
+
+def default_socket():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'imgc.sock')
+    return '/tmp/imgc-{}.sock'.format(os.getuid())
+
+
+class FairQueue:
+    '''
+    per-client FIFO queues served in round-robin order
+    '''
+
+    def __init__(self):
+        self.queues = collections.OrderedDict()  # client -> deque
+        self.changed = asyncio.Event()
+
+    def put(self, client, item):
+        self.queues.setdefault(client, collections.deque()).append(item)
+        self.changed.set()
+
+    def remove(self, client):
+        self.queues.pop(client, None)
+
+    def pop(self):
+        '''
+        returns next item, None if all queues are empty
+        '''
+        for client, queue in self.queues.items():
+            if queue:
+                item = queue.popleft()
+                # served client goes to the end of the line
+                self.queues.move_to_end(client)
+                return item
+        return None
+
+    async def get(self):
+        while True:
+            item = self.pop()
+            if item is not None:
+                return item
+            self.changed.clear()
+            await self.changed.wait()
+
+
+class Request:
+    '''
+    state of a single client request
+    '''
+
+    def __init__(self, client, request_id):
+        self.client = client
+        self.id = request_id
+        self.handler = None  # ImageHandler of path requests
+        self.pending = 0
+        self.images = 0
+        self.errors = 0
+        self.skipped = 0
+        self.queued = False  # all jobs were put into the queue
+
+    def message(self, event, **kwargs):
+        kwargs.update({'id': self.id, 'event': event})
+        return kwargs
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    async def send(self, message):
+        if self.closed:
+            return
+        self.writer.write(json.dumps(message).encode() + b'\n')
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            self.closed = True
+
+
+class Server:
+    def __init__(self, socket_path=None, executor='thread', workers=None):
+        self.socket_path = socket_path or default_socket()
+        self.executor = executor
+        self.workers = workers or default_workers()
+        self.queue = None
+        self.pool = None
+
+    def submit(self, func, args=(), kwds=None):
+        '''
+        runs func in the pool, returns asyncio future of its result
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(value):
+            if not future.done():
+                future.set_result(value)
+
+        def reject(exc):
+            if not future.done():
+                future.set_exception(exc)
+
+        self.pool.apply_async(
+            func, args, kwds or {},
+            callback=lambda x: loop.call_soon_threadsafe(resolve, x),
+            error_callback=lambda x: loop.call_soon_threadsafe(reject, x))
+        return future
+
+    async def dispatch(self):
+        '''
+        keeps pool busy with at most 2 jobs per worker in flight
+        '''
+        capacity = asyncio.Semaphore(self.workers * 2)
+
+        def on_complete(request, future):
+            capacity.release()
+            asyncio.ensure_future(self.on_done(request, future))
+
+        while True:
+            await capacity.acquire()
+            request, func, args, kwds = await self.queue.get()
+            future = self.submit(func, args, kwds)
+            future.add_done_callback(
+                lambda future, request=request: on_complete(request, future))
+
+    async def on_done(self, request, future):
+        request.pending -= 1
+        try:
+            value = future.result()
+        except Exception as exc:
+            request.errors += 1
+            message = request.message('result', error=str(exc))
+        else:
+            if isinstance(value, bytes):
+                request.images += 1
+                message = request.message(
+                    'result', error=None,
+                    data=base64.b64encode(value).decode('ascii'))
+            else:
+                if value.ok:
+                    request.images += 1
+                    request.handler.stats.add(done=1)
+                    request.handler.update_manifest(value)
+                else:
+                    request.errors += 1
+                linked = request.handler.link_duplicates(value)
+                message = request.message(
+                    'result', src=value.src, outputs=value.outputs + linked,
+                    qualities=value.qualities, error=value.error,
+                    elapsed=value.elapsed)
+        await request.client.send(message)
+        await self.maybe_done(request)
+
+    async def maybe_done(self, request):
+        if request.queued and not request.pending:
+            if request.handler:
+                request.handler.save_manifests()
+            await request.client.send(request.message(
+                'done', images=request.images, errors=request.errors,
+                skipped=request.skipped))
+
+    async def enqueue(self, request, message):
+        '''
+        expands request message into jobs and puts them into the queue
+        '''
+        from imgc import ImageHandler
+        from imgc.worker import process
+
+        options = {key: value
+                   for key, value in (message.get('options') or {}).items()
+                   if key not in SERVER_OPTIONS}
+        if 'data' in message:
+            data = base64.b64decode(message['data'])
+            kwds = dict(options, format=message.get('format'))
+            request.pending += 1
+            self.queue.put(request.client, (request, compress, (data,), kwds))
+        elif 'paths' in message:
+            handler = request.handler = ImageHandler(
+                src_images=message['paths'], **options)
+            loop = asyncio.get_running_loop()
+            paths = await loop.run_in_executor(
+                None, list, handler.generate_image_paths())
+            request.skipped = handler.imgs_skipped
+            job_options = handler.options
+            for src, dst in paths:
+                request.pending += 1
+                self.queue.put(request.client, (
+                    request, process, (Job(src, dst, job_options),), None))
+        else:
+            raise ValueError('Request must have either paths or data')
+        request.queued = True
+        await self.maybe_done(request)
+
+    async def handle_client(self, reader, writer):
+        client = Client(reader, writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request_id = None
+                try:
+                    message = json.loads(line.decode())
+                    request_id = message.get('id')
+                    await self.enqueue(Request(client, request_id), message)
+                except (ValueError, TypeError, AttributeError,
+                        OSError) as exc:
+                    await client.send({
+                        'id': request_id, 'event': 'error',
+                        'error': str(exc) or exc.__class__.__name__})
+        finally:
+            client.closed = True
+            self.queue.remove(client)
+            writer.close()
+
+    async def serve(self, ready=None):
+        '''
+        runs the server until cancelled
+        ready is an optional threading.Event set once socket is listening
+        '''
+        self.queue = FairQueue()
+        self.pool = create_pool(self.executor, self.workers)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(
+            self.handle_client, path=self.socket_path)
+        dispatcher = asyncio.ensure_future(self.dispatch())
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            dispatcher.cancel()
+            self.pool.terminate()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='imgc serve', description="Run resident imgc server")
+    parser.add_argument(
+        '--socket',
+        default=default_socket(), type=str,
+        help='Path of the Unix domain socket to listen on')
+    parser.add_argument(
+        '-e', '--executor',
+        default='process', choices=EXECUTORS,
+        help='Run workers as threads or as separate processes')
+    parser.add_argument(
+        '-w', '--workers',
+        default=default_workers(), type=int,
+        help='Number of pool workers (defaults to the number of CPUs)')
+    args = parser.parse_args(argv)
+
+    server = Server(args.socket, args.executor, args.workers)
+    print("Listening on {}".format(server.socket_path))
+
+    async def run():
+        task = asyncio.ensure_future(server.serve())
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
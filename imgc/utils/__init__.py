@@ -1,3 +1,134 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+
+IMAGE_EXTS = ['jpg', 'jpeg', 'png', 'gif', 'webp']
+IMAGE_JPG = ['jpg', 'jpeg']
+IMAGE_FORMATS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG', 'gif': 'GIF',
+                 'webp': 'WEBP'}
+
+
 def tofrac(x):
     """Convert percentage to floating point fraction"""
     return x/100.0
+
+
+def extension(path):
+    """Return lowercased file extension without the leading dot"""
+    return os.path.splitext(path)[1][1:].strip().lower()
+
+
+def read_nul_delimited(fp, blocksize=1 << 16):
+    """Lazily yield NUL-delimited paths from a binary stream"""
+    tail = b''
+    for block in iter(lambda: fp.read(blocksize), b''):
+        *paths, tail = (tail + block).split(b'\0')
+        for path in paths:
+            if path:
+                yield os.fsdecode(path)
+    if tail:
+        yield os.fsdecode(tail)
+
+
+def temp_path(path):
+    """Return a temporary path next to path, unique per process and thread"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, '.{}.{}-{}.tmp'.format(
+        name, os.getpid(), threading.get_ident()))
+
+
+def write_atomic(path, data):
+    """Write data to a temporary file next to path and rename it to path"""
+    tmp = temp_path(path)
+    try:
+        with open(tmp, 'wb') as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def kernel_copy(fdst, fsrc, size):
+    """
+    Copy size bytes between file descriptors without passing them through
+    user space, with copy_file_range (which may also clone blocks or copy
+    server-side) or sendfile, return False if neither is supported
+    """
+    for copy in (getattr(os, 'copy_file_range', None),
+                 getattr(os, 'sendfile', None)):
+        if copy is None:
+            continue
+        copied = 0
+        try:
+            while copied < size:
+                if copy is os.sendfile:
+                    sent = copy(fdst, fsrc, copied, size - copied)
+                else:
+                    sent = copy(fsrc, fdst, size - copied, copied, copied)
+                if not sent:
+                    break
+                copied += sent
+        except OSError:
+            if copied:
+                raise
+            continue  # e.g. EXDEV or EINVAL, before anything was copied
+        if copied == size:
+            return True
+    return False
+
+
+def copy_file(src, dst):
+    """Copy src to dst atomically, in the kernel where possible"""
+    tmp = temp_path(dst)
+    try:
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            if not kernel_copy(fdst.fileno(), fsrc.fileno(), size):
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                shutil.copyfileobj(fsrc, fdst)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class LRUCache:
+    """Thread-safe mapping keeping at most maxsize most recently used items"""
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key, create):
+        """Return cached value of key, made by create() when it is missing
+
+        create() runs outside the lock, so that threads don't wait for
+        each other, and a value made concurrently by two threads is kept once
+        """
+        with self.lock:
+            if key in self.items:
+                self.hits += 1
+                self.items.move_to_end(key)
+                return self.items[key]
+            self.misses += 1
+        value = create()
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.hits = self.misses = 0
@@ -1,5 +1,9 @@
 from argparse import ArgumentTypeError
+from imgc.encoder import PRESETS, parse_encoder_options
 from imgc.image import ImageSize
+from imgc.rendition import parse_renditions
+from imgc.scheduler import parse_memory
+from imgc.workqueue import parse_shard
 
 def quality_type(x):
     '''
@@ -32,5 +36,101 @@ def size_type(x):
     else:
         raise ArgumentTypeError("Invalid size pattern")
 
-    print(x)
     return x
+
+
+def reducing_gap_type(x):
+    '''
+    argparse validator for --reducing-gap
+    accepts floats starting from 1.0, 0 or "off" disable reductions
+    '''
+    if str(x).lower() in ('0', 'off', 'none'):
+        return None
+    try:
+        x = float(x)
+    except ValueError as exc:
+        raise ArgumentTypeError from exc
+    if x < 1.0:
+        raise ArgumentTypeError("Minimum reducing gap is 1.0")
+    return x
+
+
+def memory_type(x):
+    '''
+    argparse validator for memory amounts, e.g. 512M or 2G
+    '''
+    try:
+        return parse_memory(x)
+    except ValueError as exc:
+        raise ArgumentTypeError(str(exc)) from exc
+
+
+def renditions_type(x):
+    '''
+    argparse validator for one or more comma separated rendition specs
+    (see imgc.rendition for the syntax), returns a list of specs
+    '''
+    try:
+        parse_renditions(x)  # validation only, specs are parsed again later
+    except ValueError as exc:
+        raise ArgumentTypeError(str(exc)) from exc
+    return x.split(',')
+
+
+def ssim_type(x):
+    '''
+    argparse validator for SSIM targets, from 0 to 1
+    '''
+    try:
+        x = float(x)
+    except ValueError as exc:
+        raise ArgumentTypeError from exc
+    if not 0 < x <= 1:
+        raise ArgumentTypeError("SSIM target must be from 0 to 1")
+    return x
+
+
+def fraction_type(x):
+    '''
+    argparse validator for fractions, e.g. watermark opacity and scale,
+    from 0 to 1
+    '''
+    try:
+        x = float(x)
+    except ValueError as exc:
+        raise ArgumentTypeError from exc
+    if not 0 < x <= 1:
+        raise ArgumentTypeError("Value must be from 0 to 1")
+    return x
+
+
+def encoder_options_type(x):
+    '''
+    argparse validator for --encoder-options, see imgc.encoder
+    '''
+    try:
+        return parse_encoder_options(x)
+    except ValueError as exc:
+        raise ArgumentTypeError(str(exc)) from exc
+
+
+def presets_type(x):
+    '''
+    argparse validator for comma separated encoder presets,
+    returns a list of preset names
+    '''
+    presets = [preset.strip() for preset in x.split(',') if preset.strip()]
+    for preset in presets:
+        if preset not in PRESETS:
+            raise ArgumentTypeError("Unknown preset: %s" % preset)
+    return presets
+
+
+def shard_type(x):
+    '''
+    argparse validator for --shard i/N
+    '''
+    try:
+        return parse_shard(x)
+    except ValueError as exc:
+        raise ArgumentTypeError(str(exc)) from exc
@@ -0,0 +1,119 @@
+'''
+watermarking of outputs
+
+The watermark file is decoded once per process, its opacity applied and
+the result kept premultiplied (RGBa), so that scaling it does not bleed
+colors of transparent pixels into its edges. Scaled copies are kept in
+an LRU cache keyed by their size, shared by all worker threads: outputs
+of a batch come in a few sizes, so after the first image of every size
+watermarking an image is a single paste (alpha_composite for images with
+alpha). Worker processes forked by a parent which already loaded the
+watermark (see preload) inherit the decoded copy instead of decoding it
+again, scaled copies are cached by every process.
+
+The watermark fits into scale times the output width and height and is
+placed at one of POSITIONS, MARGIN of the shorter output side away from
+its edges.
+'''
+
+from imgc.utils import LRUCache
+
+
+POSITIONS = ('top-left', 'top', 'top-right', 'left', 'center', 'right',
+             'bottom-left', 'bottom', 'bottom-right')
+DEFAULT_POSITION = 'bottom-right'
+DEFAULT_OPACITY = 0.5
+DEFAULT_SCALE = 0.2
+MARGIN = 0.02
+
+# scaled watermarks kept per process
+CACHE_SIZE = 32
+
+# (path, opacity) -> premultiplied watermark
+_sources = LRUCache(4)
+# (path, opacity, size) -> RGBA watermark of size
+_scaled = LRUCache(CACHE_SIZE)
+
+
+def load(path, opacity=DEFAULT_OPACITY):
+    '''
+    decodes watermark at path once, returns it premultiplied (RGBa)
+    with opacity applied to its alpha
+    '''
+    def create():
+        from PIL import Image
+
+        with Image.open(path) as im:
+            wm = im.convert('RGBA')
+        if opacity < 1:
+            alpha = wm.getchannel('A').point(lambda a: int(a * opacity + 0.5))
+            wm.putalpha(alpha)
+        return wm.convert('RGBa')
+    return _sources.get((path, opacity), create)
+
+
+def preload(options):
+    '''
+    loads the watermark of options in the current process, if any
+    '''
+    if options.wmfile:
+        load(options.wmfile, options.wm_opacity)
+
+
+def scaled_size(size, wm_size, scale):
+    '''
+    size of a watermark of wm_size fitting into scale times size
+    '''
+    ratio = min(size[0] * scale / wm_size[0], size[1] * scale / wm_size[1])
+    return (max(1, int(wm_size[0] * ratio + 0.5)),
+            max(1, int(wm_size[1] * ratio + 0.5)))
+
+
+def scaled(path, opacity, size):
+    '''
+    RGBA watermark scaled to size, from the cache
+    '''
+    def create():
+        from PIL import Image
+
+        return load(path, opacity).resize(
+            size, Image.Resampling.LANCZOS).convert('RGBA')
+    return _scaled.get((path, opacity, size), create)
+
+
+def position(size, wm_size, where=DEFAULT_POSITION):
+    '''
+    (left, top) of a watermark of wm_size placed at where on size
+    '''
+    margin = int(min(size) * MARGIN)
+    vertical, _, horizontal = where.rpartition('-')
+    if where in ('left', 'right'):
+        vertical, horizontal = 'center', where
+    elif where in ('top', 'bottom', 'center'):
+        vertical, horizontal = where, 'center'
+    left = {'left': margin, 'right': size[0] - wm_size[0] - margin}.get(
+        horizontal, (size[0] - wm_size[0]) // 2)
+    top = {'top': margin, 'bottom': size[1] - wm_size[1] - margin}.get(
+        vertical, (size[1] - wm_size[1]) // 2)
+    return max(0, left), max(0, top)
+
+
+def apply(im, options):
+    '''
+    watermarks resized im in place, if options have a watermark,
+    returns im, converted first if pasting onto its mode is not supported
+    '''
+    if not options.wmfile:
+        return im
+    source = load(options.wmfile, options.wm_opacity)
+    size = scaled_size(im.size, source.size, options.wm_scale)
+    wm = scaled(options.wmfile, options.wm_opacity, size)
+    where = position(im.size, size, options.wm_position)
+    if im.mode == 'RGBA':
+        im.alpha_composite(wm, where)
+        return im
+    if im.mode not in ('RGB', 'L', 'CMYK'):
+        im = im.convert('RGBA' if 'transparency' in im.info else 'RGB')
+        return apply(im, options)
+    im.paste(wm, where, wm)
+    return im
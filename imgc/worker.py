@@ -0,0 +1,421 @@
+'''
+code executed inside pool workers, see imgc.job for what is sent
+to workers and returned from them
+'''
+
+import io
+import os
+import threading
+import time
+
+from PIL import Image, UnidentifiedImageError
+
+from imgc import cancel, color, metadata, watermark
+from imgc.animation import is_animated, resize_animation
+from imgc.crop import focal_point
+from imgc.encoder import (
+    DEFAULT_PRESET, QUALITY_FORMATS, convert_for, save_params)
+from imgc.job import Job, Options, Result
+from imgc.metrics import timed
+from imgc.rendition import parse_renditions
+from imgc.resize import draft, fast_resize
+from imgc.search import QualitySearch
+from imgc.utils import IMAGE_FORMATS, copy_file, extension, write_atomic
+
+
+def output_format(path):
+    '''
+    Pillow format name matching path extension
+    '''
+    ext = extension(path)
+    return IMAGE_FORMATS.get(ext) or Image.registered_extensions()['.' + ext]
+
+
+def encode(im, fmt, quality, fp=None, options=None, preset=None):
+    '''
+    encodes image into fp, a new BytesIO by default, and returns fp
+    encoder preset and options are taken from options if given,
+    preset overrides the one of options
+    '''
+    if fp is None:
+        fp = io.BytesIO()
+    if options is None:
+        params = save_params(fmt, quality, preset or DEFAULT_PRESET)
+    else:
+        params = save_params(fmt, quality, preset or options.preset,
+                             options.encoder_options)
+    im = convert_for(im, fmt)
+    im.save(fp, fmt, **dict(metadata.save_params(im), **params))
+    return fp
+
+
+def encode_rendition(im, path, quality, options):
+    '''
+    encodes resized image for path, searching for the quality
+    if a target is set, returns (searched quality or None, encoded bytes)
+    '''
+    fmt = output_format(path)
+    if fmt in QUALITY_FORMATS and (options.target_bytes or
+                                   options.target_ssim is not None):
+        search = QualitySearch(
+            im, fmt, options.min_quality, quality, options.target_bytes,
+            options.target_ssim, options.max_trials, options)
+        return search.run()
+    return None, encode(im, fmt, quality, options=options).getbuffer()
+
+
+def closest_source(original, resized, size):
+    '''
+    smallest of already resized images which is at least as large as size
+    in both dimensions, or original image if there is none
+    '''
+    candidates = [im for im in resized
+                  if im.size[0] >= size[0] and im.size[1] >= size[1]]
+    if not candidates:
+        return original
+    return min(candidates, key=lambda im: im.size[0] * im.size[1])
+
+
+def decode_size(im, targets):
+    '''
+    size not yet loaded im has to be decoded at for all (rendition, size)
+    targets, cropped renditions need more than their size
+    '''
+    sizes = [rendition.full_size(im, size) for rendition, size in targets]
+    return (max(width for width, height in sizes),
+            max(height for width, height in sizes))
+
+
+def resize_renditions(im, renditions, options, timings):
+    '''
+    decodes not yet loaded image once and resizes it to all renditions,
+    each rendition is resized from the smallest larger one, cropped
+    renditions from their region of the decoded image
+    returns list of (rendition, resized image) tuples, largest first
+    '''
+    with timed(timings, 'parse'):
+        # targets of the oriented image, see imgc.metadata
+        view = metadata.oriented(im)
+        targets = [(rendition, rendition.target_size(view))
+                   for rendition in renditions]
+        targets.sort(key=lambda t: t[1][0] * t[1][1], reverse=True)
+    with timed(timings, 'decode'):
+        # draft for the largest rendition, smaller ones will follow
+        draft(im, metadata.stored_size(im, decode_size(view, targets)),
+              options.reducing_gap)
+        im.load()
+        # rotated once reduced, before it is resized
+        metadata.orient(im)
+    resized = []
+    sources = []  # uncropped outputs, smaller renditions are resized from
+    focus = None
+    for rendition, size in targets:
+        cancel.check()
+        with timed(timings, 'resize'):
+            if rendition.crop:
+                if rendition.crop == 'smart' and focus is None:
+                    focus = focal_point(im)
+                out = fast_resize(
+                    im, size, options.resample, options.reducing_gap,
+                    rendition.crop_box(im, size, focus))
+            else:
+                out = fast_resize(
+                    closest_source(im, sources, size), size,
+                    options.resample, options.reducing_gap)
+                sources.append(out)
+        resized.append((rendition, out))
+    return resized
+
+
+def finish_rendition(im, options):
+    '''
+    resized im converted to sRGB, stripped of metadata and watermarked,
+    as options ask
+    '''
+    if options.srgb or options.strip_metadata:
+        im = color.to_srgb(im)
+    if options.strip_metadata:
+        metadata.strip(im)
+    elif not options.keep_exif:
+        im.info.pop('exif', None)
+    return watermark.apply(im, options)
+
+
+def save_output(path, rendition, data, result):
+    '''
+    writes encoded rendition to path, or keeps it in result.buffers
+    for the writer stage of the pipeline
+    '''
+    if result.buffers is not None:
+        result.buffers.append((path, bytes(data)))
+    else:
+        with timed(result.timings, 'save'):
+            if rendition.dir:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, data)
+    result.bytes_out += len(data)
+    result.outputs.append(path)
+    result.output_bytes[path] = len(data)
+
+
+def save_animation(im, renditions, dst, options, result):
+    '''
+    resizes all frames of animated im, saving every rendition
+    as an animated GIF
+    '''
+    with timed(result.timings, 'parse'):
+        targets = [(rendition, rendition.target_size(im))
+                   for rendition in renditions]
+        targets.sort(key=lambda t: t[1][0] * t[1][1], reverse=True)
+    focus = None
+    if any(rendition.crop == 'smart' for rendition in renditions):
+        with timed(result.timings, 'decode'):
+            focus = focal_point(im)  # of the first frame
+    encoded = resize_animation(
+        im, [size for rendition, size in targets], options, result.timings,
+        [rendition.crop_box(im, size, focus) for rendition, size in targets])
+    result.pixels_in *= im.n_frames
+    for (rendition, size), fp in zip(targets, encoded):
+        result.pixels_out += size[0] * size[1] * im.n_frames
+        save_output(rendition.path(dst), rendition, fp.getbuffer(), result)
+
+
+def is_copyable(im, dst, options):
+    '''
+    True if the source of not yet loaded im is a valid output for dst
+    as it is, but for its size: same format and nothing to be changed
+    in its pixels or metadata
+    '''
+    if options.wmfile or metadata.orientation(im) != 1:
+        return False
+    if options.strip_metadata and metadata.has_metadata(im):
+        return False
+    if not options.keep_exif and im.info.get('exif'):
+        return False  # outputs have no EXIF by default
+    if (options.srgb or options.strip_metadata) and \
+            color.needs_conversion(im):
+        return False
+    return im.format == output_format(dst)
+
+
+def is_unchanged(im, renditions, dst, options):
+    '''
+    True if the < or > flags of all renditions leave not yet loaded im
+    at its size, its format is kept and no encoding is asked for, so that
+    the source can be copied instead
+    '''
+    if options.target_bytes or options.target_ssim is not None:
+        return False  # re-encoding is asked for
+    if options.quality != Options.quality or \
+            options.preset != DEFAULT_PRESET or \
+            options.encoder_options or options.try_presets:
+        return False
+    return is_copyable(im, dst, options) and all(
+        rendition.quality is None and not rendition.crop and
+        any(flag in rendition.size_spec for flag in '<>') and
+        tuple(rendition.target_size(im)) == im.size
+        for rendition in renditions)
+
+
+def copy_source(src, path, rendition, result, data=None):
+    '''
+    saves the source as rendition at path, copied in the kernel
+    unless its contents were read ahead into data
+    '''
+    if data is not None:
+        return save_output(path, rendition, data, result)
+    with timed(result.timings, 'save'):
+        if rendition.dir:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        copy_file(src, path)
+    result.bytes_out += result.bytes_in
+    result.outputs.append(path)
+    result.output_bytes[path] = result.bytes_in
+
+
+def pass_through(src, dst, renditions, result, data=None):
+    '''
+    copies the source to all renditions without decoding it
+    '''
+    for rendition in renditions:
+        copy_source(src, rendition.path(dst), rendition, result, data)
+    result.passed_through = True
+
+
+def smallest_encoding(im, path, quality, data, options):
+    '''
+    data, the encoding of im for path, or a smaller one
+    with one of options.try_presets
+    '''
+    fmt = output_format(path)
+    for preset in options.try_presets or ():
+        if preset != options.preset:
+            encoded = encode(im, fmt, quality, options=options, preset=preset)
+            if encoded.tell() < len(data):
+                data = encoded.getbuffer()
+    return data
+
+
+def open_image(src, data=None):
+    '''
+    opens src, or its contents read ahead into data,
+    errors name src rather than the buffer
+    '''
+    if data is None:
+        return Image.open(src)
+    try:
+        return Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise UnidentifiedImageError(
+            'cannot identify image file %r' % src) from None
+
+
+def resize_image(src, dst, options, result, data=None):
+    '''
+    decodes src, or its contents in data, once and saves all renditions of it
+    with keep_smaller, renditions of the source size which are not smaller
+    than it are replaced by a copy of it, if it can stand for them,
+    see is_copyable
+    '''
+    renditions = parse_renditions(options.size)
+    timings = result.timings
+    cancel.check()
+    with timed(timings, 'open'):
+        im = open_image(src, data)
+    with im:
+        result.pixels_in = im.size[0] * im.size[1]
+        with timed(timings, 'parse'):
+            unchanged = is_unchanged(im, renditions, dst, options)
+            keep_source = options.keep_smaller and not unchanged and \
+                is_copyable(im, dst, options)
+            source_size = im.size
+        if unchanged:
+            return pass_through(src, dst, renditions, result, data)
+        if is_animated(im) and output_format(dst) == 'GIF':
+            return save_animation(im, renditions, dst, options, result)
+        resized = resize_renditions(im, renditions, options, timings)
+    # only resized images are kept from this point
+    with timed(timings, 'resize'):
+        resized = [(rendition, finish_rendition(im, options))
+                   for rendition, im in resized]
+
+    for rendition, im in resized:
+        path = rendition.path(dst)
+        quality = rendition.quality or options.quality
+        cancel.check()
+        with timed(timings, 'encode'):
+            searched, encoded = encode_rendition(im, path, quality, options)
+            encoded = smallest_encoding(
+                im, path, searched or quality, encoded, options)
+        result.pixels_out += im.size[0] * im.size[1]
+        # only the source size can be kept, cropped renditions differ
+        # from the source in more than size
+        replaceable = keep_source and not rendition.crop and \
+            im.size == source_size
+        # release pixel data before writing, only encoded bytes are needed
+        im.close()
+        if replaceable and len(encoded) >= result.bytes_in:
+            copy_source(src, path, rendition, result, data)
+            result.sources_kept += 1
+            continue
+        if searched is not None:
+            result.qualities[path] = searched
+        save_output(path, rendition, encoded, result)
+
+
+_local = threading.local()
+
+
+def profiled(func, job):
+    '''
+    runs func(job) under a cProfile.Profile owned by the current worker,
+    stats are dumped after every job, so that they survive termination
+    '''
+    import cProfile
+
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        profile = _local.profile = cProfile.Profile()
+        os.makedirs(job.options.profile, exist_ok=True)
+        _local.profile_path = os.path.join(
+            job.options.profile, 'imgc-{}-{}.prof'.format(
+                os.getpid(), threading.get_ident()))
+    try:
+        profile.enable()
+    except ValueError:  # another thread of this process is being profiled
+        return func(job)
+    try:
+        return func(job)
+    finally:
+        profile.disable()
+        profile.dump_stats(_local.profile_path)
+
+
+def set_max_image_pixels(limit):
+    '''
+    configures Pillow decompression bomb check of the current process
+    '''
+    if limit is not None:
+        Image.MAX_IMAGE_PIXELS = limit or None
+
+
+def init_worker(event, max_image_pixels=None):
+    '''
+    pool initializer, see imgc.cancel.init_worker, the limit is set once
+    per pool rather than by every job, as it is shared by the process
+    '''
+    cancel.init_worker(event)
+    set_max_image_pixels(max_image_pixels)
+
+
+def process(job):
+    '''
+    pool entry point: processes a single Job and returns its Result
+    '''
+    if job.options.profile:
+        return profiled(_process, job)
+    return _process(job)
+
+
+def _process(job):
+    result = Result.for_job(job)
+    start = time.perf_counter()
+    try:
+        if job.data is None:
+            result.bytes_in = os.path.getsize(job.src)
+        else:
+            result.bytes_in = len(job.data)
+            result.buffers = []
+        resize_image(job.src, job.dst, job.options, result, job.data)
+    except OSError as err:  # e.g. file is corrupt and cannot be open
+        result.error = str(err)
+    except Image.DecompressionBombError as err:
+        result.error = str(err)
+    except cancel.Cancelled:
+        result.error = 'cancelled'
+        result.cancelled = True
+        discard_outputs(result)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def discard_outputs(result):
+    '''
+    removes outputs saved for an image which was not finished
+    '''
+    for path in result.outputs:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    result.outputs = []
+    result.output_bytes = {}
+    if result.buffers:
+        result.buffers = []
+
+
+def process_batch(jobs):
+    '''
+    pool entry point for batches of cheap jobs
+    '''
+    return [process(job) for job in jobs]
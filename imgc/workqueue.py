@@ -0,0 +1,226 @@
+'''
+splitting a batch between several imgc processes or hosts
+
+--shard i/N keeps only images whose path, relative to the directory given
+on the command line, hashes to i modulo N, so N runs with the same
+arguments process disjoint parts of a tree without talking to each other.
+
+--work-queue DB makes runs cooperate through a SQLite database on a shared
+filesystem: every run adds the images it discovers (already known ones are
+kept as they are), then claims jobs one at a time until none is left. A
+claim is a lease, renewed by a heartbeat while the job is processed, a
+job whose lease expired, e.g. because its host crashed, is claimed again.
+Failed jobs are retried up to max_attempts times. Finished jobs are never
+redone, so restarting a crashed run only processes what is left. The
+database must be on a filesystem with working POSIX locks, paths must be
+the same on all hosts.
+'''
+
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from itertools import islice
+
+
+DEFAULT_LEASE = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+# seconds to wait for a lock held by another process
+BUSY_TIMEOUT = 60.0
+ADD_CHUNK = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    src TEXT NOT NULL,
+    dst TEXT NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_until REAL,
+    error TEXT,
+    UNIQUE (src, dst)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until);
+'''
+
+
+def parse_shard(x):
+    '''
+    parses 'i/N' into (i, N), 0 <= i < N
+    '''
+    index, sep, count = x.partition('/')
+    index, count = int(index), int(count)
+    if not sep or not 0 <= index < count:
+        raise ValueError('Shard must be i/N with 0 <= i < N')
+    return index, count
+
+
+def in_shard(relpath, shard):
+    '''
+    whether relpath belongs to shard (i, N), stable across hosts and runs
+    '''
+    index, count = shard
+    key = relpath.replace(os.sep, '/').encode('utf-8', 'surrogateescape')
+    return zlib.crc32(key) % count == index
+
+
+def default_owner():
+    return '{}:{}:{}'.format(
+        socket.gethostname(), os.getpid(), os.urandom(4).hex())
+
+
+class WorkQueue:
+    '''
+    jobs table shared by cooperating runs, safe to use from several threads
+    '''
+
+    def __init__(self, path, owner=None, lease=DEFAULT_LEASE,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        import sqlite3
+
+        self.path = path
+        self.owner = owner or default_owner()
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # transactions are managed explicitly, see transaction()
+        self.conn = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, isolation_level=None,
+            check_same_thread=False)
+        with self.transaction() as cur:
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    cur.execute(statement)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                yield cur
+            except BaseException:
+                cur.execute('ROLLBACK')
+                raise
+            cur.execute('COMMIT')
+
+    def add(self, path_tuples, params):
+        '''
+        adds (src, dst) jobs processed with params, failed jobs are
+        reset to be tried again, returns number of jobs added or reset
+        '''
+        params = json.dumps(params, sort_keys=True)
+        path_tuples = iter(path_tuples)
+        added = 0
+        while True:
+            chunk = list(islice(path_tuples, ADD_CHUNK))
+            if not chunk:
+                return added
+            with self.transaction() as cur:
+                before = self.conn.total_changes
+                cur.executemany(
+                    "INSERT INTO jobs (src, dst, params) VALUES (?, ?, ?) "
+                    "ON CONFLICT (src, dst) DO UPDATE SET state = 'pending', "
+                    "attempts = 0, error = NULL, params = excluded.params "
+                    "WHERE state = 'failed'",
+                    [(src, dst, params) for src, dst in chunk])
+                added += self.conn.total_changes - before
+
+    def claim(self):
+        '''
+        leases the next pending job, or one whose lease expired,
+        returns (id, src, dst, params) or None if there is none
+        '''
+        now = time.time()
+        with self.transaction() as cur:
+            # jobs which keep losing their workers are given up
+            cur.execute(
+                "UPDATE jobs SET state = 'failed', owner = NULL, "
+                "error = 'lease expired' WHERE state = 'running' "
+                "AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts))
+            row = cur.execute(
+                "SELECT id, src, dst, params FROM jobs "
+                "WHERE state = 'pending' "
+                "OR (state = 'running' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            cur.execute(
+                "UPDATE jobs SET state = 'running', owner = ?, "
+                "lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (self.owner, now + self.lease, row[0]))
+        job_id, src, dst, params = row
+        return job_id, src, dst, json.loads(params)
+
+    def complete(self, job_id, error=None):
+        '''
+        marks job done, or failed, in which case it is retried
+        until it reaches max_attempts
+        '''
+        with self.transaction() as cur:
+            if error is None:
+                cur.execute(
+                    "UPDATE jobs SET state = 'done', owner = NULL, "
+                    "lease_until = NULL, error = NULL WHERE id = ?",
+                    (job_id,))
+            else:
+                cur.execute(
+                    "UPDATE jobs SET state = CASE WHEN attempts >= ? "
+                    "THEN 'failed' ELSE 'pending' END, owner = NULL, "
+                    "lease_until = NULL, error = ? WHERE id = ?",
+                    (self.max_attempts, error, job_id))
+
+    def release(self, job_id):
+        '''
+        gives up a claimed job without counting the attempt,
+        e.g. when the run was cancelled
+        '''
+        with self.transaction() as cur:
+            cur.execute(
+                "UPDATE jobs SET state = 'pending', owner = NULL, "
+                "lease_until = NULL, attempts = attempts - 1 WHERE id = ?",
+                (job_id,))
+
+    def heartbeat(self):
+        '''
+        renews leases of all jobs claimed by this owner
+        '''
+        with self.transaction() as cur:
+            cur.execute(
+                "UPDATE jobs SET lease_until = ? "
+                "WHERE owner = ? AND state = 'running'",
+                (time.time() + self.lease, self.owner))
+
+    def keep_alive(self, stop):
+        '''
+        heartbeat loop, runs until stop (threading.Event) is set
+        '''
+        while not stop.wait(self.lease / 3):
+            self.heartbeat()
+
+    def unfinished(self):
+        '''
+        number of jobs still pending or being processed
+        '''
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs "
+                "WHERE state IN ('pending', 'running')").fetchone()[0]
+
+    def counts(self):
+        '''
+        number of jobs in every state
+        '''
+        with self.lock:
+            return dict(self.conn.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"))
@@ -71,12 +71,14 @@ class SetupTab(BaseFrame):
         args = ["size", "quality", "workers"]
         kwargs = {arg:getattr(self, arg).get() for arg in args}
         kwargs.update({"src_images": self.src_images})
+        # progress events are queued and drained on the Tk main loop,
+        # widgets must not be touched from pool threads
+        kwargs.update({"progress": "queue"})
 
         self.parent.imgh = imgc.ImageHandler(**kwargs)
         self.parent.notebook.select(1)
-        self.parent.step = 100.0/self.parent.imgh.imgs_total
-        self.parent.imgh.on_image_processed = self.parent.tab1.on_image_processed
         self.parent.imgh.run()
+        self.parent.tab1.poll()
 
 
 class ProgressTab(BaseFrame):
@@ -92,16 +94,31 @@ class ProgressTab(BaseFrame):
         self.stop_btn["command"] = self.stop
         self.stop_btn.pack(side="top")
 
-    def on_image_processed(self, done, total):
-        percentage = done/total*100
+    poll_interval = 100  # ms
+
+    def poll(self):
+        events = self.parent.imgh.reporter.queue
+        finished = False
+        while not events.empty():
+            event = events.get_nowait()
+            if event['event'] in ('error', 'image'):
+                continue
+            self.on_progress(event)
+            finished = event['event'] == 'done'
+        if finished:
+            self.parent.notebook.select(0)
+        else:
+            self.after(self.poll_interval, self.poll)
+
+    def on_progress(self, event):
+        done, total = event['processed'], event['found']
+        percentage = done/total*100 if total else 0.0
         self.status_lbl['text'] = "{}/{} | {:4.1f}%".format(done, total, percentage)
         self.pb['value'] = percentage
 
     def stop(self):
-        self.parent.imgh.terminate_pool()
-        self.parent.notebook.select(0)
-
-        # self.imgh
+        # returns to the options tab once the 'done' event is polled
+        self.parent.imgh.cancel()
 
 
 class ImgcWrap(BaseFrame):
@@ -135,7 +152,7 @@ class ImgcWrap(BaseFrame):
         self.master.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def on_close(self):
-        try: self.imgh.terminate_pool()
+        try: self.imgh.cancel()
         except AttributeError: pass
         self.master.destroy()
 
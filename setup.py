@@ -40,6 +40,7 @@ setup(
     entry_points={
         'console_scripts': [
             'imgc = imgc:main',
+            'imgc-bench = imgc.bench:main',
         ]
     }
 )
@@ -1,7 +1,29 @@
 import unittest
 
 from .test_types import *
+from .test_api import *
+from .test_animation import *
+from .test_bench import *
+from .test_crop import *
+from .test_dedup import *
+from .test_encoder import *
+from .test_handler import *
 from .test_image_size import *
+from .test_manifest import *
+from .test_metadata import *
+from .test_metrics import *
+from .test_pipeline import *
+from .test_plan import *
+from .test_progress import *
+from .test_rendition import *
+from .test_resize import *
+from .test_scheduler import *
+from .test_search import *
+from .test_server import *
+from .test_startup import *
+from .test_watermark import *
+from .test_worker import *
+from .test_workqueue import *
 
 
 if __name__ == '__main__':
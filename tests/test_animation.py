@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, ImageDraw, ImageSequence
+
+from imgc.animation import is_animated, shared_palette, TRANSPARENT_INDEX
+from imgc.worker import Job, Options, process
+
+
+def make_animation(path, count=6, size=(200, 100), transparent=False):
+    frames = []
+    for i in range(count):
+        im = Image.new('P', size, 0)
+        im.putpalette([255, 255, 255, 255, 0, 0, 0, 0, 255])
+        draw = ImageDraw.Draw(im)
+        draw.rectangle((i * 20, 20, i * 20 + 40, 80), fill=1 + i % 2)
+        frames.append(im)
+    extra = {'transparency': 0, 'disposal': 2} if transparent else {}
+    frames[0].save(path, save_all=True, append_images=frames[1:],
+                   duration=[50 + 10 * i for i in range(count)], loop=2,
+                   optimize=False, **extra)
+    return path
+
+
+class AnimationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = make_animation(os.path.join(self.tmpdir, 'src.gif'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def dst(self, name='dst.gif'):
+        return os.path.join(self.tmpdir, name)
+
+    def test_frames_are_cropped(self):
+        result = process(Job(self.src, self.dst(), Options(
+            size='50x50:crop=center')))
+        self.assertTrue(result.ok, result.error)
+        with Image.open(self.dst()) as im:
+            self.assertEqual((im.size, im.n_frames), ((50, 50), 6))
+
+    def test_shared_palette_leaves_transparent_index(self):
+        with Image.open(self.src) as im:
+            self.assertTrue(is_animated(im))
+            palette = shared_palette(im)
+        self.assertLess(len(palette.getpalette()) // 3, TRANSPARENT_INDEX + 1)
+
+    def test_frames_are_kept(self):
+        result = process(Job(self.src, self.dst(), Options(size='100x')))
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(result.pixels_out, 100 * 50 * 6)
+        with Image.open(self.dst()) as im:
+            self.assertEqual((im.size, im.n_frames), ((100, 50), 6))
+            self.assertEqual(im.info['loop'], 2)
+            durations = [frame.info['duration']
+                         for frame in ImageSequence.Iterator(im)]
+            # the rectangle moves along with the source
+            im.seek(0)
+            self.assertEqual(im.convert('RGB').getpixel((10, 25)),
+                             (255, 0, 0))
+            im.seek(3)
+            self.assertEqual(im.convert('RGB').getpixel((40, 25)),
+                             (0, 0, 255))
+        self.assertEqual(durations, [50, 60, 70, 80, 90, 100])
+
+    def test_transparency_and_disposal(self):
+        src = make_animation(self.dst('transparent.gif'), transparent=True)
+        process(Job(src, self.dst(), Options(size='100x')))
+        with Image.open(self.dst()) as im:
+            im.seek(1)
+            self.assertEqual(im.disposal_method, 2)
+            frame = im.convert('RGBA')
+        self.assertEqual(frame.getpixel((2, 2))[3], 0)
+        self.assertEqual(frame.getpixel((20, 25)), (0, 0, 255, 255))
+
+    def test_renditions_and_frame_workers(self):
+        options = Options(size='100x,50x')
+        process(Job(self.src, self.dst('a.gif'), options))
+        options = Options(size='100x,50x', frame_workers=3)
+        process(Job(self.src, self.dst('b.gif'), options))
+        for suffix in ('-100x.gif', '-50x.gif'):
+            with open(self.dst('a' + suffix), 'rb') as a, \
+                    open(self.dst('b' + suffix), 'rb') as b:
+                self.assertEqual(a.read(), b.read())
+        with Image.open(self.dst('a-50x.gif')) as im:
+            self.assertEqual((im.size, im.n_frames), ((50, 25), 6))
+
+    def test_frames_are_watermarked(self):
+        wmfile = self.dst('wm.png')
+        Image.new('RGB', (10, 10), (0, 0, 255)).save(wmfile)
+        result = process(Job(self.src, self.dst(), Options(
+            size='100x,50x', wmfile=wmfile, wm_opacity=1.0, wm_scale=0.5)))
+        self.assertTrue(result.ok, result.error)
+        for name, corner in (('dst-100x.gif', (86, 36)),
+                             ('dst-50x.gif', (43, 18))):
+            with Image.open(self.dst(name)) as im:
+                for frame in ImageSequence.Iterator(im):
+                    self.assertEqual(frame.convert('RGB').getpixel(corner),
+                                     (0, 0, 255))
+                    self.assertNotEqual(
+                        frame.convert('RGB').getpixel((0, 0)), (0, 0, 255))
+
+    def test_other_formats_get_the_first_frame(self):
+        process(Job(self.src, self.dst('dst.png'), Options(size='100x')))
+        with Image.open(self.dst('dst.png')) as im:
+            self.assertEqual(im.size, (100, 50))
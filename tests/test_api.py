@@ -0,0 +1,66 @@
+import io
+import unittest
+
+from PIL import Image
+
+from imgc import compress, compress_many
+
+
+def image_bytes(size=(400, 200), fmt='JPEG', color=(200, 40, 40)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, color).save(buf, fmt)
+    return buf.getvalue()
+
+
+def decode(data):
+    return Image.open(io.BytesIO(data))
+
+
+class CompressTest(unittest.TestCase):
+
+    def test_compress_bytes(self):
+        result = compress(image_bytes(), size='100x')
+        self.assertIsInstance(result, bytes)
+        im = decode(result)
+        self.assertEqual((im.format, im.size), ('JPEG', (100, 50)))
+
+    def test_compress_buffers(self):
+        data = image_bytes()
+        for source in (bytearray(data), memoryview(data), io.BytesIO(data)):
+            self.assertEqual(decode(compress(source, size='50%')).size,
+                             (200, 100))
+
+    def test_format_conversion(self):
+        result = compress(image_bytes(), size='100x', format='png')
+        self.assertEqual(decode(result).format, 'PNG')
+
+    def test_quality(self):
+        data = image_bytes((800, 600))
+        self.assertLess(len(compress(data, size='800x', quality=10)),
+                        len(compress(data, size='800x', quality=95)))
+
+    def test_output_buffer(self):
+        out = io.BytesIO()
+        self.assertIs(compress(image_bytes(), size='100x', out=out), out)
+        self.assertEqual(decode(out.getvalue()).size, (100, 50))
+
+    def test_several_sizes(self):
+        with self.assertRaises(ValueError):
+            compress(image_bytes(), size='100x,50x')
+
+    def test_broken_image(self):
+        with self.assertRaises(OSError):
+            compress(b'not an image')
+
+
+class CompressManyTest(unittest.TestCase):
+
+    def test_compress_many(self):
+        items = [image_bytes((400, 200)), image_bytes((200, 400), 'PNG')]
+        results = compress_many(items, size='100x')
+        self.assertEqual([decode(r).size for r in results],
+                         [(100, 50), (100, 200)])
+        self.assertEqual([decode(r).format for r in results],
+                         ['JPEG', 'PNG'])
+        # results don't share the reused buffer
+        self.assertEqual(results[0], compress(items[0], size='100x'))
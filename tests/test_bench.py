@@ -0,0 +1,125 @@
+import filecmp
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from imgc import ImageHandler
+from imgc.bench import compare
+from imgc.bench.corpus import CORPORA, SPEC_FILE, generate_corpus
+from imgc.bench.runner import percentile, run_matrix
+
+
+TINY_CORPUS = {'tiny': (('jpg', 'png', 'gif'), ('small',), 2, 3)}
+
+
+def image_files(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            if name != SPEC_FILE:
+                yield os.path.relpath(os.path.join(dirpath, name), root)
+
+
+@patch.dict(CORPORA, TINY_CORPUS)
+class CorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def test_corpus_layout(self):
+        generate_corpus(self.path('a'), 'tiny')
+        files = sorted(image_files(self.path('a')))
+        self.assertEqual(len(files), 6)
+        self.assertEqual({os.path.splitext(f)[1] for f in files},
+                         {'.jpg', '.png', '.gif'})
+        self.assertTrue(any(f.count(os.sep) >= 2 for f in files))
+
+    def test_corpus_is_reproducible(self):
+        generate_corpus(self.path('a'), 'tiny', seed=1)
+        generate_corpus(self.path('b'), 'tiny', seed=1)
+        files = sorted(image_files(self.path('a')))
+        self.assertEqual(files, sorted(image_files(self.path('b'))))
+        match, mismatch, errors = filecmp.cmpfiles(
+            self.path('a'), self.path('b'), files, shallow=False)
+        self.assertEqual(mismatch + errors, [])
+
+    def test_corpus_is_reused(self):
+        generate_corpus(self.path('a'), 'tiny')
+        marker = self.path('a/marker')
+        open(marker, 'w').close()
+        generate_corpus(self.path('a'), 'tiny')
+        self.assertTrue(os.path.exists(marker))
+        generate_corpus(self.path('a'), 'tiny', seed=2)
+        self.assertFalse(os.path.exists(marker))
+
+    def test_other_directories_are_refused(self):
+        photo = self.path('photos/photo.jpg')
+        os.makedirs(os.path.dirname(photo))
+        open(photo, 'w').close()
+        with self.assertRaises(ValueError):
+            generate_corpus(self.path('photos'), 'tiny')
+        self.assertTrue(os.path.exists(photo))
+
+
+class PercentileTest(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+class RunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.tmpdir, 'corpus')
+        with patch.dict(CORPORA, TINY_CORPUS):
+            generate_corpus(self.corpus, 'tiny')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_run_matrix(self):
+        runs = run_matrix(self.corpus, ['thread'], [1, 2], ['100x'])
+        self.assertEqual(len(runs), 2)
+        for run in runs:
+            self.assertEqual(run['images'], 6)
+            self.assertEqual(run['errors'], 0)
+            self.assertGreater(run['images_per_sec'], 0)
+            self.assertGreater(run['mb_in_per_sec'], run['mb_out_per_sec'])
+            self.assertLessEqual(run['latency_p50'], run['latency_p95'])
+        # outputs are removed after every run
+        self.assertEqual(os.listdir(self.tmpdir), ['corpus'])
+
+    def test_existing_output_is_refused(self):
+        output = self.corpus + '-' + ImageHandler.dir_postfix
+        os.makedirs(output)
+        open(os.path.join(output, 'photo.jpg'), 'w').close()
+        with self.assertRaises(ValueError):
+            run_matrix(self.corpus, ['thread'], [1], ['100x'])
+        self.assertTrue(os.path.exists(os.path.join(output, 'photo.jpg')))
+
+    def test_run_matrix_presets(self):
+        fast, small = run_matrix(self.corpus, ['thread'], [1], ['100x'],
+                                 presets=['fast', 'small'])
+        self.assertEqual((fast['options']['preset'],
+                          small['options']['preset']), ('fast', 'small'))
+        self.assertLessEqual(small['bytes_out'], fast['bytes_out'])
+
+    def test_compare(self):
+        runs = run_matrix(self.corpus, ['thread'], [1], ['100x'])
+        baseline = {'runs': [dict(runs[0], images_per_sec=
+                                  runs[0]['images_per_sec'] * 2)]}
+        (run, old, change), = compare(runs, baseline)
+        self.assertAlmostEqual(change, -0.5)
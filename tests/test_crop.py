@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, ImageDraw
+
+from imgc.crop import crop_box, crop_size, focal_point, full_size
+from imgc.worker import Job, Options, process
+
+
+class CropBoxTest(unittest.TestCase):
+
+    def test_crop_size(self):
+        self.assertEqual(crop_size((400, 200), (100, 100)), (200.0, 200.0))
+        self.assertEqual(crop_size((200, 400), (100, 50)), (200.0, 100.0))
+
+    def test_gravity(self):
+        self.assertEqual(crop_box((400, 200), (100, 100)), (100, 0, 300, 200))
+        self.assertEqual(crop_box((200, 400), (100, 100), 'top'),
+                         (0, 0, 200, 200))
+        self.assertEqual(crop_box((200, 400), (100, 100), 'center'),
+                         (0, 100, 200, 300))
+
+    def test_smart_focus_is_clamped(self):
+        self.assertEqual(
+            crop_box((400, 200), (100, 100), 'smart', (0.9, 0.5)),
+            (200, 0, 400, 200))
+        self.assertEqual(
+            crop_box((400, 200), (100, 100), 'smart', (0.4, 0.5)),
+            (60, 0, 260, 200))
+
+    def test_full_size(self):
+        # the 200x200 region of 400x200 is resized to 100x100
+        self.assertEqual(full_size((400, 200), (100, 100)), (200, 100))
+
+    def test_focal_point(self):
+        im = Image.new('RGB', (400, 200), (128, 128, 128))
+        self.assertEqual(focal_point(im), (0.5, 0.5))
+        draw = ImageDraw.Draw(im)
+        for x in range(300, 380, 8):
+            draw.line((x, 40, x, 160), fill=(0, 0, 0), width=3)
+        x, y = focal_point(im)
+        self.assertGreater(x, 0.7)
+        self.assertAlmostEqual(y, 0.5, delta=0.1)
+
+
+class CropProcessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'src.png')
+        # red | green | blue thirds
+        im = Image.new('RGB', (600, 200), (255, 0, 0))
+        draw = ImageDraw.Draw(im)
+        draw.rectangle((200, 0, 399, 199), fill=(0, 255, 0))
+        draw.rectangle((400, 0, 599, 199), fill=(0, 0, 255))
+        im.save(self.src)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def output(self, spec):
+        dst = os.path.join(self.tmpdir, 'dst.png')
+        result = process(Job(self.src, dst, Options(size=spec)))
+        self.assertTrue(result.ok, result.error)
+        return Image.open(dst)
+
+    def test_center_crop(self):
+        with self.output('50x50:crop=center') as im:
+            self.assertEqual(im.size, (50, 50))
+            self.assertEqual(im.convert('RGB').getpixel((25, 25)), (0, 255, 0))
+
+    def test_smart_crop(self):
+        # detail on the right of a plain background
+        im = Image.new('L', (600, 200), 128)
+        draw = ImageDraw.Draw(im)
+        for x in range(460, 580, 10):
+            draw.line((x, 20, x, 180), fill=255, width=2)
+        im.save(self.src)
+        with self.output('50x50:crop=center') as im:
+            self.assertEqual(im.getextrema(), (128, 128))
+        with self.output('50x50:crop=smart') as im:
+            self.assertEqual(im.size, (50, 50))
+            self.assertGreater(im.getextrema()[1], 128)
+
+    def test_crop_with_renditions(self):
+        dst = os.path.join(self.tmpdir, 'dst.png')
+        result = process(Job(self.src, dst, Options(
+            size='300x,100x100:crop=top:dir=thumbs,30x')))
+        self.assertTrue(result.ok, result.error)
+        sizes = {}
+        for path in result.outputs:
+            with Image.open(path) as im:
+                sizes[os.path.relpath(path, self.tmpdir)] = im.size
+        self.assertEqual(sizes, {
+            'dst-300x.png': (300, 100),
+            os.path.join('thumbs', 'dst.png'): (100, 100),
+            'dst-30x.png': (30, 10),
+        })
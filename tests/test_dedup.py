@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from imgc.dedup import DedupIndex, link_file
+
+
+class DedupTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def create(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as fp:
+            fp.write(data)
+        return path
+
+
+class DedupIndexTest(DedupTestCase):
+
+    def test_unique_sizes_are_not_hashed(self):
+        index = DedupIndex()
+        for i in range(3):
+            self.assertIsNone(index.original(self.create(str(i), b'x' * i)))
+        self.assertEqual(index.hashed, 0)
+
+    def test_equal_sizes_are_hashed(self):
+        index = DedupIndex()
+        a = self.create('a', b'abc')
+        b = self.create('b', b'abd')
+        c = self.create('c', b'abc')
+        d = self.create('d', b'abd')
+        self.assertIsNone(index.original(a))
+        self.assertIsNone(index.original(b))
+        self.assertEqual(index.hashed, 2)
+        self.assertEqual(index.original(c), a)
+        self.assertEqual(index.original(d), b)
+        self.assertEqual(index.hashed, 4)
+
+
+class LinkFileTest(DedupTestCase):
+
+    def test_hardlink(self):
+        src = self.create('src', b'data')
+        dst = os.path.join(self.tmpdir, 'sub', 'dst')
+        self.assertEqual(link_file(src, dst), 'hardlink')
+        self.assertTrue(os.path.samefile(src, dst))
+
+    def test_replaces_existing(self):
+        src = self.create('src', b'data')
+        dst = self.create('dst', b'old')
+        self.assertEqual(link_file(src, dst, 'copy'), 'copy')
+        self.assertFalse(os.path.samefile(src, dst))
+        with open(dst, 'rb') as fp:
+            self.assertEqual(fp.read(), b'data')
+
+    def test_reflink_falls_back_to_copy(self):
+        src = self.create('src', b'data')
+        dst = os.path.join(self.tmpdir, 'dst')
+        self.assertIn(link_file(src, dst, 'reflink'), ('reflink', 'copy'))
+        with open(dst, 'rb') as fp:
+            self.assertEqual(fp.read(), b'data')
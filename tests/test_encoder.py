@@ -0,0 +1,73 @@
+import io
+import unittest
+
+from PIL import Image
+
+from imgc.encoder import (
+    PRESETS, convert_for, output_name, parse_encoder_options, save_params)
+from imgc.job import Options
+from imgc.worker import encode
+
+
+class EncoderOptionsTest(unittest.TestCase):
+
+    def test_parse_encoder_options(self):
+        self.assertEqual(
+            parse_encoder_options('jpeg:progressive=true,subsampling=4:4:4'),
+            ('JPEG', {'progressive': True, 'subsampling': '4:4:4'}))
+        self.assertEqual(parse_encoder_options('png:compress_level=9'),
+                         ('PNG', {'compress_level': 9}))
+
+    def test_parse_encoder_options_invalid(self):
+        for spec in ('progressive=true', 'tiff:compression=lzw',
+                     'jpeg:progressive'):
+            with self.assertRaises(ValueError):
+                parse_encoder_options(spec)
+
+    def test_save_params(self):
+        self.assertEqual(save_params('JPEG', 80, 'fast'),
+                         {'quality': 80, 'optimize': False})
+        self.assertEqual(save_params('PNG', 80, 'small'), {'optimize': True})
+        self.assertEqual(
+            save_params('WEBP', 70, 'small', {'WEBP': {'method': 3}}),
+            {'quality': 70, 'method': 3})
+        with self.assertRaises(ValueError):
+            save_params('JPEG', 80, 'tiny')
+
+    def test_output_name(self):
+        self.assertEqual(output_name('/a/b.png', None), '/a/b.png')
+        self.assertEqual(output_name('/a/b.png', 'webp'), '/a/b.webp')
+        self.assertEqual(output_name('/a/b.PNG', 'jpeg'), '/a/b.jpg')
+        self.assertEqual(output_name('/a/b.png', 'webp', keep_extension=True),
+                         '/a/b.png.webp')
+        self.assertEqual(output_name('/a/b.webp', 'webp', keep_extension=True),
+                         '/a/b.webp')
+
+    def test_convert_for_jpeg_flattens_transparency(self):
+        im = Image.new('RGBA', (4, 4), (0, 0, 0, 0))
+        converted = convert_for(im, 'JPEG')
+        self.assertEqual(converted.mode, 'RGB')
+        self.assertEqual(converted.getpixel((0, 0)), (255, 255, 255))
+        self.assertIs(convert_for(im, 'PNG'), im)
+
+
+class PresetTest(unittest.TestCase):
+
+    def setUp(self):
+        gradient = Image.linear_gradient('L').resize((256, 256))
+        self.im = Image.merge('RGB', (gradient, gradient.rotate(90), gradient))
+
+    def encoded_size(self, fmt, preset):
+        options = Options(preset=preset)
+        return len(encode(self.im, fmt, 90, options=options).getvalue())
+
+    def test_presets_trade_size(self):
+        for fmt in ('JPEG', 'PNG', 'WEBP'):
+            self.assertLessEqual(self.encoded_size(fmt, 'small'),
+                                 self.encoded_size(fmt, 'fast'), fmt)
+
+    def test_all_presets_encode(self):
+        for preset in PRESETS:
+            for fmt in ('JPEG', 'PNG', 'WEBP', 'GIF'):
+                size = self.encoded_size(fmt, preset)
+                self.assertGreater(size, 0)
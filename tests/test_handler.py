@@ -0,0 +1,314 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from PIL import Image
+
+from imgc import ImageHandler
+
+
+class HandlerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'photos')
+        self.dst = self.src + '-imgc'
+        for path in ('a.jpg', 'sub/b.png', 'sub/deeper/c.gif', 'sub/notes.txt'):
+            self.create(path)
+        os.makedirs(os.path.join(self.src, 'empty'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def create(self, path, size=(300, 200)):
+        path = os.path.join(self.src, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if path.endswith('.txt'):
+            open(path, 'w').close()
+        else:
+            Image.new('RGB', size, (10, 120, 200)).save(path)
+        return path
+
+    def handler(self, **kwargs):
+        kwargs.setdefault('src_images', [self.src])
+        kwargs.setdefault('size', '100x')
+        kwargs.setdefault('quality', 90)
+        kwargs.setdefault('workers', 2)
+        return ImageHandler(**kwargs)
+
+    def run_handler(self, handler, timeout=10):
+        with redirect_stdout(StringIO()):
+            handler.run()
+            self.assertTrue(handler.wait(timeout))
+        return handler
+
+
+class DiscoveryTest(HandlerTestCase):
+
+    def test_generate_image_paths_is_lazy(self):
+        paths = self.handler().generate_image_paths()
+        self.assertFalse(os.path.exists(self.dst))
+        src, dst = next(paths)
+        self.assertEqual(src, os.path.join(self.src, 'a.jpg'))
+        self.assertEqual(dst, os.path.join(self.dst, 'a.jpg'))
+        self.assertTrue(os.path.isdir(self.dst))
+        self.assertFalse(os.path.exists(os.path.join(self.dst, 'sub')))
+
+    def test_generate_image_paths(self):
+        paths = list(self.handler().generate_image_paths())
+        self.assertEqual(
+            [os.path.relpath(dst, self.dst) for src, dst in paths],
+            ['a.jpg', 'sub/b.png', 'sub/deeper/c.gif'])
+        for src, dst in paths:
+            self.assertTrue(os.path.isdir(os.path.dirname(dst)))
+        # directories without images are not mirrored
+        self.assertFalse(os.path.exists(os.path.join(self.dst, 'empty')))
+
+    def test_single_file(self):
+        path = os.path.join(self.src, 'a.jpg')
+        paths = list(self.handler(src_images=[path]).generate_image_paths())
+        self.assertEqual(paths, [(
+            path, os.path.join(self.src, ImageHandler.dir_files, 'a.jpg'))])
+
+    def test_format_changes_extension(self):
+        paths = list(self.handler(format='webp').generate_image_paths())
+        self.assertEqual(
+            [os.path.relpath(dst, self.dst) for src, dst in paths],
+            ['a.webp', 'sub/b.webp', 'sub/deeper/c.webp'])
+
+    def test_format_keeps_colliding_extensions(self):
+        self.create('a.png')
+        self.create('a.webp')
+        paths = list(self.handler(format='webp').generate_image_paths())
+        self.assertEqual(
+            sorted(os.path.relpath(dst, self.dst) for src, dst in paths),
+            ['a.jpg.webp', 'a.png.webp', 'a.webp', 'sub/b.webp',
+             'sub/deeper/c.webp'])
+        files = [os.path.join(self.src, name) for name in ('a.jpg', 'a.png')]
+        paths = list(self.handler(
+            src_images=files, format='webp').generate_image_paths())
+        self.assertEqual(len({dst for src, dst in paths}), 2)
+
+
+class RunTest(HandlerTestCase):
+
+    def test_run(self):
+        handler = self.run_handler(self.handler(queue_size=1))
+        self.assertEqual(handler.imgs_total, 3)
+        self.assertEqual(handler.imgs_done, 3)
+        with Image.open(os.path.join(self.dst, 'sub/b.png')) as im:
+            self.assertEqual(im.size, (100, 66))
+
+    def test_run_quiet(self):
+        self.create('broken.jpg')
+        with open(os.path.join(self.src, 'broken.jpg'), 'w') as fp:
+            fp.write('not an image')
+        handler = self.handler(quiet=True)
+        output = handler.reporter.stream = StringIO()
+        self.run_handler(handler)
+        self.assertEqual((handler.imgs_done, handler.imgs_errors), (3, 1))
+        self.assertEqual(handler.imgs_processed, handler.imgs_total)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('ERROR '))
+
+    def test_keep_smaller_summary(self):
+        handler = self.handler(keep_smaller=True, progress='plain',
+                               size='100x,50x:dir=thumbs')
+        output = handler.reporter.stream = StringIO()
+        self.run_handler(handler)
+        savings = handler.summary()['savings']
+        self.assertEqual(sorted(savings), [
+            self.dst, os.path.join(self.dst, 'sub'),
+            os.path.join(self.dst, 'sub', 'deeper'),
+            os.path.join(self.dst, 'sub', 'deeper', 'thumbs'),
+            os.path.join(self.dst, 'sub', 'thumbs'),
+            os.path.join(self.dst, 'thumbs')])
+        self.assertIn('Saved in {}: '.format(self.dst), output.getvalue())
+
+    def test_task_error_is_counted(self):
+        # a task raising instead of returning a Result doesn't stall the run
+        with mock.patch('imgc.worker.process', side_effect=MemoryError):
+            handler = self.run_handler(self.handler())
+        summary = handler.summary()
+        self.assertEqual((summary['done'], summary['errors']), (0, 3))
+        self.assertEqual(len(summary['failed']), 3)
+
+    def test_bookkeeping_error_is_counted(self):
+        # e.g. a source removed before its manifest entry is written
+        with mock.patch('imgc.manifest.Manifest.update',
+                        side_effect=FileNotFoundError('gone')):
+            handler = self.run_handler(self.handler(incremental=True))
+        summary = handler.summary()
+        self.assertEqual((summary['done'], summary['errors']), (0, 3))
+        self.assertEqual(summary['processed'], 3)
+        self.assertEqual(summary['failed'][0][1], 'gone')
+
+    def test_cancel(self):
+        for i in range(20):
+            self.create('many/%d.jpg' % i, size=(1200, 900))
+        handler = self.handler(size='600x,300x:dir=small', workers=2)
+        with redirect_stdout(StringIO()):
+            handler.run()
+            while not handler.imgs_processed:
+                time.sleep(0.001)
+            handler.cancel()
+            self.assertTrue(handler.wait(10))
+        summary = handler.summary()
+        self.assertGreater(summary['cancelled'], 0)
+        self.assertEqual(summary['done'] + summary['cancelled'],
+                         summary['found'])
+        self.assertLess(summary['found'], 23)
+        # finished images have all outputs, cancelled ones none
+        outputs, small = [], []
+        for dirpath, dirnames, filenames in os.walk(self.dst):
+            if os.path.basename(dirpath) == 'small':
+                small.extend(filenames)
+            else:
+                outputs.extend(filenames)
+        self.assertEqual(len(outputs), summary['done'])
+        self.assertEqual(len(small), len(outputs))
+
+    def test_run_format_conversion(self):
+        handler = self.run_handler(self.handler(format='jpeg', preset='small'))
+        self.assertEqual(handler.imgs_done, 3)
+        with Image.open(os.path.join(self.dst, 'sub/deeper/c.jpg')) as im:
+            self.assertEqual((im.format, im.size), ('JPEG', (100, 66)))
+
+    def test_run_dedup(self):
+        for name in ('copy.jpg', 'sub/copy.jpg'):
+            shutil.copy(os.path.join(self.src, 'a.jpg'),
+                        os.path.join(self.src, name))
+        handler = self.run_handler(self.handler(dedup=True, incremental=True))
+        self.assertEqual((handler.imgs_total, handler.imgs_duplicates), (3, 2))
+        for name in ('copy.jpg', 'sub/copy.jpg'):
+            self.assertTrue(os.path.samefile(
+                os.path.join(self.dst, 'a.jpg'), os.path.join(self.dst, name)))
+        self.assertEqual(handler.dedup_bytes,
+                         2 * os.path.getsize(os.path.join(self.src, 'a.jpg')))
+        # duplicates are recorded in the manifest too
+        handler = self.run_handler(self.handler(dedup=True, incremental=True))
+        self.assertEqual(handler.imgs_skipped, 5)
+
+    def test_shards(self):
+        shards = [
+            [dst for src, dst in self.handler(shard=(i, 2)).generate_image_paths()]
+            for i in range(2)]
+        all_paths = [dst for src, dst in self.handler().generate_image_paths()]
+        self.assertEqual(sorted(shards[0] + shards[1]), sorted(all_paths))
+
+    def test_run_work_queue(self):
+        queue = os.path.join(self.tmpdir, 'queue.db')
+        handler = self.run_handler(self.handler(work_queue=queue))
+        self.assertEqual(handler.imgs_done, 3)
+        self.assertEqual(handler.queue.counts(), {'done': 3})
+        # finished jobs are not redone, workers need no paths nor options
+        handler = self.run_handler(self.handler(work_queue=queue))
+        self.assertEqual(handler.imgs_total, 0)
+        # failed jobs are reset when added again
+        handler.queue.conn.execute("UPDATE jobs SET state = 'failed'")
+        handler.queue.add([(os.path.join(self.src, 'a.jpg'),
+                            os.path.join(self.dst, 'a.jpg'))], {'size': '50x'})
+        handler = self.handler(src_images=[], size='1000x', work_queue=queue)
+        manifest = handler.get_manifest(self.dst)
+        self.run_handler(handler)
+        self.assertEqual(handler.imgs_done, 1)
+        with Image.open(os.path.join(self.dst, 'a.jpg')) as im:
+            self.assertEqual(im.size, (50, 33))
+        # the manifest records options the job ran with
+        entry = manifest.entries[os.path.join(self.src, 'a.jpg')]
+        self.assertEqual(entry['params']['size'], '50x')
+
+    def test_run_read_ahead(self):
+        for executor in ('thread', 'process'):
+            shutil.rmtree(self.dst, ignore_errors=True)
+            handler = self.run_handler(self.handler(
+                read_ahead=2, readers=1, writers=1, executor=executor))
+            self.assertEqual(handler.imgs_done, 3)
+            with Image.open(os.path.join(self.dst, 'sub/b.png')) as im:
+                self.assertEqual(im.size, (100, 66))
+
+    def test_run_process_executor(self):
+        handler = self.run_handler(self.handler(executor='process'))
+        self.assertEqual(handler.imgs_done, 3)
+
+    def test_run_without_images(self):
+        handler = self.run_handler(self.handler(src_images=[
+            os.path.join(self.src, 'empty')]))
+        self.assertEqual(handler.imgs_total, 0)
+
+    def test_incremental_run(self):
+        self.run_handler(self.handler(incremental=True))
+        handler = self.run_handler(self.handler(incremental=True))
+        self.assertEqual(handler.imgs_total, 0)
+        self.assertEqual(handler.imgs_skipped, 3)
+
+        self.create('sub/b.png', size=(400, 200))
+        handler = self.run_handler(self.handler(incremental=True))
+        self.assertEqual(handler.imgs_total, 1)
+        self.assertEqual(handler.imgs_skipped, 2)
+
+    def test_find_manifest(self):
+        handler = self.handler(incremental=True)
+        manifest = handler.get_manifest(self.dst)
+        other = handler.get_manifest(self.dst + '2')
+        for path in ('a.jpg', 'sub/deeper/c.gif', 'sub/thumbs/b.png'):
+            self.assertIs(handler.find_manifest(
+                os.path.join(self.dst, path)), manifest)
+        self.assertIs(handler.find_manifest(
+            os.path.join(self.dst + '2', 'a.jpg')), other)
+        self.assertIsNone(handler.find_manifest(
+            os.path.join(self.src, 'a.jpg')))
+
+    def test_run_with_memory_budget(self):
+        handler = self.run_handler(self.handler(max_memory=1))
+        self.assertEqual(handler.imgs_done, 3)
+        self.assertEqual(handler.budget.used, 0)
+        self.assertEqual(handler.admitted, {})
+
+    def test_run_format_collision_with_memory_budget(self):
+        self.create('a.png')
+        handler = self.run_handler(
+            self.handler(format='webp', max_memory=1 << 30))
+        self.assertEqual((handler.imgs_done, handler.imgs_errors), (4, 0))
+        self.assertTrue(os.path.isfile(os.path.join(self.dst, 'a.jpg.webp')))
+        self.assertTrue(os.path.isfile(os.path.join(self.dst, 'a.png.webp')))
+
+    def test_incremental_run_with_renditions(self):
+        size = ['100x', '50x:dir=small']
+        self.run_handler(self.handler(incremental=True, size=size))
+        os.remove(os.path.join(self.dst, 'small', 'a.jpg'))
+        handler = self.run_handler(self.handler(incremental=True, size=size))
+        self.assertEqual(handler.imgs_total, 1)
+
+    def test_run_ordered_by_cost(self):
+        self.create('large.png', size=(1200, 800))
+        handler = self.run_handler(self.handler(order='cost', queue_size=2))
+        self.assertEqual(handler.imgs_done, 4)
+
+    def test_dry_run(self):
+        handler = self.handler(dry_run=True, order='cost')
+        with redirect_stdout(StringIO()) as output:
+            handler.print_plan()
+        self.assertIn('Images: 3', output.getvalue())
+        self.assertFalse(os.path.exists(self.dst))
+
+    def test_files_from(self):
+        listing = os.path.join(self.tmpdir, 'files')
+        with open(listing, 'wb') as fp:
+            fp.write(b'\0'.join([
+                os.path.join(self.src, 'a.jpg').encode(),
+                os.path.join(self.src, 'sub').encode(),
+            ]))
+        handler = self.run_handler(self.handler(
+            src_images=[], files_from=listing))
+        self.assertEqual(handler.imgs_done, 3)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.src, ImageHandler.dir_files, 'a.jpg')))
+        self.assertTrue(os.path.exists(os.path.join(
+            self.src, 'sub-imgc', 'deeper', 'c.gif')))
@@ -29,3 +29,20 @@ class ImageSizeTest(unittest.TestCase):
         ImageSize.parse(size)
         self.assertEqual(parse_string.call_count, 1)
         parse_string.assert_called_with(size, None)
+
+    def test_geometry_flags(self):
+        image = type('Image', (), {'size': (1000, 500)})()
+        expected = {
+            '800x600': (800, 600),
+            '800x600!': (800, 600),
+            '800x600>': (800, 400),
+            '800x600^': (1200, 600),
+            '800x600!>': (800, 600),
+            '2000x>': (1000, 500),
+            '1200x600>': (1000, 500),
+            '2000x<': (2000, 1000),
+            '500x<': (1000, 500),
+            '50%>': (500, 250),
+        }
+        for pattern, size in expected.items():
+            self.assertEqual(ImageSize.parse(pattern, image), size, pattern)
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from imgc.manifest import Manifest
+
+
+class ManifestTest(unittest.TestCase):
+    params = {'size': '1000x', 'quality': 90}
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'src.jpg')
+        self.dst = os.path.join(self.tmpdir, 'dst.jpg')
+        for path in (self.src, self.dst):
+            with open(path, 'wb') as fp:
+                fp.write(b'data')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def touch(self, path):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_unknown_source_is_not_fresh(self):
+        manifest = Manifest(self.tmpdir)
+        self.assertFalse(manifest.is_fresh(self.src, self.dst, self.params))
+
+    def test_updated_source_is_fresh_after_reload(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.update(self.src, self.params)
+        manifest.save()
+
+        manifest = Manifest(self.tmpdir)
+        self.assertTrue(manifest.is_fresh(self.src, self.dst, self.params))
+
+    def test_changed_params(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.update(self.src, self.params)
+        params = dict(self.params, quality=80)
+        self.assertFalse(manifest.is_fresh(self.src, self.dst, params))
+
+    def test_missing_output(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.update(self.src, self.params)
+        os.remove(self.dst)
+        self.assertFalse(manifest.is_fresh(self.src, self.dst, self.params))
+
+    def test_modified_source(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.update(self.src, self.params)
+        with open(self.src, 'ab') as fp:
+            fp.write(b'more')
+        self.assertFalse(manifest.is_fresh(self.src, self.dst, self.params))
+
+    def test_touched_source_without_hash(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.update(self.src, self.params)
+        self.touch(self.src)
+        self.assertFalse(manifest.is_fresh(self.src, self.dst, self.params))
+
+    def test_touched_source_with_hash(self):
+        manifest = Manifest(self.tmpdir, use_hash=True)
+        manifest.update(self.src, self.params)
+        self.touch(self.src)
+        self.assertTrue(manifest.is_fresh(self.src, self.dst, self.params))
+
+    def test_corrupt_manifest_is_ignored(self):
+        with open(os.path.join(self.tmpdir, Manifest.filename), 'w') as fp:
+            fp.write('{not json')
+        manifest = Manifest(self.tmpdir)
+        self.assertEqual(manifest.entries, {})
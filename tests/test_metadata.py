@@ -0,0 +1,133 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, ImageCms, ImageDraw
+
+from imgc import color
+from imgc.metadata import ORIENTATION, orientation, oriented, stored_size
+from imgc.plan import plan_item
+from imgc.rendition import parse_renditions
+from imgc.worker import Job, Options, process
+
+
+def srgb_profile():
+    return ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+
+
+def other_profile():
+    # sRGB primaries, but not described as sRGB
+    return srgb_profile().replace(
+        'sRGB'.encode('utf-16-be'), 'xRGB'.encode('utf-16-be'))
+
+
+class MetadataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'src.jpg')
+        self.dst = os.path.join(self.tmpdir, 'dst.jpg')
+        # red left half, blue right half, shown rotated 90 degrees clockwise
+        im = Image.new('RGB', (200, 100), (255, 0, 0))
+        ImageDraw.Draw(im).rectangle((100, 0, 199, 99), fill=(0, 0, 255))
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        im.save(self.src, exif=exif.tobytes(), comment=b'camera',
+                icc_profile=srgb_profile())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_job(self, **options):
+        result = process(Job(self.src, self.dst, Options(**options)))
+        self.assertTrue(result.ok, result.error)
+        self.assertFalse(result.passed_through)
+        return Image.open(self.dst)
+
+    def test_oriented_size(self):
+        with Image.open(self.src) as im:
+            self.assertEqual(orientation(im), 6)
+            self.assertEqual(oriented(im).size, (100, 200))
+            self.assertEqual(stored_size(im, (50, 100)), (100, 50))
+
+    def test_orientation_is_applied(self):
+        with self.run_job(size='50x') as im:
+            self.assertEqual(im.size, (50, 100))
+            self.assertNotIn('exif', im.info)
+            red, green, blue = im.getpixel((25, 10))
+            self.assertGreater(red, 200)
+            red, green, blue = im.getpixel((25, 90))
+            self.assertGreater(blue, 200)
+            # other metadata are kept
+            self.assertEqual(im.info['comment'], b'camera')
+            self.assertEqual(im.info['icc_profile'], srgb_profile())
+
+    def test_keep_exif(self):
+        with self.run_job(size='50x', keep_exif=True) as im:
+            self.assertIn('exif', im.info)
+            self.assertEqual(im.getexif().get(ORIENTATION, 1), 1)
+
+    def test_strip_metadata(self):
+        with self.run_job(size='50x', strip_metadata=True) as im:
+            self.assertEqual(im.size, (50, 100))
+            for key in ('exif', 'comment', 'icc_profile'):
+                self.assertNotIn(key, im.info)
+
+    def test_plan(self):
+        item = plan_item(self.src, self.dst, parse_renditions('50x'))
+        self.assertEqual(item.targets, [(50, 100)])
+
+
+class ColorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        color._transforms.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_transforms_are_built_once_per_profile(self):
+        profile = other_profile()
+        for _ in range(3):
+            im = Image.new('RGB', (10, 10), (200, 100, 50))
+            im.info['icc_profile'] = profile
+            self.assertTrue(color.needs_conversion(im))
+            im = color.to_srgb(im)
+            self.assertNotIn('icc_profile', im.info)
+            self.assertEqual(im.getpixel((0, 0)), (200, 100, 50))
+        self.assertEqual(color._transforms.misses, 1)
+
+    def test_srgb_and_broken_profiles(self):
+        im = Image.new('RGB', (10, 10))
+        im.info['icc_profile'] = srgb_profile()
+        self.assertFalse(color.needs_conversion(im))
+        im.info['icc_profile'] = b'broken'
+        self.assertFalse(color.needs_conversion(im))
+        self.assertNotIn('icc_profile', color.to_srgb(im).info)
+
+    def test_cmyk(self):
+        src = os.path.join(self.tmpdir, 'src.jpg')
+        dst = os.path.join(self.tmpdir, 'dst.jpg')
+        Image.new('CMYK', (100, 100), (0, 255, 255, 0)).save(src)
+        result = process(Job(src, dst, Options(size='50x', srgb=True)))
+        self.assertTrue(result.ok, result.error)
+        with Image.open(dst) as im:
+            self.assertEqual(im.mode, 'RGB')
+            red, green, blue = im.getpixel((25, 25))
+            self.assertGreater(red, 200)
+            self.assertLess(green + blue, 50)
+
+    def test_unchanged_unless_converted(self):
+        src = os.path.join(self.tmpdir, 'src.png')
+        dst = os.path.join(self.tmpdir, 'dst.png')
+        im = Image.new('RGB', (100, 100))
+        im.save(src, icc_profile=other_profile())
+        result = process(Job(src, dst, Options(size='100x>')))
+        self.assertTrue(result.passed_through)
+        result = process(Job(src, dst, Options(size='100x>', srgb=True)))
+        self.assertFalse(result.passed_through)
+        with Image.open(dst) as im:
+            self.assertNotIn('icc_profile', im.info)
@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from imgc.metrics import Histogram, Metrics, MetricsWriter, STAGES, timed
+from imgc.worker import Result
+
+
+def make_result(error=None, **timings):
+    result = Result('src.jpg', 'dst.jpg', error)
+    result.elapsed = sum(timings.values())
+    result.timings = timings
+    result.bytes_in, result.bytes_out = 1000, 100
+    result.pixels_in, result.pixels_out = 400, 100
+    return result
+
+
+class TimedTest(unittest.TestCase):
+
+    def test_timed_accumulates(self):
+        timings = {}
+        for _ in range(2):
+            with timed(timings, 'decode'):
+                time.sleep(0.01)
+        self.assertGreaterEqual(timings['decode'], 0.02)
+
+    def test_timed_records_failed_stage(self):
+        timings = {}
+        with self.assertRaises(OSError):
+            with timed(timings, 'open'):
+                raise OSError
+        self.assertIn('open', timings)
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_empty(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(50), 0.0)
+        self.assertEqual(histogram.as_dict()['count'], 0)
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for _ in range(90):
+            histogram.add(0.001)
+        for _ in range(10):
+            histogram.add(1.0)
+        self.assertLessEqual(histogram.percentile(50), 0.002)
+        self.assertGreaterEqual(histogram.percentile(50), 0.001)
+        self.assertEqual(histogram.percentile(99), 1.0)
+        data = histogram.as_dict()
+        self.assertEqual(data['count'], 100)
+        self.assertEqual(sum(data['buckets'].values()), 100)
+        self.assertEqual((data['min'], data['max']), (0.001, 1.0))
+
+    def test_outliers(self):
+        histogram = Histogram()
+        histogram.add(10**6)
+        self.assertEqual(histogram.as_dict()['buckets'], {'inf': 1})
+        self.assertEqual(histogram.percentile(50), 10**6)
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.metrics = Metrics()
+        self.metrics.add(make_result(decode=0.01, encode=0.02))
+        self.metrics.add(make_result(decode=0.03, encode=0.01))
+        self.metrics.add(make_result(error='broken'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {
+            'images': 2, 'errors': 1, 'bytes_in': 2000, 'bytes_out': 200,
+            'pixels_in': 800, 'pixels_out': 200})
+        self.assertEqual(set(snapshot['stages']), set(STAGES))
+        self.assertEqual(snapshot['stages']['decode']['count'], 2)
+        self.assertEqual(snapshot['stages']['open']['count'], 0)
+        self.assertAlmostEqual(snapshot['total']['sum'], 0.07)
+
+    def test_write_json(self):
+        path = os.path.join(self.tmpdir, 'metrics.json')
+        writer = MetricsWriter(path, self.metrics)
+        writer.write()
+        writer.write()
+        with open(path) as fp:
+            self.assertEqual(json.load(fp)['counters']['images'], 2)
+
+    def test_write_ndjson(self):
+        path = os.path.join(self.tmpdir, 'metrics.ndjson')
+        writer = MetricsWriter(path, self.metrics, interval=0)
+        writer.maybe_write()
+        writer.write()
+        writer.write()
+        with open(path) as fp:
+            lines = [json.loads(line) for line in fp]
+        self.assertEqual(len(lines), 2)
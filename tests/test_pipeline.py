@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from PIL import Image
+
+from imgc.job import Job, Options
+from imgc.pipeline import Pipeline
+from imgc.pool import create_pool
+from imgc.utils import write_atomic
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.results = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def on_result(self, result):
+        self.results.append(result)
+        if len(self.results) == self.expected:
+            self.done.set()
+
+    def run_pipeline(self, tasks, executor='thread'):
+        self.expected = sum(len(jobs) for jobs in tasks)
+        pool = create_pool(executor, 2)
+        pipeline = Pipeline(pool, self.on_result, read_ahead=2,
+                            readers=2, writers=2)
+        try:
+            for jobs in tasks:
+                pipeline.submit(jobs)
+            pipeline.close_reads()
+            self.assertTrue(self.done.wait(10))
+        finally:
+            pipeline.close()
+            pool.terminate()
+        return sorted(self.results, key=lambda result: result.dst)
+
+    def test_write_atomic(self):
+        write_atomic(self.path('a'), b'data')
+        with open(self.path('a'), 'rb') as fp:
+            self.assertEqual(fp.read(), b'data')
+        self.assertEqual(os.listdir(self.tmpdir), ['a'])
+
+    def test_pipeline(self):
+        options = Options(size='50x,20x:dir=small')
+        tasks = []
+        for i in range(5):
+            src = self.path('%d.png' % i)
+            Image.new('RGB', (100, 80)).save(src)
+            tasks.append([Job(src, self.path('out/%d.png' % i), options)])
+        open(self.path('broken.png'), 'w').close()
+        tasks.append([Job(self.path('broken.png'),
+                          self.path('out/broken.png'), options)])
+        results = self.run_pipeline(tasks, 'process')
+        self.assertEqual([result.ok for result in results], [True] * 5 + [False])
+        self.assertIn(repr(self.path('broken.png')), results[-1].error)
+        for result in results[:5]:
+            self.assertIsNone(result.buffers)
+            self.assertGreater(result.timings['open'], 0)
+            self.assertGreater(result.timings['save'], 0)
+            for path in result.outputs:
+                self.assertTrue(os.path.isfile(path))
+        with Image.open(self.path('out/small/3.png')) as im:
+            self.assertEqual(im.size, (20, 16))
+        self.assertFalse([name for name in os.listdir(self.path('out'))
+                          if name.endswith('.tmp')])
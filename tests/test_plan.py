@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+from imgc.job import Options
+from imgc.plan import (
+    PlanItem, batches, draft_scale, order_by_cost, plan_item, summary)
+from imgc.rendition import parse_renditions
+
+
+def item(cost):
+    return PlanItem('src', 'dst', 'PNG', (1, 1), [(1, 1)], 1, cost, 0, None)
+
+
+class DraftScaleTest(unittest.TestCase):
+
+    def test_jpeg(self):
+        self.assertEqual(draft_scale('JPEG', (4000, 3000), (1000, 750), 1), 4)
+        self.assertEqual(draft_scale('JPEG', (4000, 3000), (1000, 750), 2), 2)
+        self.assertEqual(draft_scale('JPEG', (4000, 3000), (100, 75), 1), 8)
+        self.assertEqual(draft_scale('JPEG', (4000, 3000), (100, 75), None), 1)
+
+    def test_other_formats(self):
+        self.assertEqual(draft_scale('PNG', (4000, 3000), (100, 75), 1), 1)
+
+
+class PlanItemTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def test_plan_item(self):
+        Image.new('RGB', (4000, 3000)).save(self.path('a.jpg'))
+        renditions = parse_renditions('1000x,100x')
+        planned = plan_item(self.path('a.jpg'), 'dst', renditions, 1.0)
+        self.assertIsNone(planned.error)
+        self.assertEqual(planned.format, 'JPEG')
+        self.assertEqual(planned.size, (4000, 3000))
+        self.assertEqual(planned.targets, [(1000, 750), (100, 75)])
+        self.assertEqual(planned.scale, 4)
+        self.assertGreater(planned.cost, 1000 * 750)
+        self.assertEqual(planned.memory, int(4000 * 3000 * 3 * 1.5))
+
+    def test_unchanged_image(self):
+        Image.new('RGB', (400, 300)).save(self.path('a.jpg'))
+        planned = plan_item(self.path('a.jpg'), 'dst.jpg',
+                            parse_renditions('1000x>'), options=Options())
+        self.assertTrue(planned.unchanged)
+        self.assertEqual(planned.cost, 0)
+        self.assertEqual(summary([planned])['unchanged'], 1)
+        # a format change needs a decode
+        planned = plan_item(self.path('a.jpg'), 'dst.png',
+                            parse_renditions('1000x>'), options=Options())
+        self.assertFalse(planned.unchanged)
+
+    def test_unreadable_image(self):
+        with open(self.path('a.jpg'), 'wb') as fp:
+            fp.write(b'broken')
+        planned = plan_item(self.path('a.jpg'), 'dst', parse_renditions('1x'))
+        self.assertIsNotNone(planned.error)
+        self.assertEqual(summary([planned])['errors'], 1)
+
+
+class BatchesTest(unittest.TestCase):
+
+    def test_order_by_cost(self):
+        items = order_by_cost([item(1), item(30), item(5)])
+        self.assertEqual([i.cost for i in items], [30, 5, 1])
+
+    def test_expensive_items_are_not_batched(self):
+        result = list(batches([item(100), item(200)], batch_cost=50))
+        self.assertEqual([len(batch) for batch in result], [1, 1])
+
+    def test_cheap_items_are_batched(self):
+        items = [item(100)] + [item(10)] * 12
+        result = list(batches(items, batch_cost=50, batch_size=4))
+        self.assertEqual([len(batch) for batch in result], [1, 4, 4, 4])
+        result = list(batches(items, batch_cost=25, batch_size=4))
+        self.assertEqual([len(batch) for batch in result],
+                         [1, 3, 3, 3, 3])
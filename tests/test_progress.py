@@ -0,0 +1,130 @@
+import json
+import threading
+import unittest
+from io import StringIO
+
+from imgc.job import Result
+from imgc.progress import (
+    BarReporter, Counter, JsonReporter, PlainReporter, Progress,
+    QueueReporter, Reporter, create_reporter)
+
+
+def make_result(error=None):
+    result = Result('src.jpg', 'dst.jpg', error)
+    result.bytes_in, result.bytes_out = 1000, 100
+    return result
+
+
+class ProgressTest(unittest.TestCase):
+
+    def test_add_from_threads(self):
+        progress = Progress()
+
+        def count():
+            for _ in range(1000):
+                progress.add(processed=1, done=1)
+
+        threads = [threading.Thread(target=count) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(progress.values['processed'], 8000)
+        self.assertEqual(progress.values['done'], 8000)
+
+    def test_add_result(self):
+        progress = Progress()
+        progress.add_result(make_result())
+        progress.add_result(make_result('broken'))
+        snapshot = progress.snapshot()
+        self.assertEqual((snapshot['done'], snapshot['errors']), (1, 1))
+        self.assertEqual(snapshot['bytes_in'], 1000)
+        self.assertEqual(snapshot['processed'], 0)
+        self.assertEqual(progress.pop_events(), [
+            {'event': 'error', 'src': 'src.jpg', 'error': 'broken'}])
+        self.assertEqual(progress.pop_events(), [])
+
+    def test_qualities_are_reported(self):
+        progress = Progress()
+        result = make_result()
+        result.qualities = {'dst.jpg': 75}
+        progress.add_result(result)
+        self.assertEqual(progress.pop_events(), [
+            {'event': 'image', 'src': 'src.jpg',
+             'qualities': {'dst.jpg': 75}}])
+        output = StringIO()
+        PlainReporter(progress, output).emit(
+            {'event': 'image', 'src': 'src.jpg', 'qualities': {'dst.jpg': 75}})
+        self.assertEqual(output.getvalue(), 'saved: dst.jpg (quality 75)\n')
+
+    def test_counter(self):
+        class Handler:
+            imgs_done = Counter('done')
+
+            def __init__(self):
+                self.stats = Progress()
+
+        handler = Handler()
+        handler.stats.add(done=2)
+        self.assertEqual(handler.imgs_done, 2)
+        handler.imgs_done = 5
+        self.assertEqual(handler.stats.values['done'], 5)
+
+
+class ReporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.progress = Progress()
+        self.progress.add(found=4, processed=2, done=1, errors=1)
+        self.progress.discovered = True
+        self.progress.error('bad.jpg', 'cannot identify image file')
+
+    def test_quiet_reports_errors_only(self):
+        output = StringIO()
+        reporter = Reporter(self.progress, output)
+        reporter.close()
+        reporter.message('summary')
+        self.assertEqual(
+            output.getvalue(), 'ERROR bad.jpg: cannot identify image file\n')
+
+    def test_plain(self):
+        output = StringIO()
+        reporter = PlainReporter(self.progress, output)
+        reporter.tick()
+        # unchanged counters are not reported again
+        reporter.tick()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('[2/4  50%]'))
+        self.assertIn('errors: 1', lines[1])
+
+    def test_bar(self):
+        output = StringIO()
+        reporter = BarReporter(self.progress, output)
+        reporter.close()
+        self.assertIn('[' + '#' * 15 + '.' * 15 + ']', output.getvalue())
+        self.assertTrue(output.getvalue().endswith('\n'))
+
+    def test_json(self):
+        output = StringIO()
+        reporter = JsonReporter(self.progress, output).start()
+        reporter.close()
+        events = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(events[0]['event'], 'error')
+        self.assertEqual(events[-1]['event'], 'done')
+        self.assertEqual(events[-1]['found'], 4)
+
+    def test_queue(self):
+        reporter = QueueReporter(self.progress)
+        reporter.close()
+        events = []
+        while not reporter.queue.empty():
+            events.append(reporter.queue.get_nowait()['event'])
+        self.assertEqual(events, ['error', 'done'])
+
+    def test_create_reporter(self):
+        self.assertIs(type(create_reporter(
+            self.progress, 'json', quiet=True)), Reporter)
+        # StringIO is not a terminal
+        self.assertIs(type(create_reporter(
+            self.progress, 'auto', stream=StringIO())), PlainReporter)
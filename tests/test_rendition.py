@@ -0,0 +1,90 @@
+import os
+import unittest
+
+from PIL import Image
+
+from imgc.rendition import Rendition, output_paths, parse_renditions
+from imgc.worker import closest_source
+
+
+class RenditionParseTest(unittest.TestCase):
+
+    def test_size_only(self):
+        self.assertEqual(Rendition.parse('800x'), Rendition('800x'))
+
+    def test_options(self):
+        rendition = Rendition.parse('150x150:q=70:suffix=_t:dir=thumbs')
+        self.assertEqual(rendition.size, '150x150')
+        self.assertEqual(rendition.quality, 70)
+        self.assertEqual(rendition.suffix, '_t')
+        self.assertEqual(rendition.dir, 'thumbs')
+        self.assertEqual(Rendition.parse(rendition.spec), rendition)
+
+    def test_crop(self):
+        rendition = Rendition.parse('300x300:crop=smart')
+        self.assertEqual(rendition.crop, 'smart')
+        self.assertEqual(Rendition.parse(rendition.spec), rendition)
+        image = type('Image', (), {'size': (1000, 500)})()
+        self.assertEqual(rendition.target_size(image), (300, 300))
+        self.assertEqual(rendition.full_size(image, (300, 300)), (600, 300))
+
+    def test_invalid_options(self):
+        for spec in ('800x:color=red', '800x:quality', '800x:q=0',
+                     '800x:suffix=a%sb' % os.sep, '300x300:crop=left',
+                     '300x:crop=center'):
+            with self.assertRaises(ValueError):
+                Rendition.parse(spec)
+
+
+class RenditionPathTest(unittest.TestCase):
+    dst = os.path.join('out', 'photo.jpg')
+
+    def test_plain(self):
+        self.assertEqual(Rendition('800x').path(self.dst), self.dst)
+
+    def test_suffix_and_dir(self):
+        rendition = Rendition('800x', suffix='_s', dir='small')
+        self.assertEqual(rendition.path(self.dst),
+                         os.path.join('out', 'small', 'photo_s.jpg'))
+
+
+class ParseRenditionsTest(unittest.TestCase):
+
+    def test_single(self):
+        self.assertEqual(parse_renditions('1000x'), [Rendition('1000x')])
+        self.assertEqual(parse_renditions((800, 600)),
+                         [Rendition((800, 600))])
+
+    def test_default_suffixes(self):
+        renditions = parse_renditions('1000x,50%,150x150:dir=thumbs')
+        self.assertEqual(output_paths('a.jpg', renditions), [
+            'a-1000x.jpg', 'a-50pct.jpg', os.path.join('thumbs', 'a.jpg')])
+
+    def test_list(self):
+        renditions = parse_renditions(['1000x', Rendition('400x', 60)])
+        self.assertEqual([r.suffix for r in renditions], ['-1000x', '-400x'])
+
+    def test_same_output_paths(self):
+        with self.assertRaises(ValueError):
+            parse_renditions('800x:suffix=_a,400x:suffix=_a')
+
+
+class ClosestSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.original = Image.new('RGB', (4000, 3000))
+        self.resized = [Image.new('RGB', (2000, 1500)),
+                        Image.new('RGB', (1000, 750)),
+                        Image.new('RGB', (1000, 100))]
+
+    def test_smallest_larger_image(self):
+        source = closest_source(self.original, self.resized, (400, 300))
+        self.assertEqual(source.size, (1000, 750))
+
+    def test_aspect_mismatch(self):
+        source = closest_source(self.original, self.resized, (1200, 100))
+        self.assertEqual(source.size, (2000, 1500))
+
+    def test_fallback_to_original(self):
+        source = closest_source(self.original, self.resized, (3000, 3000))
+        self.assertIs(source, self.original)
@@ -0,0 +1,108 @@
+import io
+import random
+import time
+import unittest
+
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+from imgc.resize import draft, fast_resize, resample_filter
+
+
+def make_photo(size=(3000, 2000), seed=0):
+    '''
+    detailed JPEG resembling a camera photo: gradients, shapes and noise
+    '''
+    rnd = random.Random(seed)
+    im = Image.linear_gradient('L').resize(size).convert('RGB')
+    canvas = ImageDraw.Draw(im)
+    for _ in range(300):
+        x, y = rnd.randrange(size[0]), rnd.randrange(size[1])
+        r = rnd.randrange(10, 200)
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        canvas.ellipse((x, y, x + r, y + r), fill=color)
+    noise = Image.effect_noise(size, 30).convert('RGB')
+    im = Image.blend(im, noise, 0.15)
+    buf = io.BytesIO()
+    im.save(buf, 'JPEG', quality=90)
+    return buf.getvalue()
+
+
+def rms(im1, im2):
+    diff = ImageChops.difference(im1.convert('RGB'), im2.convert('RGB'))
+    return max(ImageStat.Stat(diff).rms)
+
+
+def best_time(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class ResampleFilterTest(unittest.TestCase):
+
+    def test_known_filter(self):
+        self.assertEqual(resample_filter('lanczos'), Image.LANCZOS)
+
+    def test_unknown_filter(self):
+        with self.assertRaises(ValueError):
+            resample_filter('sinc')
+
+
+class DraftTest(unittest.TestCase):
+
+    def test_draft_scales_jpeg_decoder(self):
+        im = Image.open(io.BytesIO(make_photo()))
+        self.assertTrue(draft(im, (250, 166), 2.0))
+        self.assertEqual(im.size, (750, 500))
+
+    def test_draft_disabled(self):
+        im = Image.open(io.BytesIO(make_photo()))
+        self.assertFalse(draft(im, (250, 166), None))
+        self.assertEqual(im.size, (3000, 2000))
+
+    def test_draft_ignores_png(self):
+        buf = io.BytesIO()
+        Image.new('RGB', (800, 600)).save(buf, 'PNG')
+        im = Image.open(buf)
+        self.assertFalse(draft(im, (100, 75), 1.0))
+
+
+class FastResizeComparisonTest(unittest.TestCase):
+    '''
+    quality/speed comparison of the fast path against a full resolution
+    BICUBIC resize, which is what imgc did before reductions were added
+    '''
+    size = (500, 333)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = make_photo()
+        cls.reference = cls.full_resize()
+
+    @classmethod
+    def full_resize(cls):
+        with Image.open(io.BytesIO(cls.data)) as im:
+            return im.resize(cls.size, Image.BICUBIC)
+
+    def fast(self, reducing_gap):
+        with Image.open(io.BytesIO(self.data)) as im:
+            return fast_resize(im, self.size, 'bicubic', reducing_gap)
+
+    def test_result_size(self):
+        for gap in (None, 1.0, 2.0, 3.0):
+            self.assertEqual(self.fast(gap).size, self.size)
+
+    def test_quality(self):
+        # per channel RMS error out of 255
+        self.assertEqual(rms(self.fast(None), self.reference), 0)
+        self.assertLess(rms(self.fast(3.0), self.reference), 2)
+        self.assertLess(rms(self.fast(2.0), self.reference), 2)
+        self.assertLess(rms(self.fast(1.0), self.reference), 4)
+
+    def test_speed(self):
+        full = best_time(self.full_resize)
+        fast = best_time(lambda: self.fast(2.0))
+        self.assertLess(fast, full)
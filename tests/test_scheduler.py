@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from PIL import Image
+
+from imgc.scheduler import (
+    MEMORY_OVERHEAD, MemoryBudget, estimate_memory, parse_memory)
+from imgc.worker import Job, Options, process, set_max_image_pixels
+
+
+class ParseMemoryTest(unittest.TestCase):
+
+    def test_units(self):
+        self.assertEqual(parse_memory('1024'), 1024)
+        self.assertEqual(parse_memory('512k'), 512 * 1024)
+        self.assertEqual(parse_memory('2M'), 2 * 1024 ** 2)
+        self.assertEqual(parse_memory('1.5G'), int(1.5 * 1024 ** 3))
+        self.assertEqual(parse_memory('1GiB'), 1024 ** 3)
+
+    def test_invalid(self):
+        for value in ('', 'lots', '-1G', '1X'):
+            with self.assertRaises(ValueError):
+                parse_memory(value)
+
+
+class EstimateMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_estimate_from_header(self):
+        path = os.path.join(self.tmpdir, 'a.png')
+        Image.new('RGBA', (100, 50)).save(path)
+        self.assertEqual(estimate_memory(path),
+                         int(100 * 50 * 4 * MEMORY_OVERHEAD))
+
+    def test_broken_image(self):
+        path = os.path.join(self.tmpdir, 'a.png')
+        with open(path, 'wb') as fp:
+            fp.write(b'broken')
+        self.assertEqual(estimate_memory(path), 0)
+
+
+class MemoryBudgetTest(unittest.TestCase):
+
+    def acquire_in_thread(self, budget, cost):
+        thread = threading.Thread(target=budget.acquire, args=(cost,))
+        thread.start()
+        thread.join(0.05)
+        return thread
+
+    def test_admits_while_fits(self):
+        budget = MemoryBudget(100)
+        budget.acquire(60)
+        budget.acquire(40)
+        self.assertEqual(budget.used, 100)
+
+    def test_blocks_until_released(self):
+        budget = MemoryBudget(100)
+        budget.acquire(60)
+        thread = self.acquire_in_thread(budget, 50)
+        self.assertTrue(thread.is_alive())
+        budget.release(60)
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(budget.used, 50)
+
+    def test_oversized_job_runs_alone(self):
+        budget = MemoryBudget(100)
+        budget.acquire(500)
+        thread = self.acquire_in_thread(budget, 1)
+        self.assertTrue(thread.is_alive())
+        budget.release(500)
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+
+
+class DecompressionBombTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'a.png')
+        self.dst = os.path.join(self.tmpdir, 'b.png')
+        Image.new('RGB', (300, 200)).save(self.src)
+        self.max_image_pixels = Image.MAX_IMAGE_PIXELS
+
+    def tearDown(self):
+        Image.MAX_IMAGE_PIXELS = self.max_image_pixels
+        shutil.rmtree(self.tmpdir)
+
+    def test_bomb_is_reported_as_error(self):
+        set_max_image_pixels(1000)
+        options = Options(size='100x')
+        result = process(Job(self.src, self.dst, options))
+        self.assertFalse(result.ok)
+        self.assertFalse(os.path.exists(self.dst))
+
+    def test_check_disabled(self):
+        Image.MAX_IMAGE_PIXELS = 1000
+        set_max_image_pixels(0)
+        options = Options(size='100x')
+        result = process(Job(self.src, self.dst, options))
+        self.assertTrue(result.ok)
+
+    def test_jobs_do_not_change_the_limit(self):
+        # the limit is shared by the process, e.g. by clients of a server
+        Image.MAX_IMAGE_PIXELS = 1000
+        options = Options(size='100x', max_image_pixels=0)
+        result = process(Job(self.src, self.dst, options))
+        self.assertFalse(result.ok)
+        self.assertEqual(Image.MAX_IMAGE_PIXELS, 1000)
@@ -0,0 +1,76 @@
+import random
+import unittest
+
+from PIL import Image, ImageFilter
+
+from imgc.search import QualitySearch, bytes_guess, luminance, ssim
+
+
+def make_photo(size=(320, 240), seed=0):
+    rnd = random.Random(seed)
+    noise = Image.frombytes(
+        'L', size, bytes(rnd.getrandbits(8) for _ in range(size[0] * size[1])))
+    noise = noise.filter(ImageFilter.GaussianBlur(2))
+    return Image.merge('RGB', (noise, noise.point(lambda v: 255 - v), noise))
+
+
+class SsimTest(unittest.TestCase):
+
+    def test_identical(self):
+        im = luminance(make_photo())
+        self.assertAlmostEqual(ssim(im, im), 1.0)
+
+    def test_degraded_is_less_similar(self):
+        im = make_photo()
+        reference = luminance(im)
+        similarity = [
+            ssim(reference, luminance(im.filter(ImageFilter.GaussianBlur(r))))
+            for r in (1, 3)]
+        self.assertLess(similarity[0], 1.0)
+        self.assertLess(similarity[1], similarity[0])
+
+    def test_bytes_guess_grows_with_budget(self):
+        pixels = 1000 * 1000
+        self.assertLessEqual(bytes_guess(10000, pixels),
+                             bytes_guess(200000, pixels))
+        self.assertEqual(bytes_guess(1, pixels), 20)
+        self.assertEqual(bytes_guess(10 ** 9, pixels), 97)
+
+
+class QualitySearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.im = make_photo()
+
+    def test_target_bytes(self):
+        full = len(QualitySearch(self.im).encode(95))
+        target = full // 2
+        quality, data = QualitySearch(self.im, target_bytes=target).run()
+        self.assertLessEqual(len(data), target)
+        self.assertLess(quality, 95)
+        # the next quality up would not fit
+        self.assertGreater(
+            len(QualitySearch(self.im).encode(quality + 1)), target)
+
+    def test_target_bytes_fitting_keeps_max_quality(self):
+        search = QualitySearch(self.im, max_quality=80, target_bytes=10 ** 7)
+        quality, data = search.run()
+        self.assertEqual(quality, 80)
+        self.assertEqual(search.trials, 1)
+
+    def test_unreachable_target_bytes_gives_min_quality(self):
+        quality, data = QualitySearch(
+            self.im, min_quality=40, target_bytes=100).run()
+        self.assertEqual(quality, 40)
+
+    def test_target_ssim(self):
+        quality, data = QualitySearch(self.im, target_ssim=0.95).run()
+        self.assertLess(quality, 95)
+        search = QualitySearch(self.im)
+        self.assertGreaterEqual(search.ssim(quality), 0.95)
+
+    def test_trials_are_bounded(self):
+        search = QualitySearch(self.im, min_quality=1, target_ssim=0.999,
+                               target_bytes=5000, max_trials=3)
+        search.run()
+        self.assertLessEqual(search.trials, 3 + 2)
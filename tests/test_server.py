@@ -0,0 +1,168 @@
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from PIL import Image
+
+from imgc import client, main
+from imgc.server import FairQueue, Server
+
+
+class FairQueueTest(unittest.TestCase):
+
+    def test_round_robin(self):
+        queue = FairQueue()
+        for item in ('a1', 'a2', 'a3'):
+            queue.put('a', item)
+        for item in ('b1', 'b2'):
+            queue.put('b', item)
+        queue.put('c', 'c1')
+        order = []
+        while True:
+            item = queue.pop()
+            if item is None:
+                break
+            order.append(item)
+        self.assertEqual(order, ['a1', 'b1', 'c1', 'a2', 'b2', 'a3'])
+
+    def test_removed_client(self):
+        queue = FairQueue()
+        queue.put('a', 'a1')
+        queue.put('b', 'b1')
+        queue.remove('a')
+        self.assertEqual(queue.pop(), 'b1')
+        self.assertIsNone(queue.pop())
+
+
+class ServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.socket = os.path.join(cls.tmpdir, 'imgc.sock')
+        cls.server = Server(cls.socket, 'thread', 2)
+        cls.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        cls.task = cls.loop.create_task(cls.server.serve(ready))
+        cls.thread = threading.Thread(target=cls.run_server, daemon=True)
+        cls.thread.start()
+        ready.wait(5)
+
+    @classmethod
+    def run_server(cls):
+        try:
+            cls.loop.run_until_complete(cls.task)
+        except asyncio.CancelledError:
+            pass
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.task.cancel)
+        cls.thread.join(5)
+        cls.loop.close()
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        self.src = tempfile.mkdtemp(dir=self.tmpdir)
+        for i in range(3):
+            Image.new('RGB', (300, 200)).save(
+                os.path.join(self.src, '%d.jpg' % i))
+
+    def submit(self, paths, **options):
+        return list(client.submit_paths(paths, options, self.socket))
+
+    def test_paths(self):
+        messages = self.submit([self.src], size='100x')
+        results = [m for m in messages if m['event'] == 'result']
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(m['error'] is None for m in results))
+        self.assertEqual(messages[-1]['event'], 'done')
+        self.assertEqual(messages[-1]['images'], 3)
+        with Image.open(results[0]['outputs'][0]) as im:
+            self.assertEqual(im.size, (100, 66))
+
+    def test_requests_do_not_change_the_bomb_limit(self):
+        messages = self.submit([self.src], size='100x', max_image_pixels=1)
+        self.assertEqual(messages[-1]['errors'], 0)
+
+    def test_incremental(self):
+        self.submit([self.src], size='100x', incremental=True)
+        messages = self.submit([self.src], size='100x', incremental=True)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['skipped'], 3)
+
+    def test_inline_data(self):
+        buf = io.BytesIO()
+        Image.new('RGB', (300, 200)).save(buf, 'JPEG')
+        data = client.compress(buf.getvalue(), {'size': '30x'}, 'PNG',
+                               self.socket)
+        with Image.open(io.BytesIO(data)) as im:
+            self.assertEqual((im.format, im.size), ('PNG', (30, 20)))
+
+    def test_inline_broken_data(self):
+        with self.assertRaises(OSError):
+            client.compress(b'broken', socket_path=self.socket)
+
+    def test_inline_data_without_result(self):
+        done = {'id': '1', 'event': 'done', 'images': 0, 'errors': 0}
+        with mock.patch('imgc.client.request', return_value=iter([done])):
+            with self.assertRaises(OSError):
+                client.compress(b'data', socket_path=self.socket)
+
+    def test_command_line_exit_status(self):
+        args = ['--connect', self.socket, '-s', '100x', self.src]
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(main(args), 0)
+            with open(os.path.join(self.src, 'broken.jpg'), 'w') as fp:
+                fp.write('not an image')
+            self.assertEqual(main(args), 1)
+
+    def test_command_line_paths(self):
+        # the server resolves relative paths against its own directory
+        listing = os.path.join(self.src, 'files.txt')
+        with open(listing, 'wb') as fp:
+            fp.write(b'0.jpg\x001.jpg\x00')
+        Image.new('RGBA', (40, 20)).save(os.path.join(self.src, 'wm.png'))
+        cwd = os.getcwd()
+        os.chdir(self.src)
+        try:
+            with mock.patch('imgc.client.submit_paths',
+                            return_value=iter([])) as submit_paths:
+                main(['--connect', self.socket, '-f', 'wm.png',
+                      '--files-from', 'files.txt'])
+        finally:
+            os.chdir(cwd)
+        paths, options, socket_path = submit_paths.call_args.args
+        self.assertEqual(paths, [os.path.join(self.src, '0.jpg'),
+                                 os.path.join(self.src, '1.jpg')])
+        self.assertEqual(options['wmfile'], os.path.join(self.src, 'wm.png'))
+        self.assertNotIn('files_from', options)
+
+    def test_invalid_requests(self):
+        missing = os.path.join(self.tmpdir, 'missing.txt')
+        for message in ({'options': {}},
+                        {'paths': [self.src], 'options': {'size': 'big'}},
+                        {'paths': [], 'options': {'files_from': missing}}):
+            response, = client.request(message, self.socket)
+            self.assertEqual(response['event'], 'error')
+
+    def test_concurrent_clients(self):
+        results = {}
+
+        def submit(name):
+            results[name] = self.submit([self.src], size='50x')
+
+        threads = [threading.Thread(target=submit, args=(name,))
+                   for name in 'abc']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        for messages in results.values():
+            self.assertEqual(messages[-1]['images'], 3)
@@ -0,0 +1,70 @@
+import io
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from imgc.utils import read_nul_delimited
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# generous bound, --help used to take ~80ms more than a bare interpreter
+# just because of Pillow imports
+MAX_STARTUP_OVERHEAD = 0.5
+
+
+def run_python(code):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    output = subprocess.check_output(
+        [sys.executable, '-c', code], env=env, cwd=ROOT)
+    return time.perf_counter() - start, output.decode()
+
+
+def best_time(code, repeat=3):
+    return min(run_python(code)[0] for _ in range(repeat))
+
+
+class StartupTest(unittest.TestCase):
+
+    def test_import_does_not_load_pillow(self):
+        elapsed, output = run_python(
+            "import sys, imgc; print('PIL' in sys.modules)")
+        self.assertEqual(output.strip(), 'False')
+
+    def test_help_does_not_load_pillow(self):
+        elapsed, output = run_python(
+            "import sys, imgc\n"
+            "try:\n"
+            "    imgc.main(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print('PIL' in sys.modules)")
+        self.assertEqual(output.strip().splitlines()[-1], 'False')
+
+    def test_startup_time(self):
+        baseline = best_time('pass')
+        startup = best_time(
+            "import imgc\n"
+            "try:\n"
+            "    imgc.main(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass")
+        self.assertLess(startup - baseline, MAX_STARTUP_OVERHEAD)
+
+
+class ReadNulDelimitedTest(unittest.TestCase):
+
+    def test_paths(self):
+        fp = io.BytesIO(b'a.jpg\0dir/b c.png\0\0last.gif')
+        self.assertEqual(list(read_nul_delimited(fp, blocksize=3)),
+                         ['a.jpg', 'dir/b c.png', 'last.gif'])
+
+    def test_trailing_nul(self):
+        fp = io.BytesIO(b'a.jpg\0b.jpg\0')
+        self.assertEqual(list(read_nul_delimited(fp)), ['a.jpg', 'b.jpg'])
+
+    def test_empty(self):
+        self.assertEqual(list(read_nul_delimited(io.BytesIO())), [])
@@ -1,7 +1,10 @@
 from argparse import ArgumentTypeError
+from contextlib import redirect_stderr
+from io import StringIO
 import unittest
 
-from imgc.utils.types import quality_type, size_type
+from imgc import main
+from imgc.utils.types import presets_type, quality_type, size_type
 
 
 class QualityTypeTest(unittest.TestCase):
@@ -66,4 +69,32 @@ class QualityTypeTest(unittest.TestCase):
 
 
 class SizeTypeTest(unittest.TestCase):
-    pass
+
+    def test_geometry_flags(self):
+        for value in ('1000x>', '50%<', '800x600^', '800x600!>'):
+            self.assertEqual(size_type(value), value)
+
+    def test_invalid_flags(self):
+        with self.assertRaises(ArgumentTypeError):
+            size_type('1000x?')
+
+
+class PresetsTypeTest(unittest.TestCase):
+
+    def test_presets(self):
+        self.assertEqual(presets_type('small, fast'), ['small', 'fast'])
+
+    def test_unknown_preset(self):
+        with self.assertRaises(ArgumentTypeError):
+            presets_type('small,tiny')
+
+
+class RenditionsArgumentTest(unittest.TestCase):
+
+    def test_colliding_renditions(self):
+        for argv in (['-s', '100x', '-s', '100x'],
+                     ['-s', '400x', '-s', '400x>']):
+            with redirect_stderr(StringIO()) as stderr, \
+                    self.assertRaises(SystemExit):
+                main(argv + ['photos'])
+            self.assertIn('same output paths', stderr.getvalue())
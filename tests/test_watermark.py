@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from PIL import Image
+
+from imgc import watermark
+from imgc.utils import LRUCache
+from imgc.watermark import position, scaled_size
+from imgc.worker import Job, Options, process
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        self.assertEqual(cache.get('a', lambda: 3), 1)
+        cache.get('c', lambda: 4)
+        self.assertEqual(list(cache.items), ['a', 'c'])
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_threads(self):
+        cache = LRUCache(4)
+
+        def get():
+            for index in range(1000):
+                cache.get(index % 8, lambda: index % 8)
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache.items), 4)
+        self.assertEqual(cache.hits + cache.misses, 4000)
+
+
+class PlacementTest(unittest.TestCase):
+
+    def test_scaled_size(self):
+        self.assertEqual(scaled_size((1000, 500), (200, 100), 0.2), (200, 100))
+        self.assertEqual(scaled_size((1000, 1000), (400, 100), 0.2), (200, 50))
+
+    def test_position(self):
+        self.assertEqual(position((1000, 500), (100, 50), 'top-left'),
+                         (10, 10))
+        self.assertEqual(position((1000, 500), (100, 50), 'bottom-right'),
+                         (890, 440))
+        self.assertEqual(position((1000, 500), (100, 50), 'center'),
+                         (450, 225))
+        self.assertEqual(position((1000, 500), (100, 50), 'right'),
+                         (890, 225))
+        self.assertEqual(position((1000, 500), (100, 50), 'bottom'),
+                         (450, 440))
+
+
+class WatermarkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'src.png')
+        Image.new('RGB', (400, 200), (0, 0, 0)).save(self.src)
+        # white square with a transparent border
+        self.wmfile = os.path.join(self.tmpdir, 'wm.png')
+        wm = Image.new('RGBA', (100, 100), (255, 0, 0, 0))
+        wm.paste((255, 255, 255, 255), (25, 25, 75, 75))
+        wm.save(self.wmfile)
+        watermark._sources.clear()
+        watermark._scaled.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def options(self, **kwargs):
+        return Options(size='400x', wmfile=self.wmfile, **kwargs)
+
+    def test_load_premultiplies_once(self):
+        first = watermark.load(self.wmfile, 0.5)
+        self.assertIs(watermark.load(self.wmfile, 0.5), first)
+        self.assertEqual(first.mode, 'RGBa')
+        self.assertEqual(first.getpixel((50, 50)), (128, 128, 128, 128))
+        self.assertEqual(first.getpixel((0, 0)), (0, 0, 0, 0))
+
+    def test_apply(self):
+        options = self.options(wm_opacity=1.0, wm_scale=0.5)
+        for mode in ('RGB', 'RGBA', 'L', 'P'):
+            im = Image.new(mode, (400, 200))
+            im = watermark.apply(im, options)
+            # 100x100 fits into 200x100, placed at (296, 96)
+            self.assertEqual(im.convert('L').getpixel((346, 146)), 255, mode)
+            self.assertEqual(im.convert('L').getpixel((300, 100)), 0, mode)
+        # a single scaled copy for all images of that size
+        self.assertEqual(len(watermark._scaled.items), 1)
+
+    def test_no_watermark(self):
+        im = Image.new('RGB', (10, 10))
+        self.assertIs(watermark.apply(im, Options()), im)
+
+    def test_process(self):
+        dst = os.path.join(self.tmpdir, 'dst.png')
+        options = self.options(wm_position='center', wm_opacity=1.0)
+        options.size = '400x,200x'
+        result = process(Job(self.src, dst, options))
+        self.assertTrue(result.ok, result.error)
+        self.assertFalse(result.passed_through)
+        for path in result.outputs:
+            with Image.open(path) as im:
+                center = (im.size[0] // 2, im.size[1] // 2)
+                self.assertEqual(im.getpixel(center), (255, 255, 255))
+                self.assertEqual(im.getpixel((0, 0)), (0, 0, 0))
+
+    def test_params(self):
+        self.assertNotEqual(self.options().params(), Options(
+            size='400x').params())
@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+from imgc.metrics import STAGES
+from imgc.pool import create_pool
+from imgc.worker import Job, Options, Result, process
+
+
+class WorkerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'src.jpg')
+        Image.new('RGB', (400, 200), (200, 40, 40)).save(self.src)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def dst(self, name='dst.jpg'):
+        return os.path.join(self.tmpdir, name)
+
+
+class OptionsTest(unittest.TestCase):
+
+    def test_defaults(self):
+        options = Options()
+        self.assertEqual(options.size, '1000x')
+        self.assertEqual(options.quality, 90)
+
+    def test_unknown_kwargs_are_ignored(self):
+        options = Options(size='100x', src_images=['a.jpg'])
+        self.assertEqual(options.size, '100x')
+        self.assertFalse(hasattr(options, 'src_images'))
+
+
+class ProcessTest(WorkerTestCase):
+
+    def test_process_resizes_image(self):
+        result = process(Job(self.src, self.dst(), Options(size='100x')))
+        self.assertTrue(result.ok)
+        with Image.open(self.dst()) as im:
+            self.assertEqual(im.size, (100, 50))
+
+    def test_process_renditions(self):
+        options = Options(size='200x,100x:quality=50,40x40:dir=thumbs')
+        result = process(Job(self.src, self.dst(), options))
+        self.assertTrue(result.ok)
+        expected = {
+            self.dst('dst-200x.jpg'): (200, 100),
+            self.dst('dst-100x.jpg'): (100, 50),
+            self.dst(os.path.join('thumbs', 'dst.jpg')): (40, 40),
+        }
+        self.assertEqual(set(result.outputs), set(expected))
+        for path, size in expected.items():
+            with Image.open(path) as im:
+                self.assertEqual(im.size, size)
+        self.assertEqual(result.bytes_out, sum(
+            os.path.getsize(path) for path in expected))
+
+    def test_process_passes_through_unchanged(self):
+        for options in (Options(size='1000x>,300x:dir=small'),
+                        Options(size='400x200'),
+                        Options(size='1000x>', quality=40),
+                        Options(size='1000x>', preset='small')):
+            result = process(Job(self.src, self.dst(), options))
+            self.assertFalse(result.passed_through, options.size)
+        result = process(Job(self.src, self.dst(), Options(size='1000x>')))
+        self.assertTrue(result.passed_through)
+        with open(self.src, 'rb') as src, open(self.dst(), 'rb') as dst:
+            self.assertEqual(src.read(), dst.read())
+        self.assertEqual(result.bytes_out, result.bytes_in)
+        self.assertNotIn('decode', result.timings)
+
+    def test_process_keeps_smaller_source(self):
+        noise = Image.effect_noise((400, 200), 64).convert('RGB')
+        noise.save(self.src, quality=20)
+        options = Options(
+            size='400x,380x:dir=small,100x100:crop=center:dir=thumbs',
+            quality=95)
+        result = process(Job(self.src, self.dst(), options))
+        self.assertEqual(result.sources_kept, 0)
+        self.assertGreater(os.path.getsize(self.dst('dst-400x.jpg')),
+                           result.bytes_in)
+        options.keep_smaller = True
+        result = process(Job(self.src, self.dst(), options))
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(result.sources_kept, 1)
+        with open(self.src, 'rb') as src, \
+                open(self.dst('dst-400x.jpg'), 'rb') as dst:
+            self.assertEqual(src.read(), dst.read())
+        self.assertEqual(result.output_bytes[self.dst('dst-400x.jpg')],
+                         result.bytes_in)
+        # downsized and cropped renditions are never replaced by the source
+        for name, size in (('small', (380, 190)), ('thumbs', (100, 100))):
+            with Image.open(self.dst(os.path.join(name, 'dst.jpg'))) as im:
+                self.assertEqual(im.size, size)
+
+    def test_process_try_presets(self):
+        noise = Image.effect_noise((200, 100), 64)
+        noise.save(self.dst('src.png'))
+        sizes = []
+        for presets in (None, ['small']):
+            options = Options(size='150x', preset='fast', try_presets=presets)
+            result = process(Job(self.dst('src.png'), self.dst('dst.png'),
+                                 options))
+            self.assertTrue(result.ok, result.error)
+            sizes.append(result.bytes_out)
+        self.assertLess(sizes[1], sizes[0])
+
+    def test_process_reports_stats(self):
+        result = process(Job(self.src, self.dst(), Options(size='100x')))
+        self.assertEqual(set(result.timings), set(STAGES))
+        self.assertGreaterEqual(result.elapsed, sum(result.timings.values()))
+        self.assertEqual(result.bytes_in, os.path.getsize(self.src))
+        self.assertEqual(result.bytes_out, os.path.getsize(self.dst()))
+        self.assertEqual((result.pixels_in, result.pixels_out),
+                         (400 * 200, 100 * 50))
+
+    def test_process_profile(self):
+        profile_dir = os.path.join(self.tmpdir, 'profile')
+        options = Options(size='100x', profile=profile_dir)
+        self.assertNotIn('profile', options.params())
+        process(Job(self.src, self.dst(), options))
+        self.assertEqual(len(os.listdir(profile_dir)), 1)
+
+    def test_process_quality_search(self):
+        options = Options(size='200x', target_bytes=10 ** 6)
+        result = process(Job(self.src, self.dst(), options))
+        self.assertEqual(result.qualities, {self.dst(): options.quality})
+        result = process(Job(self.src, self.dst(), Options(size='200x')))
+        self.assertEqual(result.qualities, {})
+
+    def test_process_reports_broken_image(self):
+        with open(self.src, 'wb') as fp:
+            fp.write(b'not an image')
+        result = process(Job(self.src, self.dst(), Options()))
+        self.assertFalse(result.ok)
+        self.assertIsInstance(result.error, str)
+
+    def test_process_cancelled(self):
+        import threading
+        from imgc.cancel import init_worker
+
+        event = threading.Event()
+        event.set()
+        pool = create_pool('thread', 1, initializer=init_worker,
+                           initargs=(event,))
+        try:
+            result = pool.apply(process, (Job(
+                self.src, self.dst(), Options(size='50x,20x:dir=small')),))
+        finally:
+            pool.terminate()
+        self.assertTrue(result.cancelled)
+        self.assertEqual(result.outputs, [])
+        self.assertFalse(os.path.exists(self.dst()))
+
+    def test_process_pool(self):
+        pool = create_pool('process', 2)
+        try:
+            jobs = [Job(self.src, self.dst('%d.jpg' % i), Options(size='50x'))
+                    for i in range(4)]
+            results = pool.map(process, jobs)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertTrue(all(isinstance(r, Result) and r.ok for r in results))
+        for job in jobs:
+            with Image.open(job.dst) as im:
+                self.assertEqual(im.size, (50, 25))
+
+    def test_create_pool_rejects_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            create_pool('fiber', 1)
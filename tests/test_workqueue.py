@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from imgc.workqueue import WorkQueue, in_shard, parse_shard
+
+
+class ShardTest(unittest.TestCase):
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('1/4'), (1, 4))
+        for x in ('4/4', '-1/2', '1', 'a/b', '0/0'):
+            with self.assertRaises(ValueError):
+                parse_shard(x)
+
+    def test_shards_are_disjoint_and_complete(self):
+        paths = ['dir/%d.jpg' % i for i in range(100)]
+        shards = [[p for p in paths if in_shard(p, (i, 3))] for i in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(paths))
+        self.assertTrue(all(shards))
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'queue.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def queue(self, **kwargs):
+        queue = WorkQueue(self.path, **kwargs)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_claim_and_complete(self):
+        queue = self.queue()
+        self.assertEqual(queue.add([('a', 'A'), ('b', 'B')], {'q': 1}), 2)
+        self.assertEqual(queue.add([('a', 'A')], {'q': 1}), 0)
+        job_id, src, dst, params = queue.claim()
+        self.assertEqual((src, dst, params), ('a', 'A', {'q': 1}))
+        self.assertEqual(queue.claim()[1], 'b')
+        self.assertIsNone(queue.claim())
+        queue.complete(job_id)
+        self.assertEqual(queue.counts(), {'done': 1, 'running': 1})
+        self.assertEqual(queue.unfinished(), 1)
+
+    def test_release(self):
+        queue = self.queue(max_attempts=1)
+        queue.add([('a', 'A')], {})
+        queue.release(queue.claim()[0])
+        # released jobs are not counted as attempts
+        job_id = queue.claim()[0]
+        queue.complete(job_id, 'broken')
+        self.assertEqual(queue.counts(), {'failed': 1})
+
+    def test_failed_jobs_are_retried(self):
+        queue = self.queue(max_attempts=2)
+        queue.add([('a', 'A')], {})
+        for _ in range(2):
+            job_id = queue.claim()[0]
+            queue.complete(job_id, 'broken')
+        self.assertIsNone(queue.claim())
+        self.assertEqual(queue.counts(), {'failed': 1})
+        # adding it again, e.g. by a new run, resets it
+        self.assertEqual(queue.add([('a', 'A')], {}), 1)
+        self.assertEqual(queue.claim()[1], 'a')
+
+    def test_expired_lease_is_claimed_again(self):
+        crashed = self.queue(lease=0.01)
+        crashed.add([('a', 'A')], {})
+        self.assertEqual(crashed.claim()[1], 'a')
+        other = self.queue(lease=60)
+        self.assertIsNone(other.claim())
+        time.sleep(0.05)
+        self.assertEqual(other.claim()[1], 'a')
+
+    def test_heartbeat_renews_lease(self):
+        queue = self.queue(lease=0.2)
+        queue.add([('a', 'A')], {})
+        queue.claim()
+        time.sleep(0.15)
+        queue.heartbeat()
+        time.sleep(0.1)
+        self.assertIsNone(self.queue().claim())